@@ -0,0 +1,333 @@
+"""
+Module for admission control and priority scheduling of outbound remote calls.
+
+Every remote execution (status check, start/stop, session warm-up) takes a slot from one
+process-wide AdmissionController before it reaches the executor. At most
+EAP_MAX_REMOTE_CALLS run at once, at most EAP_MAX_REMOTE_CALLS_PER_SERVER against one
+server, and EAP_ACTION_RESERVED_SLOTS of the global slots are kept free for start/stop
+actions, so a burst of polls can never hold every slot.
+
+When calls have to wait, freed slots go to start/stop actions first, then to status checks a
+user is waiting for (routes open `priority_scope(INTERACTIVE)`), then to background polls.
+Under overload polls are shed instead of queued: a background poll that cannot start right
+away, or an interactive poll arriving at a full queue (EAP_REMOTE_QUEUE_LIMIT) or whose
+deadline passes while queued, raises Overloaded and is answered from the last known state.
+Actions are never shed; they wait up to their deadline.
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from deadline import remaining
+from metrics import REGISTRY
+from tracing import record_span
+
+# Priorities, most urgent first
+ACTION = 0
+INTERACTIVE = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {ACTION: 'action', INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+DEFAULT_MAX_CONCURRENT = 16
+DEFAULT_MAX_PER_SERVER = 2
+DEFAULT_RESERVED_FOR_ACTIONS = 1
+DEFAULT_QUEUE_LIMIT = 32
+
+# Seconds an overloaded caller is asked to wait before retrying
+RETRY_AFTER = 5
+
+REMOTE_CALLS_RUNNING = REGISTRY.gauge('eap_remote_calls_running', 'Remote calls holding an admission slot',
+                                      ('priority',))
+REMOTE_QUEUE_DEPTH = REGISTRY.gauge('eap_remote_queue_depth', 'Remote calls waiting for an admission slot',
+                                    ('priority',))
+REMOTE_CALLS_SHED = REGISTRY.counter('eap_remote_calls_shed_total', 'Remote calls rejected under overload',
+                                     ('priority',))
+
+# Priority of status checks started by the current code, BACKGROUND unless a route raised it
+_current_priority: ContextVar[int] = ContextVar('eap_priority', default=BACKGROUND)
+
+
+@contextmanager
+def priority_scope(priority: int) -> Iterator[int]:
+    """
+    Run the with block's status checks at the given priority
+
+    Args:
+        priority (int): INTERACTIVE or BACKGROUND
+
+    Yields:
+        int: The priority in effect
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield priority
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    """
+    Returns:
+        int: Priority of status checks started by the current code
+    """
+    return _current_priority.get()
+
+
+class Overloaded(Exception):
+    """A poll rejected because remote execution is saturated"""
+
+    def __init__(self, message: str, retry_after: float = RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued call; `grant` wakes it once it holds a slot"""
+
+    __slots__ = ('server', 'priority', 'order', 'grant', 'granted')
+
+    def __init__(self, server: str, priority: int, order: int, grant: Callable[[], None]):
+        self.server = server
+        self.priority = priority
+        self.order = order
+        self.grant = grant
+        self.granted = False
+
+
+class AdmissionController:
+    """Global and per-server concurrency limits with priority queueing and load shedding"""
+
+    def __init__(self, max_concurrent: int = DEFAULT_MAX_CONCURRENT, max_per_server: int = DEFAULT_MAX_PER_SERVER,
+                 reserved_for_actions: int = DEFAULT_RESERVED_FOR_ACTIONS, queue_limit: int = DEFAULT_QUEUE_LIMIT):
+        """
+        Initialize the controller
+
+        Args:
+            max_concurrent (int): Remote calls running at once
+            max_per_server (int): Remote calls running at once against one server
+            reserved_for_actions (int): Global slots polls may not take
+            queue_limit (int): Polls allowed to wait for a slot
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_server = max_per_server
+        self.reserved_for_actions = min(reserved_for_actions, max_concurrent - 1)
+        self.queue_limit = queue_limit
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._waiters: List[_Waiter] = []
+        self._running: Dict[int, int] = {priority: 0 for priority in PRIORITY_NAMES}
+        self._per_server: Dict[str, int] = {}
+        self.shed = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def _fits(self, server: str, priority: int) -> bool:
+        """Whether a call could start now (caller holds the lock)"""
+        running = sum(self._running.values())
+        limit = self.max_concurrent if priority == ACTION else self.max_concurrent - self.reserved_for_actions
+        return running < limit and self._per_server.get(server, 0) < self.max_per_server
+
+    def _take(self, server: str, priority: int) -> None:
+        """Account a started call (caller holds the lock)"""
+        self._running[priority] += 1
+        self._per_server[server] = self._per_server.get(server, 0) + 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters, most urgent first (caller holds the lock)"""
+        for waiter in sorted(self._waiters, key=lambda w: (w.priority, w.order)):
+            if self._fits(waiter.server, waiter.priority):
+                self._take(waiter.server, waiter.priority)
+                self._waiters.remove(waiter)
+                waiter.granted = True
+                waiter.grant()
+
+    def _publish(self) -> None:
+        """Update the running and queue depth gauges (caller holds the lock)"""
+        queued = {priority: 0 for priority in PRIORITY_NAMES}
+        for waiter in self._waiters:
+            queued[waiter.priority] += 1
+        for priority, name in PRIORITY_NAMES.items():
+            REMOTE_CALLS_RUNNING.set(self._running[priority], priority=name)
+            REMOTE_QUEUE_DEPTH.set(queued[priority], priority=name)
+
+    def _shed(self, server: str, priority: int, reason: str) -> Overloaded:
+        """Count a rejected poll (caller holds the lock)"""
+        self.shed[priority] += 1
+        REMOTE_CALLS_SHED.inc(priority=PRIORITY_NAMES[priority])
+        return Overloaded(f"Remote execution is overloaded ({reason}); status check of {server} was not run")
+
+    def _enqueue(self, server: str, priority: int, grant: Callable[[], None]) -> Optional[_Waiter]:
+        """
+        Take a slot right away or queue for one
+
+        Returns:
+            Optional[_Waiter]: None if the call holds a slot now, otherwise its queue entry
+
+        Raises:
+            Overloaded: If the call is a poll that is shed instead of queued
+        """
+        with self._lock:
+            # Queued calls only wait because they do not fit (dispatch grants every one that does),
+            # so a new call that fits takes nothing a more urgent waiter could use
+            if self._fits(server, priority):
+                self._take(server, priority)
+                self._publish()
+                return None
+            if priority == BACKGROUND:
+                raise self._shed(server, priority, "no free slot")
+            if priority == INTERACTIVE and sum(w.priority != ACTION for w in self._waiters) >= self.queue_limit:
+                raise self._shed(server, priority, "queue full")
+            waiter = _Waiter(server, priority, next(self._order), grant)
+            self._waiters.append(waiter)
+            self._publish()
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """
+        Leave the queue after the caller gave up waiting
+
+        Returns:
+            bool: False if the slot was granted in the meantime and is now held by the caller
+        """
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            self._publish()
+            return True
+
+    def _timed_out(self, waiter: _Waiter) -> Exception:
+        """Error for a call whose deadline passed while queued"""
+        if waiter.priority == ACTION:
+            return TimeoutError(f"No remote execution slot for {waiter.server} before the deadline")
+        with self._lock:
+            return self._shed(waiter.server, waiter.priority, "deadline passed while queued")
+
+    def release(self, server: str, priority: int) -> None:
+        """
+        Free the slot of a finished call and hand it to the most urgent waiter
+
+        Args:
+            server (str): Server of the finished call
+            priority (int): Priority the call was admitted with
+        """
+        with self._lock:
+            self._running[priority] -= 1
+            self._per_server[server] -= 1
+            if not self._per_server[server]:
+                del self._per_server[server]
+            self._dispatch()
+            self._publish()
+
+    @contextmanager
+    def slot(self, server: str, priority: int, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Hold an admission slot for the with block
+
+        Args:
+            server (str): Server the call goes to
+            priority (int): ACTION, INTERACTIVE or BACKGROUND
+            timeout (float, optional): Seconds the call may wait, defaults to the current deadline
+
+        Raises:
+            Overloaded: If a poll is shed
+            TimeoutError: If an action got no slot before its deadline
+        """
+        granted = threading.Event()
+        waiter = self._enqueue(server, priority, granted.set)
+        if waiter is not None:
+            started = time.perf_counter()
+            if not granted.wait(remaining() if timeout is None else timeout) and self._abandon(waiter):
+                raise self._timed_out(waiter)
+            record_span('admission queue', time.perf_counter() - started, priority=PRIORITY_NAMES[priority])
+        try:
+            yield
+        finally:
+            self.release(server, priority)
+
+    @asynccontextmanager
+    async def slot_async(self, server: str, priority: int, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Same as slot, waiting on the event loop instead of blocking its thread
+        """
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant() -> None:
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(server, priority, grant)
+        if waiter is not None:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), remaining() if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                if self._abandon(waiter):
+                    raise self._timed_out(waiter) from None
+            except asyncio.CancelledError:
+                if not self._abandon(waiter):
+                    self.release(server, priority)
+                raise
+            record_span('admission queue', time.perf_counter() - started, priority=PRIORITY_NAMES[priority])
+        try:
+            yield
+        finally:
+            self.release(server, priority)
+
+    def stats(self) -> Dict:
+        """
+        Returns:
+            Dict: Limits, running and queued calls and shed polls by priority
+        """
+        with self._lock:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._waiters:
+                queued[PRIORITY_NAMES[waiter.priority]] += 1
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_per_server": self.max_per_server,
+                "reserved_for_actions": self.reserved_for_actions,
+                "queue_limit": self.queue_limit,
+                "running": {PRIORITY_NAMES[p]: count for p, count in self._running.items()},
+                "queued": queued,
+                "shed": {PRIORITY_NAMES[p]: count for p, count in self.shed.items()}
+            }
+
+
+_admission: Optional[AdmissionController] = None
+_admission_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    """
+    Get the process-wide admission controller, creating it on first use
+
+    Returns:
+        AdmissionController: Controller sized by EAP_MAX_REMOTE_CALLS, EAP_MAX_REMOTE_CALLS_PER_SERVER,
+        EAP_ACTION_RESERVED_SLOTS and EAP_REMOTE_QUEUE_LIMIT
+    """
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = AdmissionController(
+                int(os.environ.get('EAP_MAX_REMOTE_CALLS', DEFAULT_MAX_CONCURRENT)),
+                int(os.environ.get('EAP_MAX_REMOTE_CALLS_PER_SERVER', DEFAULT_MAX_PER_SERVER)),
+                int(os.environ.get('EAP_ACTION_RESERVED_SLOTS', DEFAULT_RESERVED_FOR_ACTIONS)),
+                int(os.environ.get('EAP_REMOTE_QUEUE_LIMIT', DEFAULT_QUEUE_LIMIT)))
+        return _admission
+
+
+def call_priority(kind: str) -> int:
+    """
+    Get the priority of a remote call
+
+    Args:
+        kind (str): Kind of the RemoteCall, "status", "start" or "stop"
+
+    Returns:
+        int: ACTION for start/stop, otherwise the priority of the current scope
+    """
+    return current_priority() if kind == 'status' else ACTION
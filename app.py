@@ -1,14 +1,35 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import math
+import time
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from models.user import User
 from models.server_selection import ServerSelection
 from auth.auth_manager import AuthManager
 from models.server_config import ServerConfig  # Import ServerConfig
-from powershellStatusChecker import check_services_powershell  # Import the PowerShell checker function
-from manage_jboss import manage_jboss  # Import manage_jboss function
+from models.server_inventory import DEFAULT_PAGE_SIZE, InvalidCursor
+from manage_jboss import manage_jboss, manage_jboss_async  # Import manage_jboss function
+from status_poller import StatusPoller, check_server_status_async
+from status_history import StatusHistory, DEFAULT_MAX_SPANS, RETENTION_DAYS
+from ps_session_pool import get_session_pool
+from fleet_status import check_fleet, DEFAULT_SERVER_DEADLINE
+from status_stream import stream_status, stream_job
+from jobs import JobQueue, SUCCEEDED, UNCONFIRMED
+from job_store import JobStore
+from convergence import CANCELLED as CONVERGENCE_CANCELLED, READY as CONVERGED, convergence_timeout, watch_convergence
+from rolling_operations import RolloutManager, DEFAULT_WAVE_SIZE, DEFAULT_MAX_FAILURES, DEFAULT_WAVE_TIMEOUT
+from metrics import REGISTRY
+from deadline import DEFAULT_STATUS_TIMEOUT, deadline_scope
+from remote_executor import get_executor
+from credential_store import CredentialStore
+from async_runtime import async_enabled, get_runtime
+from admission import INTERACTIVE, RETRY_AFTER, get_admission, priority_scope
+from operation_history import FILTER_COLUMNS, get_operation_history
+from prefetch import Prefetcher, prefetch_enabled
+from tracing import TRACER, record_span, traced
+from operation_history import DEFAULT_PAGE_SIZE as DEFAULT_OPERATIONS_PAGE_SIZE
 
-# Dictionary to store user passwords temporarily in memory
-_user_passwords = {}
+# Encrypted login credentials shared by every worker process on this host
+credential_store = CredentialStore()
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key'  # Change this in production
@@ -18,6 +39,137 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# EAP_ASYNC=1 runs status checks and start/stop operations on one shared event loop
+ASYNC_MODE = async_enabled()
+
+# Shared background poller serving cached status snapshots to every browser tab
+status_poller = StatusPoller(credential_source=credential_store.latest,
+                             async_check_func=check_server_status_async if ASYNC_MODE else None)
+
+# Every snapshot the poller produces is kept as per-service history for uptime queries
+status_history = StatusHistory()
+status_poller.add_listener(status_history.record)
+
+# Warms snapshots and the user's remote sessions right after a login
+prefetcher = Prefetcher(status_poller)
+
+def run_job(job):
+    """Run a start/stop job, on the event loop in async mode, recording its output lines as they arrive"""
+    # Start/stop jobs are rare and slow, so every one is traced
+    with TRACER.trace('job', force=True, job_id=job.id, server=job.server_id, action=job.action) as trace:
+        job.trace_id = trace.trace_id
+        record_span('queued', job.started_at - job.created_at)
+        if ASYNC_MODE:
+            return get_runtime().run(manage_jboss_async(job.server_id, job.action, job.username, job.password,
+                                                        "config/server_config.json", on_output=job.append_line))
+        return manage_jboss(job.server_id, job.action, job.username, job.password, "config/server_config.json",
+                            on_output=job.append_line)
+
+def watch_job_convergence(job):
+    """
+    Watch the server of a succeeded start/stop job until it reports the target state, recording
+    each state seen as an output line and the result on the job. Runs after the job released
+    the server, so a later start/stop is not held up and cancels the watch instead.
+
+    Args:
+        job (Job): The job whose start/stop just returned
+
+    Returns:
+        str: Final job status, "unconfirmed" if the target state was not seen in time
+    """
+    def on_transition(convergence, transition):
+        job.convergence = convergence.to_dict()
+        job.append_line(f"Server status: {transition['state']} ({transition['elapsed']:.1f}s after {job.action})")
+
+    # Time to ready counts from the start of the start/stop
+    issued_at = time.monotonic() - (time.time() - job.started_at)
+    with TRACER.trace('convergence watch', force=True, job_id=job.id, server=job.server_id, action=job.action):
+        convergence = watch_convergence(job.server_id, job.action, job.username, job.password, status_poller.refresh,
+                                        issued_at=issued_at, on_transition=on_transition, cancelled=job.cancel_watch)
+    job.convergence = convergence.to_dict()
+    if convergence.status == CONVERGED:
+        job.append_line(f"Reached {convergence.target} {convergence.time_to_ready:.1f}s after {job.action}")
+    elif convergence.status == CONVERGENCE_CANCELLED:
+        job.append_line(f"Stopped watching for {convergence.target}: a later operation on {job.server_id} started")
+    else:
+        job.append_line(f"{convergence.target} not reported within {convergence.timeout:.0f}s")
+        return UNCONFIRMED
+    return SUCCEEDED
+
+def server_not_found(server_id):
+    """
+    Check a server ID from the URL against the configuration, so unknown IDs never reach
+    the poller's cache and circuit breakers or the job queue
+
+    Args:
+        server_id (str): ID of the server
+
+    Returns:
+        Optional[Tuple]: 404 response if the server is not configured, None otherwise
+    """
+    if ServerConfig.get_instance().get_entry(server_id) is not None:
+        return None
+    return jsonify({
+        "error": "server_not_found",
+        "message": f"Server '{server_id}' not found in configuration"
+    }), 404
+
+def trace_requested():
+    """
+    Returns:
+        bool: True if the request asks to be traced regardless of the sample rate (?trace=1 or X-Trace: 1)
+    """
+    return '1' in (request.args.get('trace'), request.headers.get('X-Trace'))
+
+# Jobs and rollouts shared with the other worker processes on this host
+job_store = JobStore()
+
+# Background queue running EAP start/stop jobs, one at a time per server across all workers
+job_queue = JobQueue(run_job, converge=watch_job_convergence if convergence_timeout() > 0 else None,
+                     store=job_store)
+
+# Fleet-wide start/stop in waves on top of the job queue
+rollout_manager = RolloutManager(job_queue, status_poller.refresh)
+
+# Executor statistics (calls, sessions or connections opened, pool size) exported on /metrics
+executor_stats = REGISTRY.gauge('eap_executor_stat', 'Statistics reported by the remote executor',
+                                ('backend', 'stat'))
+
+def collect_executor_stats():
+    """Copy the remote executor's statistics into the executor_stats gauge"""
+    executor = get_executor()
+    for stat, value in executor.stats().items():
+        if isinstance(value, (int, float)):
+            executor_stats.set(value, backend=executor.name, stat=stat)
+
+REGISTRY.add_collector(collect_executor_stats)
+
+# 1 while a server's circuit breaker is open or probing, 0 when closed
+circuit_open = REGISTRY.gauge('eap_circuit_open', 'Whether the circuit breaker of a server is open', ('server',))
+
+def collect_circuit_states():
+    """Copy the status poller's circuit breaker states into the circuit_open gauge"""
+    for server_id, state in status_poller.breakers.states().items():
+        circuit_open.set(0 if state["state"] == "closed" else 1, server=server_id)
+
+REGISTRY.add_collector(collect_circuit_states)
+
+def request_timeout(default):
+    """
+    Get the seconds the client allows for the current request
+
+    Args:
+        default (float): Seconds used when the client sets no timeout
+
+    Returns:
+        float: The `timeout` query argument or X-Request-Timeout header, capped at default
+    """
+    value = request.args.get('timeout') or request.headers.get('X-Request-Timeout')
+    try:
+        return min(float(value), default) if value else default
+    except ValueError:
+        return default
+
 @login_manager.user_loader
 def load_user(user_id):
     """
@@ -27,8 +179,10 @@ def load_user(user_id):
     Returns:
         User: The User object for the given ID
     """
-    # We need to create a new user without password when loading from session
-    # The password will be set by the login route
+    # The session is only valid while the user's credentials are in the shared store;
+    # once they expire the user has to log in again
+    if credential_store.get(user_id) is None:
+        return None
     return User(user_id)
 
 @app.route('/')
@@ -37,126 +191,493 @@ def home():
     """
     Home page route, requires authentication
     """
-    server_config = ServerConfig()
-    servers = server_config.config['servers']
-    return render_template('home.html', servers=servers)
+    # Servers are loaded page by page from /inventory/servers; only the filter options are rendered
+    inventory = ServerConfig.get_instance().inventory()
+    return render_template('home.html', environments=inventory.environments(), tags=inventory.tags(),
+                           page_size=DEFAULT_PAGE_SIZE)
+
+@app.route('/inventory/servers')
+@login_required
+def inventory_servers():
+    """
+    Search the configured servers, one page at a time
+
+    Query Args:
+        q (str, optional): Words that must all appear in the server ID, name, environment or tags
+        env (str, optional): Only servers of this environment
+        tag (str, optional, repeatable): Only servers carrying every given tag
+        cursor (str, optional): "next_cursor" of the previous page
+        limit (int, optional): Servers per page, at most MAX_PAGE_SIZE
+
+    Returns:
+        JSON: {"servers": [...], "next_cursor": str|None, "total": int}
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({
+            "error": "invalid_parameter",
+            "message": "limit must be an integer"
+        }), 400
+
+    try:
+        page = ServerConfig.get_instance().inventory().search(
+            query=request.args.get('q', ''),
+            environment=request.args.get('env') or None,
+            tags=request.args.getlist('tag'),
+            cursor=request.args.get('cursor') or None,
+            limit=limit
+        )
+    except InvalidCursor as e:
+        return jsonify({
+            "error": "invalid_cursor",
+            "message": str(e)
+        }), 400
+    return jsonify(page)
 
 @app.route('/get_services/<server_id>')
 @login_required
+@traced('GET /get_services', force=trace_requested)
 def get_services(server_id):
     """
-    Get services for a specific server
+    Get services for a specific server from the status poller cache
     
     Args:
         server_id (str): ID of the server to get services for
+
+    Query Args:
+        timeout (float, optional): Seconds the check may take (also X-Request-Timeout);
+            services not checked in time are marked "timed_out"
         
     Returns:
-        JSON: List of services with their status
+        JSON: Services with their status and the age of the snapshot
     """
-    server_config = ServerConfig()
-    services = server_config.get_server_services(server_id)
-    
-    # Initialize all services with N/A status
-    service_statuses = [{
-        "name": service['name'],
-        "running": None  # None indicates N/A status
-    } for service in services]
-    
+    not_found = server_not_found(server_id)
+    if not_found:
+        return not_found
+
+    username = current_user.username
+    password = credential_store.get(username)
+
+    # Serve the cached snapshot; a cache miss runs one shared check for all callers,
+    # bounded by the request's deadline and queued ahead of background polls
+    with deadline_scope(request_timeout(DEFAULT_STATUS_TIMEOUT)), priority_scope(INTERACTIVE):
+        snapshot = status_poller.get_snapshot(server_id, username, password)
+
+    if snapshot.error == "overloaded":
+        # The check was shed; answer with the last known state and ask the client to retry later
+        body = snapshot.to_dict()
+        body["queued"] = get_admission().stats()["queued"]
+        return jsonify(body), 503, {'Retry-After': str(RETRY_AFTER)}
+
+    if snapshot.error in ("connection_failed", "circuit_open"):
+        body = {
+            "error": snapshot.error,
+            "message": snapshot.message,
+            "age": round(snapshot.age, 1)
+        }
+        # While the server's circuit breaker is open, include the last known state
+        if snapshot.last_known is not None:
+            body["last_known"] = snapshot.last_known.to_dict()
+        if snapshot.retry_at is not None:
+            body["retry_at"] = snapshot.retry_at
+        return jsonify(body), 503  # Service Unavailable
+
+    return jsonify(snapshot.to_dict())
+
+@app.route('/history/<server_id>')
+@login_required
+def get_history(server_id):
+    """
+    Get the status history of a server's services
+
+    Args:
+        server_id (str): ID of the server
+
+    Query Args:
+        since (float, optional): Start of the range in epoch seconds, defaults to 24 hours ago;
+            clamped to the retention period
+        until (float, optional): End of the range in epoch seconds, defaults to now; clamped to now
+        max_spans (int, optional): Maximum number of state spans per service
+
+    Returns:
+        JSON: Downsampled state spans and uptime percentage per service
+    """
+    not_found = server_not_found(server_id)
+    if not_found:
+        return not_found
+    server_config = ServerConfig.get_instance()
+
+    now = time.time()
     try:
-        # Get the current user's credentials
-        if not current_user.is_authenticated:
-            raise ValueError("User not authenticated")
-            
-        username = current_user.username
-        password = _user_passwords.get(username)
-        print(f"Username: {username}")
-        print(f"Password: {password}")
+        until = float(request.args.get('until', now))
+        since = float(request.args.get('since', until - 24 * 3600))
+        max_spans = max(1, int(request.args.get('max_spans', DEFAULT_MAX_SPANS)))
+    except ValueError:
+        return jsonify({
+            "error": "invalid_range",
+            "message": "since, until and max_spans must be numbers"
+        }), 400
+    if not (math.isfinite(since) and math.isfinite(until)):
+        return jsonify({
+            "error": "invalid_range",
+            "message": "since and until must be finite numbers"
+        }), 400
+    # Nothing older than the retention period or newer than now is stored
+    since = max(since, now - RETENTION_DAYS * 86400)
+    until = min(until, now)
+    if since >= until:
+        return jsonify({
+            "error": "invalid_range",
+            "message": f"since must be before until, and the range must overlap the last {RETENTION_DAYS} days"
+        }), 400
 
-        # Get service names from config
-        service_names = [service['name'] for service in services]
-        print(f"Service Names: {service_names}")
-        jboss_cli_command = server_config.config['servers'][server_id]['check_jboss_is_running']
-        print(f"JBoss CLI Command: {jboss_cli_command}")
+    services = server_config.get_service_names(server_id) or status_history.services(server_id)
+    return jsonify(status_history.query(server_id, services, since, until, max_spans))
 
-        
-        if not username or not password:
-            raise ValueError("Missing credentials")
-        
-        # Check service status using PowerShell
-        try:
-            status_output = check_services_powershell(username, password, server_id, service_names, jboss_cli_command)
-            
-            # Create a dictionary of service statuses from PowerShell output
-            status_dict = {}
-            for line in status_output.splitlines():
-                if "Service '" in line and "' is" in line:
-                    parts = line.split("'")
-                    if len(parts) >= 2:
-                        service_name = parts[1]
-                        is_running = "is running" in line.lower()
-                        status_dict[service_name] = is_running
-            
-            # Update service statuses with PowerShell results
-            for service in service_statuses:
-                if service['name'] in status_dict:
-                    service['running'] = status_dict[service['name']]
-                    
-        except ConnectionError as ce:
-            # Handle connection error specifically
-            return jsonify({
-                "error": "connection_failed",
-                "message": str(ce)
-            }), 503  # Service Unavailable
-    
-    except Exception as e:
-        print(f"Error checking service status: {str(e)}")
-        # Keep N/A status for all services on error
-    
-    return jsonify(service_statuses)
+@app.route('/operations')
+@login_required
+def list_operations():
+    """
+    Query the history of start/stop operations, newest first, one page at a time
+
+    Query Args:
+        server, action, user, outcome (str, optional): Exact matches
+        since (float, optional): Only operations started at or after this epoch time
+        until (float, optional): Only operations started before this epoch time
+        cursor (str, optional): "next_cursor" of the previous page
+        limit (int, optional): Operations per page, at most 500
+
+    Returns:
+        JSON: {"operations": [...], "next_cursor": str|None}
+    """
+    try:
+        since = float(request.args['since']) if request.args.get('since') else None
+        until = float(request.args['until']) if request.args.get('until') else None
+        limit = int(request.args.get('limit', DEFAULT_OPERATIONS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({
+            "error": "invalid_parameter",
+            "message": "since and until must be numbers, limit an integer"
+        }), 400
+
+    filters = {name: request.args[name] for name in FILTER_COLUMNS if request.args.get(name)}
+    try:
+        page = get_operation_history().query(filters, since, until, request.args.get('cursor') or None, limit)
+    except InvalidCursor as e:
+        return jsonify({
+            "error": "invalid_cursor",
+            "message": str(e)
+        }), 400
+    return jsonify(page)
+
+@app.route('/fleet')
+@login_required
+def fleet():
+    """
+    Fleet dashboard route showing the status of every configured server
+    """
+    return render_template('fleet.html')
+
+@app.route('/get_services_all')
+@login_required
+def get_services_all():
+    """
+    Get services for every configured server, checked in parallel
+
+    Query Args:
+        deadline (float, optional): Seconds each server check may take before it is marked timed out
+
+    Returns:
+        JSON: One entry per server with its status and services
+    """
+    username = current_user.username
+    password = credential_store.get(username)
+    deadline = request.args.get('deadline', default=DEFAULT_SERVER_DEADLINE, type=float)
+
+    with priority_scope(INTERACTIVE):
+        return jsonify(check_fleet(status_poller, username, password, server_deadline=deadline))
+
+@app.route('/stream/status')
+@app.route('/stream/status/<server_id>')
+@login_required
+def stream_status_changes(server_id=None):
+    """
+    Server-Sent Events stream of status transitions
+
+    Args:
+        server_id (str, optional): Server to follow; all servers if omitted
+
+    Returns:
+        Response: text/event-stream with snapshot, status and heartbeat events
+    """
+    not_found = server_id is not None and server_not_found(server_id)
+    if not_found:
+        return not_found
+
+    # Make sure this worker's poller is running for sessions that outlived a restart;
+    # it reads its credentials from the shared store
+    status_poller.start()
+
+    return Response(
+        stream_with_context(stream_status(status_poller, server_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/manage_eap/<server_id>/<action>', methods=['POST'])
 @login_required
+@traced('POST /manage_eap', force=trace_requested)
 def manage_eap_service(server_id, action):
     """
-    Manage EAP service (start/stop) for a specific server
+    Submit an EAP service operation (start/stop) for a specific server as a background job
     
     Args:
         server_id (str): ID of the server to manage EAP on
         action (str): Action to perform ('start' or 'stop')
         
     Returns:
-        JSON: Result of the operation
+        JSON: The submitted job, or the existing job if the same action is already pending
     """
     if action not in ['start', 'stop']:
         return jsonify({
             "error": "invalid_action",
             "message": "Action must be either 'start' or 'stop'"
         }), 400
-        
+    not_found = server_not_found(server_id)
+    if not_found:
+        return not_found
+
     try:
         if not current_user.is_authenticated:
             raise ValueError("User not authenticated")
             
         username = current_user.username
-        password = _user_passwords.get(username)
+        password = credential_store.get(username)
         
         if not username or not password:
             raise ValueError("Missing credentials")
-            
-        # Call manage_jboss function with the credentials
-        manage_jboss(server_id, action, username, password, "config/server_config.json")
-        
-        return jsonify({
+
+        job, created = job_queue.submit(server_id, action, username, password)
+
+        response = job.to_dict()
+        response.update({
             "success": True,
-            "message": f"EAP {action} operation initiated successfully"
+            "message": f"EAP {action} operation {'queued' if created else 'already pending'}"
         })
-        
+        return jsonify(response), 202
+
     except Exception as e:
         return jsonify({
             "error": "operation_failed",
             "message": str(e)
         }), 500
 
+@app.route('/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    """
+    Get the status and captured output of an EAP operation job
+
+    Args:
+        job_id (str): ID returned by /manage_eap
+
+    Returns:
+        JSON: Job state
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            "error": "job_not_found",
+            "message": f"Job '{job_id}' not found"
+        }), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/stream')
+@login_required
+def stream_job_output(job_id):
+    """
+    Server-Sent Events stream of an EAP operation job's output, line by line as it arrives
+
+    Args:
+        job_id (str): ID returned by /manage_eap
+
+    Returns:
+        Response: text/event-stream with job, line, gap and done events
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            "error": "job_not_found",
+            "message": f"Job '{job_id}' not found"
+        }), 404
+
+    # A reconnecting EventSource sends the seq of the last line it received
+    after = request.headers.get('Last-Event-ID') or request.args.get('after') or 0
+    try:
+        after = max(0, int(after))
+    except ValueError:
+        return jsonify({
+            "error": "invalid_parameter",
+            "message": "after must be an integer line number"
+        }), 400
+
+    return Response(
+        stream_with_context(stream_job(job, after)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/admin/admission')
+@login_required
+def admission_stats():
+    """
+    Get the state of the remote call admission controller
+
+    Returns:
+        JSON: Limits, running and queued calls and shed polls by priority
+    """
+    return jsonify(get_admission().stats())
+
+@app.route('/metrics')
+def metrics():
+    """
+    Expose latency histograms, failure counters and in-flight gauges for Prometheus
+
+    Returns:
+        Response: Metrics in the Prometheus text exposition format
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/traces')
+@login_required
+def traces():
+    """
+    Admin page rendering a span waterfall for each recently traced request
+
+    Query Args:
+        trace_id (str, optional): Trace shown expanded, e.g. the trace_id of a job
+    """
+    return render_template('traces.html', traces=[trace.to_dict() for trace in TRACER.recent()],
+                           sample_rate=TRACER.sample_rate, open_trace=request.args.get('trace_id'))
+
+@app.route('/admin/traces/<trace_id>')
+@login_required
+def get_trace(trace_id):
+    """
+    Get one recorded trace
+
+    Args:
+        trace_id (str): ID of the trace
+
+    Returns:
+        JSON: Trace with its spans in call-tree order
+    """
+    trace = TRACER.get(trace_id)
+    if trace is None:
+        return jsonify({
+            "error": "trace_not_found",
+            "message": f"Trace '{trace_id}' not found"
+        }), 404
+    return jsonify(trace.to_dict())
+
+@app.route('/admin/traces/sampling', methods=['POST'])
+@login_required
+def set_trace_sampling():
+    """
+    Change the share of requests that are traced
+
+    Form Args:
+        rate (float): Sample rate between 0 (off) and 1 (every request)
+    """
+    try:
+        rate = float(request.form.get('rate', ''))
+        if not 0 <= rate <= 1:
+            raise ValueError(rate)
+    except ValueError:
+        flash('Sample rate must be a number between 0 and 1', 'error')
+    else:
+        TRACER.sample_rate = rate
+        flash(f'Tracing {rate:.0%} of requests', 'success')
+    return redirect(url_for('traces'))
+
+@app.route('/rollouts', methods=['POST'])
+@login_required
+def start_rollout():
+    """
+    Start or stop many servers in waves
+
+    JSON Body:
+        action (str): 'start' or 'stop'
+        servers (list, optional): Server IDs in rollout order, all configured servers if omitted
+        wave_size (int, optional): Maximum number of servers acted on at the same time
+        max_failures (int, optional): Failed servers tolerated per wave before the rollout halts
+        wave_timeout (float, optional): Seconds a wave may take to reach the target state
+
+    Returns:
+        JSON: The started rollout
+    """
+    body = request.get_json(silent=True)
+    body = body if isinstance(body, dict) else {}
+    username = current_user.username
+    password = credential_store.get(username)
+    if not password:
+        return jsonify({
+            "error": "operation_failed",
+            "message": "Missing credentials"
+        }), 500
+
+    servers = body.get('servers')
+    if servers is not None and not (isinstance(servers, list) and all(isinstance(s, str) for s in servers)):
+        return jsonify({
+            "error": "invalid_parameter",
+            "message": "servers must be a list of server IDs"
+        }), 400
+
+    server_config = ServerConfig.get_instance()
+    servers = servers or server_config.server_ids()
+    unknown = [server_id for server_id in servers if server_config.get_entry(server_id) is None]
+    if unknown:
+        return jsonify({
+            "error": "unknown_servers",
+            "message": f"Servers not found in configuration: {', '.join(unknown)}"
+        }), 400
+
+    try:
+        rollout = rollout_manager.start(
+            body.get('action'), servers, username, password,
+            wave_size=int(body.get('wave_size', DEFAULT_WAVE_SIZE)),
+            max_failures=int(body.get('max_failures', DEFAULT_MAX_FAILURES)),
+            wave_timeout=float(body.get('wave_timeout', DEFAULT_WAVE_TIMEOUT))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            "error": "invalid_rollout",
+            "message": str(e)
+        }), 400
+
+    return jsonify(rollout.to_dict()), 202
+
+@app.route('/rollouts/<rollout_id>')
+@login_required
+def get_rollout(rollout_id):
+    """
+    Get the progress of a rollout
+
+    Args:
+        rollout_id (str): ID returned by POST /rollouts
+
+    Returns:
+        JSON: Rollout state with per-wave, per-server results
+    """
+    rollout = rollout_manager.get(rollout_id)
+    if rollout is None:
+        return jsonify({
+            "error": "rollout_not_found",
+            "message": f"Rollout '{rollout_id}' not found"
+        }), 404
+    return jsonify(rollout.to_dict())
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """
@@ -169,8 +690,12 @@ def login():
         if AuthManager.authenticate_user(username, password):
             # Store user in session with password
             user = User(username, password)
-            _user_passwords[username] = password  # Store password for session
+            credential_store.put(username, password)  # Encrypted, shared with the other workers
             login_user(user)
+            status_poller.start()
+            if prefetch_enabled():
+                # Runs in the background; the redirect to home() does not wait for it
+                prefetcher.prefetch(username, password)
             return redirect(url_for('home'))
         else:
             flash('Invalid username or password', 'error')
@@ -184,7 +709,9 @@ def logout():
     Logout route
     """
     if current_user.is_authenticated:
-        _user_passwords.pop(current_user.username, None)  # Remove password on logout
+        prefetcher.cancel(current_user.username)  # Skip servers not prefetched yet
+        credential_store.delete(current_user.username)  # Remove password on logout
+        get_session_pool().close_user(current_user.username)  # Close the user's warm PSSessions
     logout_user()
     return redirect(url_for('login'))
 
@@ -0,0 +1,170 @@
+"""
+Module for non-blocking, structured application logging.
+
+Loggers created here only put records on an in-memory queue; a background listener
+thread formats them as JSON lines into a rotating file under logs/ and echoes INFO and
+above to the console. Request threads therefore never wait on disk or console I/O. When
+the queue is full, records are dropped and counted instead of blocking.
+
+Captured command output is capped at MAX_OUTPUT_CHARS per field. Full script and
+response dumps are only produced for servers with debug switched on, either through
+EAP_DEBUG_SERVERS (comma-separated server IDs, or "*") or a `"debug": true` entry on
+the server in config/server_config.json.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+
+# Maximum characters kept of a captured stdout/stderr field
+MAX_OUTPUT_CHARS = 4000
+
+# Maximum number of records waiting for the background writer
+QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else passed through `extra` is written as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listeners: Dict[str, QueueListener] = {}
+_lock = threading.Lock()
+
+
+def truncate_output(value: Any, limit: int = MAX_OUTPUT_CHARS) -> Any:
+    """
+    Cap the length of captured output
+
+    Args:
+        value (Any): Value to cap; non-strings are returned unchanged
+        limit (int): Maximum number of characters kept
+
+    Returns:
+        Any: The value, with long strings cut and marked as truncated
+    """
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + f"... [truncated {len(value) - limit} chars]"
+    return value
+
+
+def is_debug_enabled(server_id: Optional[str]) -> bool:
+    """
+    Check whether full debug dumps are switched on for a server
+
+    Args:
+        server_id (str, optional): ID of the server
+
+    Returns:
+        bool: True if EAP_DEBUG_SERVERS lists the server (or "*") or its config sets "debug": true
+    """
+    debug_servers = {name.strip() for name in os.environ.get('EAP_DEBUG_SERVERS', '').split(',') if name.strip()}
+    if '*' in debug_servers or server_id in debug_servers:
+        return True
+    if server_id is None:
+        return False
+    # Imported here so logging can be set up before the configuration is loaded
+    from models.server_config import ServerConfig
+    server_info = ServerConfig.get_instance().get_server_info(server_id) or {}
+    return bool(server_info.get('debug', False))
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key in _RECORD_ATTRIBUTES or key.startswith('_'):
+                continue
+            if isinstance(value, dict):
+                value = {k: truncate_output(v) for k, v in value.items()}
+            entry[key] = truncate_output(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = truncate_output(record.exc_text)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep the original message and arguments; formatting happens on the writer thread
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def get_logger(name: str, filename: Optional[str] = None, console_level: int = logging.INFO) -> logging.Logger:
+    """
+    Get a logger that writes through a background queue listener
+
+    Args:
+        name (str): Logger name
+        filename (str, optional): File under logs/ receiving JSON lines, defaults to "<name>.log"
+        console_level (int): Minimum level echoed to the console
+
+    Returns:
+        logging.Logger: Logger whose records are written off the calling thread
+    """
+    logger = logging.getLogger(name)
+    with _lock:
+        if name in _listeners:
+            return logger
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            os.path.join(LOG_DIR, filename or f'{name}.log'),
+            maxBytes=1024*1024,  # 1MB
+            backupCount=5
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(JsonLinesFormatter())
+
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(console_level)
+        console_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+
+        log_queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.addHandler(DroppingQueueHandler(log_queue))
+    return logger
+
+
+@atexit.register
+def _flush_listeners() -> None:
+    """Write out queued records when the process exits"""
+    with _lock:
+        listeners = list(_listeners.values())
+    for listener in listeners:
+        listener.stop()
@@ -0,0 +1,146 @@
+"""
+Module for running remote work on one shared asyncio event loop.
+
+With EAP_ASYNC=1 status checks, fleet checks and start/stop operations are run as
+coroutines on a single background event loop instead of occupying a worker thread for
+the whole remote round trip, so one process can keep hundreds of checks in flight.
+PowerShell hosts are driven with asyncio subprocess pipes; backends without native
+asyncio support (JBoss HTTP client) are offloaded to the loop's bounded thread pool
+(EAP_ASYNC_OFFLOAD_THREADS).
+
+Sync code submits coroutines with `get_runtime().run(coro)`; the caller's context
+variables, and therefore its deadline (see deadline.py), carry over to the coroutine.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Optional
+
+# Threads available to backends that can only block
+DEFAULT_OFFLOAD_THREADS = 32
+
+
+def async_enabled() -> bool:
+    """
+    Returns:
+        bool: True if EAP_ASYNC switches status and management work to the event loop
+    """
+    return os.environ.get('EAP_ASYNC', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+class AsyncRuntime:
+    """Background thread running an asyncio event loop for remote work"""
+
+    def __init__(self, offload_threads: int = DEFAULT_OFFLOAD_THREADS):
+        """
+        Initialize the runtime; the loop thread starts on first use
+
+        Args:
+            offload_threads (int): Size of the thread pool for blocking backends
+        """
+        self.offload_threads = offload_threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Returns:
+            asyncio.AbstractEventLoop: The running loop, started if necessary
+        """
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._start()
+            return self._loop
+
+    def _start(self) -> None:
+        """Create the loop and run it on a daemon thread"""
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.offload_threads,
+                                                     thread_name_prefix='async-offload'))
+        started = threading.Event()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            loop.call_soon(started.set)
+            loop.run_forever()
+
+        self._loop = loop
+        self._thread = threading.Thread(target=run, name='async-runtime', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def in_loop_thread(self) -> bool:
+        """
+        Returns:
+            bool: True if called from the event loop thread, where run() would deadlock
+        """
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """
+        Schedule a coroutine on the loop without waiting for it
+
+        Args:
+            coro (Coroutine): Coroutine to run
+
+        Returns:
+            concurrent.futures.Future: Future of the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and wait for its result
+
+        Args:
+            coro (Coroutine): Coroutine to run
+            timeout (float, optional): Seconds to wait; the coroutine is cancelled when it passes
+
+        Returns:
+            Any: Result of the coroutine
+
+        Raises:
+            RuntimeError: If called from the loop thread itself
+            TimeoutError: If the timeout passed first
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() cannot be called from the event loop thread")
+        future = self.submit(coro)
+        # Not future.result(timeout): TimeoutErrors raised by the coroutine must pass through unchanged
+        if not concurrent.futures.wait([future], timeout).done:
+            future.cancel()
+            raise TimeoutError("Coroutine did not finish in time")
+        return future.result()
+
+    def stop(self) -> None:
+        """Stop the loop and its thread"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+
+_runtime: Optional[AsyncRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> AsyncRuntime:
+    """
+    Get the process-wide async runtime, creating it on first use
+
+    Returns:
+        AsyncRuntime: Runtime sized by EAP_ASYNC_OFFLOAD_THREADS
+    """
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = AsyncRuntime(int(os.environ.get('EAP_ASYNC_OFFLOAD_THREADS', DEFAULT_OFFLOAD_THREADS)))
+        return _runtime
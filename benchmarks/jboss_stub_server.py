@@ -0,0 +1,181 @@
+"""
+Stub of the JBoss EAP HTTP management endpoint for local testing.
+
+Answers JSON DMR requests on /management with optional Digest authentication and keeps a
+status per server-config address, so the jboss-http executor can be exercised without JBoss.
+Wildcard status reads (/host=*/server-config=*) list every server-config that was declared
+with --server-config or addressed by an earlier request.
+
+Usage:
+    python benchmarks/jboss_stub_server.py --port 9990 --user admin --password secret \
+        --server-config prod92/SVR_PROD92_01
+    EAP_EXECUTOR=jboss-http EAP_JBOSS_HTTP_CONTROLLER=127.0.0.1:9990 python app.py
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_AUTH_RE = re.compile(r'(\w+)=(?:"([^"]*)"|([^\s,]*))')
+
+
+class StubState:
+    """Server-config statuses and request counters of the stub"""
+
+    def __init__(self, default_status: str = 'STARTED', latency: float = 0.0,
+                 server_configs: Iterable[Tuple[str, str]] = ()):
+        self.default_status = default_status
+        self.latency = latency
+        self.statuses: Dict[Tuple, str] = {
+            (('host', host), ('server-config', name)): default_status for host, name in server_configs}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def handle(self, request: Dict) -> Dict:
+        """
+        Execute a DMR request against the stub state
+
+        Args:
+            request (Dict): Parsed JSON DMR request
+
+        Returns:
+            Dict: DMR response
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        address = tuple(tuple(item.items())[0] for item in request.get('address', []))
+        operation = request.get('operation')
+        with self.lock:
+            self.requests += 1
+            if operation == 'read-attribute' and request.get('name') == 'status':
+                if any(value == '*' for _, value in address):
+                    return {"outcome": "success", "result": self._wildcard_status(address)}
+                return {"outcome": "success", "result": self.statuses.setdefault(address, self.default_status)}
+            if operation in ('start', 'stop'):
+                self.statuses[address] = 'STARTED' if operation == 'start' else 'STOPPED'
+                return {"outcome": "success", "result": self.statuses[address]}
+        return {"outcome": "failed", "failure-description": f"Unsupported operation {operation}"}
+
+    def _wildcard_status(self, pattern: Tuple) -> List[Dict]:
+        """Per-address status results of every known address matching a wildcard address"""
+        return [{
+            "address": [{key: value} for key, value in address],
+            "outcome": "success",
+            "result": status
+        } for address, status in self.statuses.items()
+            if len(address) == len(pattern)
+            and all(key == wanted_key and wanted in ('*', value)
+                    for (key, value), (wanted_key, wanted) in zip(address, pattern))]
+
+
+def make_handler(state: StubState, username: Optional[str], password: Optional[str]):
+    """
+    Build a request handler class bound to the stub state and credentials
+
+    Args:
+        state (StubState): Shared stub state
+        username (str, optional): Required Digest user; no authentication if None
+        password (str, optional): Required Digest password
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass
+    """
+    realm = 'ManagementRealm'
+    nonce = uuid.uuid4().hex
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _authorized(self) -> bool:
+            if username is None:
+                return True
+            header = self.headers.get('Authorization', '')
+            if not header.startswith('Digest '):
+                return False
+            fields = {m.group(1): m.group(2) if m.group(2) is not None else m.group(3)
+                      for m in _AUTH_RE.finditer(header)}
+            ha1 = hashlib.md5(f"{username}:{realm}:{password}".encode()).hexdigest()
+            ha2 = hashlib.md5(f"POST:{fields.get('uri')}".encode()).hexdigest()
+            expected = hashlib.md5(
+                f"{ha1}:{nonce}:{fields.get('nc')}:{fields.get('cnonce')}:auth:{ha2}".encode()).hexdigest()
+            return fields.get('username') == username and fields.get('response') == expected
+
+        def _reply(self, status: int, body: Dict, headers: Optional[Dict] = None) -> None:
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length)
+            if self.path != '/management':
+                self._reply(404, {"outcome": "failed", "failure-description": "Not found"})
+                return
+            if not self._authorized():
+                self._reply(401, {"outcome": "failed"}, {
+                    'WWW-Authenticate': f'Digest realm="{realm}", nonce="{nonce}", qop="auth", algorithm=MD5'
+                })
+                return
+            self._reply(200, state.handle(json.loads(body)))
+
+    return Handler
+
+
+def serve(port: int = 9990, username: Optional[str] = None, password: Optional[str] = None,
+          default_status: str = 'STARTED', latency: float = 0.0,
+          server_configs: Iterable[Tuple[str, str]] = ()) -> Tuple[ThreadingHTTPServer, StubState]:
+    """
+    Start the stub server in a background thread
+
+    Args:
+        port (int): Port to listen on, 0 for any free port
+        username (str, optional): Required Digest user
+        password (str, optional): Required Digest password
+        default_status (str): Status of server-configs that were never started or stopped
+        latency (float): Seconds added to every request
+        server_configs (Iterable[Tuple[str, str]]): (host, server-config) pairs known from the start
+
+    Returns:
+        Tuple[ThreadingHTTPServer, StubState]: Running server and its state
+    """
+    state = StubState(default_status, latency, server_configs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state, username, password))
+    threading.Thread(target=server.serve_forever, name='jboss-stub', daemon=True).start()
+    return server, state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Stub JBoss HTTP management endpoint')
+    parser.add_argument('--port', type=int, default=9990)
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--status', default='STARTED', help='initial status of every server-config')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--server-config', action='append', default=[], metavar='HOST/NAME',
+                        help='server-config listed by wildcard reads, repeatable')
+    args = parser.parse_args()
+
+    server_configs = [tuple(item.split('/', 1)) for item in args.server_config]
+    server, _ = serve(args.port, args.user, args.password, args.status, args.latency, server_configs)
+    print(f"JBoss management stub listening on 127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
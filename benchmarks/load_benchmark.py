@@ -0,0 +1,144 @@
+"""
+Load and latency benchmark for the EAP Manager routes.
+
+Drives /get_services and /manage_eap with N concurrent simulated users against the
+simulated remote executor, so it runs on any machine without PowerShell or JBoss.
+Reports requests/sec, p50/p95/p99 latency, errors and the number of processes or
+sessions the executor started.
+
+Usage:
+    python benchmarks/load_benchmark.py --users 50 --duration 20
+    python benchmarks/load_benchmark.py --users 20 --endpoint manage_eap --latency 0.2
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+from typing import Dict, List
+
+# Run from the repository root regardless of the working directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('EAP_EXECUTOR', 'simulated')
+
+from remote_executor import SimulatedExecutor, SimulatedServerProfile, get_executor, set_executor  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Get a percentile of a list of values
+
+    Args:
+        values (List[float]): Measured values
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: Nearest-rank percentile, 0 if there are no values
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_user(app, user_index: int, endpoint: str, servers: List[str], stop_at: float,
+             latencies: Dict[str, List[float]], errors: Dict[str, int], lock: threading.Lock) -> None:
+    """
+    Log in one simulated user and send requests until stop_at
+
+    Args:
+        app: Flask application under test
+        user_index (int): Index of the user, used for the username and server rotation
+        endpoint (str): "get_services", "manage_eap" or "mixed"
+        servers (List[str]): Server IDs to rotate through
+        stop_at (float): time.monotonic() value at which to stop
+        latencies (Dict[str, List[float]]): Collected latencies by endpoint
+        errors (Dict[str, int]): Collected error counts by endpoint
+        lock (threading.Lock): Lock guarding latencies and errors
+    """
+    client = app.test_client()
+    client.post('/login', data={'username': f'bench-user-{user_index}', 'password': 'bench'})
+    request_index = 0
+    while time.monotonic() < stop_at:
+        server = servers[(user_index + request_index) % len(servers)]
+        if endpoint == 'mixed':
+            name = 'manage_eap' if request_index % 10 == 9 else 'get_services'
+        else:
+            name = endpoint
+
+        started = time.perf_counter()
+        if name == 'get_services':
+            response = client.get(f'/get_services/{server}')
+        else:
+            action = 'start' if request_index % 2 == 0 else 'stop'
+            response = client.post(f'/manage_eap/{server}/{action}')
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            latencies.setdefault(name, []).append(elapsed)
+            if response.status_code >= 500:
+                errors[name] = errors.get(name, 0) + 1
+        request_index += 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20, help='number of concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to run')
+    parser.add_argument('--endpoint', choices=['get_services', 'manage_eap', 'mixed'], default='get_services')
+    parser.add_argument('--latency', type=float, default=0.5, help='mean simulated status call latency (s)')
+    parser.add_argument('--action-latency', type=float, default=2.0, help='mean simulated start/stop latency (s)')
+    parser.add_argument('--session-latency', type=float, default=1.5, help='simulated session setup latency (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='probability of a script error')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    set_executor(SimulatedExecutor(
+        default_profile=SimulatedServerProfile(
+            latency=args.latency, jitter=args.latency / 5, session_latency=args.session_latency,
+            failure_rate=args.failure_rate, action_latency=args.action_latency
+        ),
+        seed=args.seed
+    ))
+
+    # Imported after the executor is configured so the app picks it up
+    import app as app_module
+    from models.server_config import ServerConfig
+
+    servers = ServerConfig.get_instance().server_ids()
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    # Keep the app's per-request console output out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.monotonic()
+        stop_at = started + args.duration
+        threads = [threading.Thread(target=run_user,
+                                    args=(app_module.app, i, args.endpoint, servers, stop_at,
+                                          latencies, errors, lock))
+                   for i in range(args.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.monotonic() - started
+        app_module.status_poller.stop()
+
+    stats = get_executor().stats()
+    print(f"users={args.users} duration={wall:.1f}s endpoint={args.endpoint} "
+          f"latency={args.latency}s session_latency={args.session_latency}s")
+    print(f"{'endpoint':<14}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, values in sorted(latencies.items()):
+        print(f"{name:<14}{len(values):>10}{len(values) / wall:>10.1f}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}{errors.get(name, 0):>8}")
+    print(f"remote calls={stats.get('calls', 0)} spawned processes/sessions={stats.get('spawned', 0)} "
+          f"max concurrent remote calls={stats.get('max_in_flight', 'n/a')}")
+
+
+if __name__ == '__main__':
+    main()
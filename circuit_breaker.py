@@ -0,0 +1,138 @@
+"""
+Module for per-server circuit breakers around remote status checks.
+
+After `failure_threshold` consecutive connection failures a server's breaker opens:
+checks fail fast instead of waiting for another New-PSSession/WinRM timeout. Once the
+backoff has elapsed one probe is let through (half-open); success closes the breaker,
+failure opens it again with the backoff doubled, up to `max_backoff`.
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+# Defaults for every server's breaker
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_BASE_BACKOFF = 15.0  # seconds before the first probe
+DEFAULT_MAX_BACKOFF = 600.0  # upper bound of the probe backoff
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Tracks consecutive connection failures of one server"""
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 base_backoff: float = DEFAULT_BASE_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF):
+        """
+        Initialize a closed breaker
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the breaker
+            base_backoff (float): Seconds before the first probe after opening
+            max_backoff (float): Maximum seconds between probes
+        """
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_count = 0
+        self.retry_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Check whether a remote call may go out now
+
+        Returns:
+            bool: True if closed, or if open and due for a probe (the breaker turns half-open
+            and lets exactly this one call through)
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() >= self.retry_at:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """Hand back a probe that never reached the server, so the next call probes instead"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def record_success(self) -> None:
+        """Close the breaker after a call that reached the server"""
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_count = 0
+            self.retry_at = None
+
+    def record_failure(self) -> None:
+        """Count a connection failure, opening the breaker when the threshold is reached"""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_count += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.opened_count - 1))
+                # Jitter keeps servers that failed together from probing together
+                self.retry_at = time.time() + backoff * random.uniform(0.9, 1.1)
+                self.state = OPEN
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the breaker state
+
+        Returns:
+            Dict: State, consecutive failures and next probe time
+        """
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "retry_at": self.retry_at}
+
+
+class CircuitBreakerRegistry:
+    """One breaker per server, created on first use"""
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 base_backoff: float = DEFAULT_BASE_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF):
+        """
+        Initialize the registry
+
+        Args:
+            failure_threshold (int): Consecutive failures that open a breaker
+            base_backoff (float): Seconds before the first probe after opening
+            max_backoff (float): Maximum seconds between probes
+        """
+        self._settings = (failure_threshold, base_backoff, max_backoff)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, server_id: str) -> CircuitBreaker:
+        """
+        Get the breaker of a server
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            CircuitBreaker: The server's breaker
+        """
+        with self._lock:
+            breaker = self._breakers.get(server_id)
+            if breaker is None:
+                breaker = self._breakers[server_id] = CircuitBreaker(*self._settings)
+            return breaker
+
+    def states(self) -> Dict[str, Dict]:
+        """
+        Returns:
+            Dict[str, Dict]: Breaker state per server
+        """
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {server_id: breaker.to_dict() for server_id, breaker in breakers.items()}
@@ -0,0 +1,190 @@
+"""
+Module for reading the status of every server-config behind a domain controller at once.
+
+The servers in server_config.json each have their own check_jboss_is_running command,
+but many point at the same domain controller. Instead of one read-attribute per server,
+ControllerStatusCache sends a single wildcard read per controller,
+/host=*/server-config=*:read-attribute(name=status), and caches the statuses of the whole
+group for `ttl` seconds. The other servers' checks in that group are then answered from
+the cache. Concurrent checks of the same controller share one request. A controller that
+rejects the wildcard read is not asked again for a while, and its servers fall back to
+per-server reads. A cached status that is still changing (STARTING, STOPPING) is not
+reused either: that server is read on its own, so a start/stop is seen to finish as soon
+as it does rather than up to `ttl` seconds later.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+# Seconds a controller's batch of statuses is reused
+DEFAULT_TTL = 10.0
+
+# Seconds before a controller that rejected the wildcard read is tried again
+UNSUPPORTED_RETRY = 600.0
+
+CONTROLLER_BATCHES = REGISTRY.counter(
+    'eap_controller_batch_total', 'Server-config status lookups answered by controller batches',
+    ('controller', 'outcome'))
+
+# Server-config statuses of a start/stop still in progress
+TRANSITIONAL_STATUSES = ('STARTING', 'STOPPING')
+
+ControllerKey = Tuple[str, int]
+
+
+class _Batch:
+    """Status responses of one controller's server-configs, keyed by (host, server-config)"""
+
+    def __init__(self, responses: Dict[Tuple[str, str], Dict]):
+        self.responses = responses
+        self.fetched_at = time.monotonic()
+
+
+class ControllerStatusCache:
+    """TTL cache of per-controller server-config statuses with single-flight refresh"""
+
+    def __init__(self, client, ttl: Optional[float] = None):
+        """
+        Initialize the cache
+
+        Args:
+            client (JBossManagementClient): Client sending the batched reads
+            ttl (float, optional): Seconds a batch is reused, defaults to EAP_CONTROLLER_STATUS_TTL or DEFAULT_TTL
+        """
+        self.client = client
+        self.ttl = ttl if ttl is not None else float(os.environ.get('EAP_CONTROLLER_STATUS_TTL', DEFAULT_TTL))
+        self._batches: Dict[ControllerKey, _Batch] = {}
+        self._in_flight: Dict[ControllerKey, threading.Event] = {}
+        self._unsupported: Dict[ControllerKey, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def batchable(operation) -> bool:
+        """
+        Check whether an operation is a server-config status read the batch can answer
+
+        Args:
+            operation (CliOperation): Parsed check command
+
+        Returns:
+            bool: True for read-attribute(name=status) on /host=X/server-config=Y
+        """
+        return (operation.operation == 'read-attribute' and operation.params.get('name') == 'status'
+                and [key for key, _ in operation.address] == ['host', 'server-config'])
+
+    def read_status(self, operation, username: str, password: str,
+                    timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        Get a server-config's status from its controller's batch, fetching the batch if needed
+
+        Args:
+            operation (CliOperation): Status read of one server-config, see batchable()
+            username (str): Management user
+            password (str): Management password
+            timeout (float, optional): Seconds allowed for the request
+
+        Returns:
+            Optional[Dict]: The server-config's own DMR response ({"outcome", "result", ...}) taken
+            from the batch, None if the caller has to read the status itself, e.g. the controller
+            rejected the wildcard read, the server-config is not in the batch or its cached
+            status is transitional
+
+        Raises:
+            ConnectionError: If the controller cannot be reached
+            TimeoutError: If the controller did not answer in time
+        """
+        controller = (operation.host, operation.port)
+        label = f"{operation.host}:{operation.port}"
+        target = (operation.address[0][1], operation.address[1][1])
+
+        while True:
+            with self._lock:
+                if time.monotonic() < self._unsupported.get(controller, 0):
+                    CONTROLLER_BATCHES.inc(controller=label, outcome='unsupported')
+                    return None
+                batch = self._batches.get(controller)
+                if batch is not None and time.monotonic() - batch.fetched_at < self.ttl:
+                    response = batch.responses.get(target)
+                    if response is not None and response.get('result') in TRANSITIONAL_STATUSES:
+                        CONTROLLER_BATCHES.inc(controller=label, outcome='transitional')
+                        return None
+                    CONTROLLER_BATCHES.inc(controller=label, outcome='hit')
+                    return response
+                done = self._in_flight.get(controller)
+                leader = done is None
+                if leader:
+                    done = self._in_flight[controller] = threading.Event()
+            if leader:
+                break
+            # Another check of this controller is fetching the batch; use its result
+            if not done.wait(timeout):
+                raise TimeoutError(f"JBoss controller {label} did not answer in time")
+
+        try:
+            responses = self._fetch(operation, username, password, timeout)
+        finally:
+            with self._lock:
+                self._in_flight.pop(controller, None)
+            done.set()
+
+        if responses is None:
+            with self._lock:
+                self._unsupported[controller] = time.monotonic() + UNSUPPORTED_RETRY
+            CONTROLLER_BATCHES.inc(controller=label, outcome='unsupported')
+            return None
+        with self._lock:
+            self._batches[controller] = _Batch(responses)
+        CONTROLLER_BATCHES.inc(controller=label, outcome='fetched')
+        return responses.get(target)
+
+    def _fetch(self, operation, username: str, password: str,
+               timeout: Optional[float]) -> Optional[Dict[Tuple[str, str], Dict]]:
+        """
+        Read the status of every server-config of a controller in one request
+
+        Returns:
+            Optional[Dict[Tuple[str, str], Dict]]: Per-server-config response by (host, server-config),
+            None if the controller rejected the wildcard read
+        """
+        # Imported here because jboss_http_client builds on this module
+        from jboss_http_client import CliOperation
+
+        wildcard = CliOperation(operation.host, operation.port, [('host', '*'), ('server-config', '*')],
+                                'read-attribute', {'name': 'status'})
+        response = self.client.execute(wildcard, username, password, timeout)
+        if response.get('outcome') != 'success' or not isinstance(response.get('result'), list):
+            return None
+
+        responses: Dict[Tuple[str, str], Dict] = {}
+        for item in response['result']:
+            address = dict(next(iter(part.items())) for part in item.get('address', []))
+            if 'host' in address and 'server-config' in address:
+                responses[(address['host'], address['server-config'])] = {
+                    key: value for key, value in item.items() if key != 'address'}
+        return responses
+
+    def invalidate(self, host: str, port: int) -> None:
+        """
+        Drop a controller's batch, e.g. after a start/stop changed one of its servers
+
+        Args:
+            host (str): Controller host
+            port (int): Controller management port
+        """
+        with self._lock:
+            self._batches.pop((host, port), None)
+
+    def stats(self) -> Dict:
+        """
+        Returns:
+            Dict: Number of controllers with a cached batch and server-configs they cover
+        """
+        with self._lock:
+            batches = list(self._batches.values())
+        return {
+            "controllers_cached": len(batches),
+            "server_configs_cached": sum(len(batch.responses) for batch in batches)
+        }
@@ -0,0 +1,228 @@
+"""
+Module for watching a server converge to the state a start/stop aims for.
+
+A start or stop script usually returns before JBoss has finished booting or shutting
+down; in between the server reports STARTING or STOPPING. After a successful start/stop
+the job keeps checking the server until it reports STARTED or STOPPED, or
+EAP_CONVERGENCE_TIMEOUT seconds pass (default 300; 0 turns the watch off). The first check
+runs right away, and the interval between checks starts at FIRST_CHECK_INTERVAL and grows
+by CHECK_BACKOFF up to MAX_CHECK_INTERVAL, so a fast start is seen to finish within about
+a second, and a slow boot does not keep a remote session busy.
+
+The watch reports each state seen along the way, and the time to ready: seconds from
+sending the start/stop to the first check that showed the target state. It runs after the
+job has released its server (see jobs.JobQueue), and a later start/stop of the same server
+cancels it.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from admission import INTERACTIVE, priority_scope
+from metrics import REGISTRY
+from status_poller import StatusSnapshot
+from tracing import annotate, span
+
+# JBoss status each action converges to
+TARGET_STATUS = {'start': 'STARTED', 'stop': 'STOPPED'}
+
+# Check schedule after a start/stop: seconds before the second check, growth factor and cap
+FIRST_CHECK_INTERVAL = 0.5
+CHECK_BACKOFF = 1.5
+MAX_CHECK_INTERVAL = 10.0
+
+# Seconds a server may take to reach the target state when EAP_CONVERGENCE_TIMEOUT is not set
+DEFAULT_TIMEOUT = 300.0
+
+WATCHING = 'watching'
+READY = 'ready'
+TIMED_OUT = 'timed_out'
+CANCELLED = 'cancelled'
+
+TIME_TO_READY_SECONDS = REGISTRY.histogram(
+    'eap_time_to_ready_seconds', 'Seconds from sending a start/stop until the server reported the target state',
+    ('action',), buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600))
+CONVERGENCE_TOTAL = REGISTRY.counter('eap_convergence_total', 'Start/stop operations watched until converged',
+                                     ('action', 'outcome'))
+
+
+def convergence_timeout() -> float:
+    """
+    Returns:
+        float: Seconds a server may take to reach the target state, 0 if the watch is off
+    """
+    return float(os.environ.get('EAP_CONVERGENCE_TIMEOUT', DEFAULT_TIMEOUT))
+
+
+def reached_target(snapshot: Optional[StatusSnapshot], action: str) -> bool:
+    """
+    Check whether a server reached the state an action aims for
+
+    Args:
+        snapshot (Optional[StatusSnapshot]): Latest status of the server
+        action (str): "start" or "stop"
+
+    Returns:
+        bool: True if the JBoss status (or, without one, every service) matches the action
+    """
+    if snapshot is None or snapshot.error:
+        return False
+    if snapshot.jboss_status is not None:
+        return snapshot.jboss_status == TARGET_STATUS[action]
+    return bool(snapshot.services) and all(service['running'] is (action == 'start')
+                                           for service in snapshot.services)
+
+
+def describe_state(snapshot: Optional[StatusSnapshot]) -> str:
+    """
+    Summarize a snapshot as one state name
+
+    Args:
+        snapshot (Optional[StatusSnapshot]): Status of the server
+
+    Returns:
+        str: The JBoss status, the check error, or "running"/"stopped"/"mixed"/"unknown" from the services
+    """
+    if snapshot is None:
+        return 'unknown'
+    if snapshot.error:
+        return snapshot.error
+    if snapshot.jboss_status is not None:
+        return snapshot.jboss_status
+    running = {service['running'] for service in snapshot.services}
+    if running == {True}:
+        return 'running'
+    if running == {False}:
+        return 'stopped'
+    return 'mixed' if len(running) > 1 else 'unknown'
+
+
+def check_intervals() -> Iterator[float]:
+    """
+    Yields:
+        float: Seconds to wait before each check after the first
+    """
+    interval = FIRST_CHECK_INTERVAL
+    while True:
+        yield interval
+        interval = min(interval * CHECK_BACKOFF, MAX_CHECK_INTERVAL)
+
+
+class Convergence:
+    """States a server went through after a start/stop, until it reached the target state"""
+
+    def __init__(self, server_id: str, action: str, issued_at: float, timeout: float):
+        """
+        Initialize a watch
+
+        Args:
+            server_id (str): ID of the server
+            action (str): "start" or "stop"
+            issued_at (float): time.monotonic() when the start/stop was sent
+            timeout (float): Seconds the server may take to reach the target state
+        """
+        self.server_id = server_id
+        self.action = action
+        self.target = TARGET_STATUS[action]
+        self.issued_at = issued_at
+        self.timeout = timeout
+        self.status = WATCHING
+        self.time_to_ready: Optional[float] = None
+        self.checks = 0
+        self.transitions: List[Dict] = []
+
+    def observe(self, snapshot: StatusSnapshot) -> Optional[Dict]:
+        """
+        Record one check
+
+        Args:
+            snapshot (StatusSnapshot): Result of the check
+
+        Returns:
+            Optional[Dict]: The transition {"state", "at", "elapsed"} if the state changed, else None
+        """
+        self.checks += 1
+        state = describe_state(snapshot)
+        if self.transitions and self.transitions[-1]["state"] == state:
+            return None
+        transition = {
+            "state": state,
+            "at": time.time(),
+            "elapsed": round(time.monotonic() - self.issued_at, 2)
+        }
+        self.transitions.append(transition)
+        return transition
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the watch for a JSON response
+
+        Returns:
+            Dict: Target, outcome, time to ready and the transitions seen
+        """
+        return {
+            "target": self.target,
+            "status": self.status,
+            "time_to_ready": self.time_to_ready,
+            "timeout": self.timeout,
+            "checks": self.checks,
+            "transitions": list(self.transitions)
+        }
+
+
+def watch_convergence(server_id: str, action: str, username: str, password: str,
+                      status_check: Callable[[str, str, str], StatusSnapshot],
+                      issued_at: Optional[float] = None, timeout: Optional[float] = None,
+                      on_transition: Optional[Callable[[Convergence, Dict], None]] = None,
+                      cancelled: Optional[threading.Event] = None) -> Convergence:
+    """
+    Check a server on a tight-then-decaying schedule until it reports the state an action aims for
+
+    The checks run at interactive priority, since an operator is following the operation.
+    A check shed under load (error "overloaded") is not a state of the server and is skipped.
+
+    Args:
+        server_id (str): ID of the server
+        action (str): "start" or "stop"
+        username (str): Username for authentication
+        password (str): Password for authentication
+        status_check (Callable): Function (server_id, username, password) -> StatusSnapshot
+            returning a fresh status
+        issued_at (float, optional): time.monotonic() when the start/stop was sent, defaults to now
+        timeout (float, optional): Seconds to watch, defaults to convergence_timeout()
+        on_transition (Callable, optional): Called with the watch and each new transition
+        cancelled (threading.Event, optional): Set to stop watching, e.g. by a later start/stop
+
+    Returns:
+        Convergence: The finished watch, READY, TIMED_OUT or CANCELLED
+    """
+    convergence = Convergence(server_id, action, time.monotonic() if issued_at is None else issued_at,
+                              convergence_timeout() if timeout is None else timeout)
+    deadline = time.monotonic() + convergence.timeout
+    intervals = check_intervals()
+    cancelled = cancelled or threading.Event()
+
+    with span("convergence", server=server_id, target=convergence.target), priority_scope(INTERACTIVE):
+        while True:
+            snapshot = status_check(server_id, username, password)
+            if snapshot.error != "overloaded":
+                transition = convergence.observe(snapshot)
+                if transition is not None and on_transition is not None:
+                    on_transition(convergence, transition)
+                if reached_target(snapshot, action):
+                    convergence.status = READY
+                    convergence.time_to_ready = round(time.monotonic() - convergence.issued_at, 2)
+                    TIME_TO_READY_SECONDS.observe(convergence.time_to_ready, action=action)
+                    break
+            now = time.monotonic()
+            if now >= deadline:
+                convergence.status = TIMED_OUT
+                break
+            if cancelled.wait(min(next(intervals), deadline - now)):
+                convergence.status = CANCELLED
+                break
+        annotate(status=convergence.status, checks=convergence.checks, time_to_ready=convergence.time_to_ready)
+
+    CONVERGENCE_TOTAL.inc(action=action, outcome=convergence.status)
+    return convergence
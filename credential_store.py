@@ -0,0 +1,188 @@
+"""
+Module for sharing login credentials between worker processes.
+
+Passwords entered at login are needed later for the remote PowerShell sessions, so they
+cannot be hashed. They are encrypted with Fernet (AES-128-CBC + HMAC-SHA256) and kept in
+a SQLite database that every worker process on the host opens, so a login is valid on
+any worker. Entries expire `ttl` seconds after they were last used.
+
+Start/stop jobs and rollouts are shared through job_store.py. Traces, admission slots and
+remote sessions stay per process.
+
+The database path comes from EAP_CREDENTIAL_DB (default instance/credentials.db). The
+key comes from EAP_CREDENTIAL_KEY, or from a key file next to the database that the
+first process creates with owner-only permissions.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'credentials.db')
+
+# Seconds an unused login stays valid
+DEFAULT_TTL = 8 * 3600
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS credentials (
+    username TEXT PRIMARY KEY,
+    secret BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS credentials_expires_at ON credentials (expires_at);
+'''
+
+
+def _load_key(key_path: str) -> bytes:
+    """
+    Read the Fernet key, creating it atomically on first use
+
+    Args:
+        key_path (str): Key file used when EAP_CREDENTIAL_KEY is not set
+
+    Returns:
+        bytes: URL-safe base64 Fernet key
+    """
+    env_key = os.environ.get('EAP_CREDENTIAL_KEY')
+    if env_key:
+        return env_key.encode('ascii')
+    try:
+        # O_EXCL: exactly one worker creates the key, the others read it
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(key_path, 'rb') as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.1)  # Another worker is still writing it
+        raise RuntimeError(f"Credential key file {key_path} is empty")
+    key = Fernet.generate_key()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+class CredentialStore:
+    """Encrypted, expiring credential store shared by all worker processes on a host"""
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL):
+        """
+        Initialize the store, creating the database and key if needed
+
+        Args:
+            path (str, optional): SQLite database path, defaults to EAP_CREDENTIAL_DB or instance/credentials.db
+            ttl (float): Seconds an unused entry stays valid
+        """
+        self.path = path or os.environ.get('EAP_CREDENTIAL_DB', DEFAULT_DB_PATH)
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._fernet = Fernet(_load_key(self.path + '.key'))
+        self._local = threading.local()
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection; SQLite connections cannot be shared between threads or forks"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.pid = os.getpid()
+        return connection
+
+    def put(self, username: str, password: str) -> None:
+        """
+        Store or replace a user's credentials
+
+        Args:
+            username (str): Username
+            password (str): Password, encrypted before it is written
+        """
+        now = time.time()
+        secret = self._fernet.encrypt(password.encode('utf-8'))
+        connection = self._connect()
+        connection.execute(
+            'INSERT INTO credentials (username, secret, updated_at, expires_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(username) DO UPDATE SET secret = excluded.secret, '
+            'updated_at = excluded.updated_at, expires_at = excluded.expires_at',
+            (username, secret, now, now + self.ttl)
+        )
+        connection.execute('DELETE FROM credentials WHERE expires_at <= ?', (now,))
+
+    def get(self, username: str) -> Optional[str]:
+        """
+        Get a user's password, extending the expiry of an entry that is in use
+
+        Args:
+            username (str): Username
+
+        Returns:
+            Optional[str]: Password, or None if unknown, expired or not decryptable with the current key
+        """
+        now = time.time()
+        connection = self._connect()
+        row = connection.execute(
+            'SELECT secret, expires_at FROM credentials WHERE username = ? AND expires_at > ?',
+            (username, now)
+        ).fetchone()
+        if row is None:
+            return None
+        secret, expires_at = row
+        # Sliding expiry, written at most once per half TTL to keep reads cheap
+        if expires_at - now < self.ttl / 2:
+            connection.execute('UPDATE credentials SET expires_at = ? WHERE username = ?',
+                               (now + self.ttl, username))
+        try:
+            return self._fernet.decrypt(secret).decode('utf-8')
+        except InvalidToken:
+            return None
+
+    def delete(self, username: str) -> None:
+        """
+        Remove a user's credentials, e.g. on logout
+
+        Args:
+            username (str): Username
+        """
+        connection = self._connect()
+        connection.execute('DELETE FROM credentials WHERE username = ?', (username,))
+
+    def latest(self) -> Optional[Tuple[str, str]]:
+        """
+        Get the most recently stored credentials that are still valid
+
+        Returns:
+            Optional[Tuple[str, str]]: (username, password) or None if nobody is logged in
+        """
+        for username in self.usernames():
+            password = self.get(username)
+            if password is not None:
+                return username, password
+        return None
+
+    def usernames(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Users with valid credentials, most recent login first
+        """
+        connection = self._connect()
+        rows = connection.execute(
+            'SELECT username FROM credentials WHERE expires_at > ? ORDER BY updated_at DESC',
+            (time.time(),)
+        ).fetchall()
+        return [username for (username,) in rows]
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired entries
+
+        Returns:
+            int: Number of entries deleted
+        """
+        connection = self._connect()
+        return connection.execute('DELETE FROM credentials WHERE expires_at <= ?', (time.time(),)).rowcount
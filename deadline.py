@@ -0,0 +1,66 @@
+"""
+Module for carrying request deadlines down to remote execution.
+
+A route (or background job) opens a `deadline_scope(seconds)`; everything it calls in
+the same thread sees the deadline through a context variable. RemoteCall captures the
+remaining time when it is built and the executors pass it on as their timeout, so a hung
+WinRM connection or jboss-cli.ps1 can never hold a worker longer than its caller allows.
+Nested scopes can only shorten the deadline, never extend it.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Defaults when the caller did not set a deadline
+DEFAULT_STATUS_TIMEOUT = 60  # seconds a status check may take
+DEFAULT_ACTION_TIMEOUT = 300  # seconds a start/stop may take
+
+# Absolute time.monotonic() deadline of the current request, None if unbounded
+_current_deadline: ContextVar[Optional[float]] = ContextVar('eap_deadline', default=None)
+
+
+def current_deadline() -> Optional[float]:
+    """
+    Returns:
+        Optional[float]: Absolute time.monotonic() deadline in effect, None if unbounded
+    """
+    return _current_deadline.get()
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """
+    Get the seconds left until the current deadline
+
+    Args:
+        default (float, optional): Seconds returned when no deadline is set
+
+    Returns:
+        Optional[float]: Seconds left (never negative), or default if unbounded
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Run the with block under a deadline
+
+    Args:
+        seconds (float, optional): Seconds from now; None keeps the enclosing deadline
+
+    Yields:
+        Optional[float]: The absolute deadline in effect inside the block
+    """
+    deadline = _current_deadline.get()
+    if seconds is not None:
+        candidate = time.monotonic() + max(0.0, seconds)
+        deadline = candidate if deadline is None else min(deadline, candidate)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
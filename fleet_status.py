@@ -0,0 +1,203 @@
+"""
+Module for checking the status of every configured server in parallel
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Optional
+
+from admission import current_priority, priority_scope
+from async_runtime import get_runtime
+from deadline import deadline_scope
+from models.server_config import ServerConfig
+from status_poller import StatusPoller
+
+# Maximum number of servers checked at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# Seconds a single server check may run before it is reported as timed out
+DEFAULT_SERVER_DEADLINE = 30
+
+# Shared, bounded worker pool so concurrent fleet requests cannot spawn unbounded threads
+_executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix='fleet-status')
+
+
+def check_fleet(poller: StatusPoller, username: str, password: str,
+                server_deadline: float = DEFAULT_SERVER_DEADLINE,
+                max_age: Optional[float] = None) -> Dict:
+    """
+    Check every server in the configuration in parallel
+
+    Args:
+        poller (StatusPoller): Poller whose cache and single-flight checks are used
+        username (str): Username for authentication
+        password (str): Password for authentication
+        server_deadline (float): Seconds each server check may run once started
+        max_age (float, optional): Maximum age of a cached snapshot that may be reused,
+            defaults to each server's poll interval
+
+    Returns:
+        Dict: {"servers": [...], "elapsed": float}; each entry has a "status" of
+        "ok", "connection_failed", "check_failed", "timed_out" or "circuit_open"
+    """
+    servers = ServerConfig.get_instance().config['servers']
+    if poller.async_mode:
+        return get_runtime().run(
+            _check_fleet_async(poller, servers, username, password, server_deadline, max_age))
+
+    started_at = time.monotonic()
+    started: Dict[str, float] = {}
+    started_lock = threading.Lock()
+    # Worker threads do not inherit the caller's context, so its admission priority is passed on
+    priority = current_priority()
+
+    def run_check(server_id: str):
+        with started_lock:
+            started[server_id] = time.monotonic()
+        server_max_age = max_age if max_age is not None else poller.poll_interval(server_id)
+        # The remote call itself stops at the deadline, so a hung server frees its worker
+        with deadline_scope(server_deadline), priority_scope(priority):
+            return poller.get_snapshot(server_id, username, password, max_age=server_max_age)
+
+    futures: Dict[Future, str] = {_executor.submit(run_check, server_id): server_id for server_id in servers}
+
+    # Servers queued behind others get their own deadline once they start; the whole
+    # call is still bounded by the number of waves the worker pool needs
+    waves = max(1, math.ceil(len(futures) / DEFAULT_MAX_WORKERS))
+    overall_deadline = started_at + server_deadline * waves
+    results: Dict[str, Dict] = {}
+    pending = set(futures)
+
+    while pending:
+        now = time.monotonic()
+        with started_lock:
+            expired = {future for future in pending
+                       if futures[future] in started and now - started[futures[future]] >= server_deadline}
+        if now >= overall_deadline:
+            expired = set(pending)
+        for future in expired:
+            server_id = futures[future]
+            results[server_id] = _timed_out_entry(server_id, servers[server_id], poller)
+        pending -= expired
+        if not pending:
+            break
+
+        with started_lock:
+            running_deadlines = [started[futures[future]] + server_deadline
+                                 for future in pending if futures[future] in started]
+        next_deadline = min(running_deadlines + [overall_deadline])
+        done, pending = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()),
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            server_id = futures[future]
+            with started_lock:
+                elapsed = time.monotonic() - started.get(server_id, started_at)
+            results[server_id] = _snapshot_entry(server_id, servers[server_id], future, elapsed)
+
+    return {
+        "servers": [results[server_id] for server_id in servers],
+        "elapsed": round(time.monotonic() - started_at, 2)
+    }
+
+
+async def _check_fleet_async(poller: StatusPoller, servers: Dict[str, Dict], username: str, password: str,
+                             server_deadline: float, max_age: Optional[float]) -> Dict:
+    """
+    Async mode of check_fleet: every server is checked at once on the event loop, so the
+    worker pool limit and its waves do not apply and every check gets the same deadline
+
+    Returns:
+        Dict: Same as check_fleet
+    """
+    started_at = time.monotonic()
+    finished: Dict[str, float] = {}
+
+    async def run_check(server_id: str):
+        server_max_age = max_age if max_age is not None else poller.poll_interval(server_id)
+        try:
+            with deadline_scope(server_deadline):
+                return await poller.get_snapshot_async(server_id, username, password, max_age=server_max_age)
+        finally:
+            finished[server_id] = time.monotonic()
+
+    tasks = {asyncio.ensure_future(run_check(server_id)): server_id for server_id in servers}
+    done, pending = await asyncio.wait(tasks, timeout=server_deadline) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+
+    results: Dict[str, Dict] = {}
+    for task in done:
+        server_id = tasks[task]
+        elapsed = finished.get(server_id, time.monotonic()) - started_at
+        results[server_id] = _snapshot_entry(server_id, servers[server_id], task, elapsed)
+    for task in pending:
+        server_id = tasks[task]
+        results[server_id] = _timed_out_entry(server_id, servers[server_id], poller)
+
+    return {
+        "servers": [results[server_id] for server_id in servers],
+        "elapsed": round(time.monotonic() - started_at, 2)
+    }
+
+
+def _snapshot_entry(server_id: str, server_info: Dict, future: Future, elapsed: float) -> Dict:
+    """
+    Build the fleet entry of a finished server check
+
+    Args:
+        server_id (str): ID of the server
+        server_info (Dict): Server configuration
+        future (Future): Finished check returning a StatusSnapshot (thread pool or asyncio future)
+        elapsed (float): Seconds the check took
+
+    Returns:
+        Dict: Fleet entry for the server
+    """
+    try:
+        snapshot = future.result()
+    except Exception as e:
+        return {
+            "server_id": server_id,
+            "name": server_info['name'],
+            "status": "check_failed",
+            "message": str(e),
+            "services": [{"name": service['name'], "running": None} for service in server_info['services']],
+            "elapsed": round(elapsed, 2)
+        }
+
+    entry = snapshot.to_dict()
+    entry.update({
+        "name": server_info['name'],
+        "status": snapshot.error or "ok",
+        "elapsed": round(elapsed, 2)
+    })
+    entry.pop("error", None)
+    return entry
+
+
+def _timed_out_entry(server_id: str, server_info: Dict, poller: StatusPoller) -> Dict:
+    """
+    Build the fleet entry of a server whose check missed its deadline
+
+    Args:
+        server_id (str): ID of the server
+        server_info (Dict): Server configuration
+        poller (StatusPoller): Poller holding the last known snapshot, if any
+
+    Returns:
+        Dict: Fleet entry marked timed out, with the last known services if cached
+    """
+    entry = {
+        "server_id": server_id,
+        "name": server_info['name'],
+        "status": "timed_out",
+        "message": "Status check did not finish before the deadline",
+        "services": [{"name": service['name'], "running": None} for service in server_info['services']]
+    }
+    last_known = poller.get_cached(server_id)
+    if last_known is not None:
+        entry["last_known"] = last_known.to_dict()
+    return entry
+
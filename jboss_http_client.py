@@ -0,0 +1,429 @@
+"""
+Module for talking to the JBoss EAP HTTP management API directly.
+
+Instead of starting jboss-cli.ps1 inside a remote PowerShell session, operations are
+sent as JSON DMR requests to the controller's /management endpoint on port 9990 over
+pooled keep-alive connections. The operations are derived from the existing
+check_jboss_is_running / start_jboss / stop_jboss CLI commands in server_config.json.
+
+Select it with EAP_EXECUTOR=jboss-http. EAP_JBOSS_HTTP_CONTROLLER=host:port sends every
+request to one address instead of the controller named in the command, e.g. a local stub
+such as benchmarks/jboss_stub_server.py.
+
+Status reads of /host=X/server-config=Y are answered from one batched read per domain
+controller (see controller_status.py) instead of one request per server.
+"""
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from controller_status import ControllerStatusCache
+from metrics import observe_phase
+from ps_session_pool import HostResult
+from remote_executor import (STATUS, STATUS_PAYLOAD_MARKER, PowerShellExecutor, RemoteCall,
+                             RemoteExecutor)
+
+# Default management port of a JBoss domain controller
+DEFAULT_MANAGEMENT_PORT = 9990
+
+# Idle keep-alive connections kept per controller
+DEFAULT_MAX_IDLE_CONNECTIONS = 4
+
+# Seconds to wait for a management response
+DEFAULT_TIMEOUT = 30
+
+MANAGEMENT_PATH = '/management'
+
+_CONTROLLER_RE = re.compile(r'--controller=(?:[a-z-]+://)?([^\s:]+)(?::(\d+))?')
+_OPERATION_RE = re.compile(r'(/[^\s:]*)?:([\w-]+)(?:\(([^)]*)\))?\s*$')
+_CHALLENGE_RE = re.compile(r'(\w+)=(?:"([^"]*)"|([^\s,]*))')
+
+
+class CliOperation:
+    """A JBoss CLI operation parsed from a configured command"""
+
+    def __init__(self, host: str, port: int, address: List[Tuple[str, str]], operation: str,
+                 params: Optional[Dict[str, str]] = None):
+        """
+        Initialize a CLI operation
+
+        Args:
+            host (str): Controller host
+            port (int): Controller management port
+            address (List[Tuple[str, str]]): Resource address, e.g. [("host", "prod92"), ("server-config", "SVR")]
+            operation (str): Operation name, e.g. "read-attribute"
+            params (Dict[str, str], optional): Operation parameters, e.g. {"name": "status"}
+        """
+        self.host = host
+        self.port = port
+        self.address = address
+        self.operation = operation
+        self.params = params or {}
+
+    def to_dmr(self) -> Dict:
+        """
+        Build the JSON DMR request for the operation
+
+        Returns:
+            Dict: Request body for the /management endpoint
+        """
+        request = {
+            "operation": self.operation,
+            "address": [{key: value} for key, value in self.address]
+        }
+        request.update(self.params)
+        return request
+
+
+def parse_cli_command(command: str) -> CliOperation:
+    """
+    Parse a configured jboss-cli command into a management operation
+
+    Args:
+        command (str): Command such as "cd '...'; .\\jboss-cli.ps1 --connect --controller=prod92:9990
+            /host=prod92/server-config=SVR-PROD-92:read-attribute(name=status)"
+
+    Returns:
+        CliOperation: Controller and DMR operation of the command
+
+    Raises:
+        ValueError: If the command has no controller or operation
+    """
+    controller = _CONTROLLER_RE.search(command)
+    if not controller:
+        raise ValueError(f"No --controller found in command: {command}")
+
+    # The operation is the last whitespace-separated token of the jboss-cli part
+    cli_part = command[controller.end():].strip().strip('"\'')
+    operation = _OPERATION_RE.search(cli_part)
+    if not operation:
+        raise ValueError(f"No management operation found in command: {command}")
+
+    address = []
+    for part in (operation.group(1) or '').strip('/').split('/'):
+        if part:
+            key, _, value = part.partition('=')
+            address.append((key, value))
+
+    params = {}
+    for param in (operation.group(3) or '').split(','):
+        if '=' in param:
+            key, _, value = param.partition('=')
+            params[key.strip()] = value.strip()
+
+    return CliOperation(controller.group(1), int(controller.group(2) or DEFAULT_MANAGEMENT_PORT),
+                        address, operation.group(2), params)
+
+
+class _DigestState:
+    """Digest challenge of a controller, reused for preemptive authorization"""
+
+    def __init__(self, challenge: Dict[str, str]):
+        self.challenge = challenge
+        self.nonce_count = 0
+        self.lock = threading.Lock()
+
+    def authorization(self, method: str, uri: str, username: str, password: str) -> str:
+        """
+        Build the Authorization header for the next request
+
+        Returns:
+            str: Digest authorization header value
+        """
+        realm = self.challenge.get('realm', '')
+        nonce = self.challenge.get('nonce', '')
+        qop = self.challenge.get('qop')
+        with self.lock:
+            self.nonce_count += 1
+            nc = f"{self.nonce_count:08x}"
+        cnonce = uuid.uuid4().hex[:16]
+
+        ha1 = hashlib.md5(f"{username}:{realm}:{password}".encode('utf-8')).hexdigest()
+        ha2 = hashlib.md5(f"{method}:{uri}".encode('utf-8')).hexdigest()
+        if qop:
+            qop = 'auth'
+            response = hashlib.md5(f"{ha1}:{nonce}:{nc}:{cnonce}:{qop}:{ha2}".encode('utf-8')).hexdigest()
+        else:
+            response = hashlib.md5(f"{ha1}:{nonce}:{ha2}".encode('utf-8')).hexdigest()
+
+        header = (f'Digest username="{username}", realm="{realm}", nonce="{nonce}", uri="{uri}", '
+                  f'response="{response}", algorithm=MD5')
+        if qop:
+            header += f', qop={qop}, nc={nc}, cnonce="{cnonce}"'
+        if 'opaque' in self.challenge:
+            header += f', opaque="{self.challenge["opaque"]}"'
+        return header
+
+
+class _ConnectionPool:
+    """Idle keep-alive HTTP connections to one controller"""
+
+    def __init__(self, host: str, port: int, max_idle: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Returns:
+            Tuple[HTTPConnection, bool]: A connection, and True if it was reused from the pool
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+            self.opened += 1
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, connection: http.client.HTTPConnection, reusable: bool) -> None:
+        with self._lock:
+            if reusable and len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class JBossManagementClient:
+    """Client for the JBoss HTTP management API with keep-alive connection pooling"""
+
+    def __init__(self, max_idle_connections: int = DEFAULT_MAX_IDLE_CONNECTIONS,
+                 timeout: float = DEFAULT_TIMEOUT, controller_override: Optional[str] = None):
+        """
+        Initialize the client
+
+        Args:
+            max_idle_connections (int): Idle keep-alive connections kept per controller
+            timeout (float): Seconds to wait for a response
+            controller_override (str, optional): "host:port" receiving every request instead of
+                the controller named in the operation
+        """
+        self.max_idle_connections = max_idle_connections
+        self.timeout = timeout
+        self.controller_override = controller_override
+        self._pools: Dict[Tuple[str, int], _ConnectionPool] = {}
+        self._digest: Dict[Tuple[str, int, str], _DigestState] = {}
+        self._lock = threading.Lock()
+
+    def _target(self, host: str, port: int) -> Tuple[str, int]:
+        if self.controller_override:
+            override_host, _, override_port = self.controller_override.partition(':')
+            return override_host, int(override_port or DEFAULT_MANAGEMENT_PORT)
+        return host, port
+
+    def _pool(self, host: str, port: int) -> _ConnectionPool:
+        with self._lock:
+            pool = self._pools.get((host, port))
+            if pool is None:
+                pool = _ConnectionPool(host, port, self.max_idle_connections, self.timeout)
+                self._pools[(host, port)] = pool
+            return pool
+
+    def _send(self, pool: _ConnectionPool, body: bytes, headers: Dict[str, str],
+              timeout: Optional[float] = None) -> Tuple[int, Dict, bytes]:
+        """
+        POST a request on a pooled connection, retrying once on a stale keep-alive connection
+
+        Args:
+            timeout (float, optional): Socket timeout for this request, the client default if None
+
+        Returns:
+            Tuple[int, Dict, bytes]: Status code, lower-cased headers and body
+        """
+        for attempt in range(2):
+            connection, reused = pool.acquire()
+            connection.timeout = timeout if timeout is not None else self.timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(connection.timeout)
+            try:
+                connection.request('POST', MANAGEMENT_PATH, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                pool.release(connection, reusable=not response.will_close)
+                return response.status, {k.lower(): v for k, v in response.getheaders()}, data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                connection.close()
+                raise
+
+    def execute(self, operation: CliOperation, username: str, password: str,
+                timeout: Optional[float] = None) -> Dict:
+        """
+        Execute a management operation
+
+        Args:
+            operation (CliOperation): Operation to run
+            username (str): Management user
+            password (str): Management password
+            timeout (float, optional): Seconds allowed per request, the client default if None
+
+        Returns:
+            Dict: Parsed DMR response, e.g. {"outcome": "success", "result": "STARTED"}
+
+        Raises:
+            ConnectionError: If the controller cannot be reached or rejects the credentials
+            TimeoutError: If the controller did not answer in time
+        """
+        host, port = self._target(operation.host, operation.port)
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError(f"No time left for a request to JBoss controller {host}:{port}")
+        pool = self._pool(host, port)
+        body = json.dumps(operation.to_dmr()).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json',
+                   'Connection': 'keep-alive'}
+        digest_key = (host, port, username)
+
+        try:
+            for _ in range(2):
+                digest = self._digest.get(digest_key)
+                if digest is not None:
+                    headers['Authorization'] = digest.authorization('POST', MANAGEMENT_PATH, username, password)
+                status, response_headers, data = self._send(pool, body, headers, timeout)
+                if status != 401:
+                    break
+                challenge = response_headers.get('www-authenticate', '')
+                if not challenge.lower().startswith('digest'):
+                    break
+                # New or stale nonce: remember the challenge and retry once
+                self._digest[digest_key] = _DigestState(
+                    {m.group(1): m.group(2) if m.group(2) is not None else m.group(3)
+                     for m in _CHALLENGE_RE.finditer(challenge)}
+                )
+        except TimeoutError as e:
+            raise TimeoutError(f"JBoss controller {host}:{port} did not answer in time") from e
+        except OSError as e:
+            raise ConnectionError(f"Failed to connect to JBoss controller {host}:{port}: {e}") from e
+
+        if status == 401:
+            raise ConnectionError(f"JBoss controller {host}:{port} rejected the credentials")
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            return {"outcome": "failed", "failure-description": f"HTTP {status}: {data[:200]!r}"}
+
+    def stats(self) -> Dict:
+        """
+        Returns:
+            Dict: Connections opened and currently idle, summed over controllers
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+        return {
+            "connections_opened": sum(pool.opened for pool in pools),
+            "connections_idle": sum(len(pool._idle) for pool in pools)
+        }
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+
+class JBossHttpExecutor(RemoteExecutor):
+    """Remote executor that answers JBoss status and start/stop through the management API"""
+
+    name = 'jboss-http'
+
+    def __init__(self, client: Optional[JBossManagementClient] = None,
+                 fallback: Optional[RemoteExecutor] = None,
+                 status_cache: Optional[ControllerStatusCache] = None):
+        """
+        Initialize the executor
+
+        Args:
+            client (JBossManagementClient, optional): Management client, built from the environment by default
+            fallback (RemoteExecutor, optional): Executor for calls without a JBoss command,
+                e.g. Windows service checks; PowerShell by default
+            status_cache (ControllerStatusCache, optional): Batched status reads per controller
+        """
+        self.client = client or JBossManagementClient(
+            controller_override=os.environ.get('EAP_JBOSS_HTTP_CONTROLLER'))
+        self.fallback = fallback or PowerShellExecutor()
+        self.status_cache = status_cache or ControllerStatusCache(self.client)
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _management_credentials(call: RemoteCall) -> Tuple[str, str]:
+        """Management credentials; EAP_JBOSS_MGMT_USER/PASSWORD override the login credentials"""
+        return (os.environ.get('EAP_JBOSS_MGMT_USER', call.username),
+                os.environ.get('EAP_JBOSS_MGMT_PASSWORD', call.password))
+
+    def execute(self, call: RemoteCall) -> HostResult:
+        command = call.arguments.get('jboss_cli_command') if call.kind == STATUS else call.arguments.get('command')
+        if not command:
+            return self.fallback.execute(call)
+
+        with self._lock:
+            self._calls += 1
+        username, password = self._management_credentials(call)
+        operation = parse_cli_command(command)
+        started = time.perf_counter()
+        response = None
+        if call.kind == STATUS and self.status_cache.batchable(operation):
+            response = self.status_cache.read_status(operation, username, password, call.remaining())
+        if response is None:
+            response = self.client.execute(operation, username, password, call.remaining())
+        observe_phase(call.server, 'exec', time.perf_counter() - started)
+        ok = response.get('outcome') == 'success'
+
+        if call.kind != STATUS:
+            # The server's status changed, so its controller's batch is stale
+            self.status_cache.invalidate(operation.host, operation.port)
+            # One answer per operation, so the whole response is streamed at once
+            output = json.dumps(response)
+            call.emit(output)
+            return HostResult(output, ok)
+
+        status = response.get('result') if ok else None
+        services = [{
+            "name": service,
+            "running": True if status == 'STARTED' else False if status == 'STOPPED' else None,
+            "status": status,
+            "error": None if ok else str(response.get('failure-description'))
+        } for service in call.arguments.get('services', [])]
+        payload = {
+            "jboss": {"status": status, "error": None if ok else str(response.get('failure-description'))},
+            "services": services
+        }
+        return HostResult(STATUS_PAYLOAD_MARKER + json.dumps(payload, separators=(',', ':')), True)
+
+    async def execute_async(self, call: RemoteCall) -> HostResult:
+        command = call.arguments.get('jboss_cli_command') if call.kind == STATUS else call.arguments.get('command')
+        if not command:
+            # Windows service checks use the fallback's own async path, e.g. asyncio PowerShell hosts
+            return await self.fallback.execute_async(call)
+        return await asyncio.to_thread(self.execute, call)
+
+    def warm(self, username: str, password: str, server: str, timeout: Optional[float] = None) -> bool:
+        # JBoss calls open their connection on demand; the Windows service checks still
+        # go through the fallback executor
+        return self.fallback.warm(username, password, server, timeout)
+
+    def stats(self) -> Dict:
+        stats = self.client.stats()
+        stats.update(self.status_cache.stats())
+        with self._lock:
+            stats["calls"] = self._calls
+        stats["spawned"] = stats["connections_opened"]
+        return stats
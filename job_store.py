@@ -0,0 +1,529 @@
+"""
+Module for sharing start/stop jobs and rollouts between worker processes.
+
+Jobs and rollouts run in the worker process that created them, but their state is
+written to a SQLite database every worker on the host opens, so:
+
+- `/jobs/<id>`, `/jobs/<id>/stream` and `/rollouts/<id>` answer on any worker; jobs of
+  another worker are read from the store (see StoredJob and StoredRollout)
+- submitting the action of a server's latest unfinished job returns that job, whichever
+  worker runs it
+- a server runs one job at a time across all workers: a job needs the server's lease in
+  `server_locks`, and the oldest queued job of a server gets it first
+- a job that starts cancels the convergence watch of the server's previous job, also in
+  another worker
+
+Every row written by a worker carries its owner ID and a lease that the worker renews
+while it is alive (see JobQueue). Unfinished jobs, rollouts and server leases whose lease
+ran out belong to a worker that exited: their jobs are failed and their servers freed.
+
+The database path comes from EAP_JOB_DB (default instance/jobs.db).
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from jobs import (CONVERGING, FAILED, FINISHED_JOBS_KEPT, MAX_OUTPUT_LINES, QUEUED, RUNNING, SUCCEEDED,
+                  UNCONFIRMED, Job)
+from rolling_operations import FINISHED_ROLLOUTS_KEPT, HALTED
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'jobs.db')
+
+# Seconds a worker's jobs, rollouts and server leases stay valid without a renewal
+DEFAULT_LEASE_TTL = 30
+
+# Seconds between reads of the store while following a job of another worker
+POLL_INTERVAL = 0.5
+
+WORKER_EXITED = "The worker process running this job exited"
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    server_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    username TEXT,
+    status TEXT NOT NULL,
+    output TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    trace_id TEXT,
+    convergence TEXT,
+    line_count INTEGER NOT NULL DEFAULT 0,
+    cancel_watch INTEGER NOT NULL DEFAULT 0,
+    owner TEXT NOT NULL,
+    lease_expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_server ON jobs (server_id, finished_at, created_at);
+CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, finished_at);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at, lease_expires);
+CREATE TABLE IF NOT EXISTS job_lines (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS server_locks (
+    server_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    lease_expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollouts (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    snapshot TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    owner TEXT NOT NULL,
+    lease_expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rollouts_owner ON rollouts (owner, finished_at);
+CREATE INDEX IF NOT EXISTS rollouts_finished_at ON rollouts (finished_at);
+'''
+
+_JOB_COLUMNS = ('id', 'server_id', 'action', 'username', 'status', 'output', 'error', 'created_at',
+                'started_at', 'finished_at', 'trace_id', 'convergence', 'line_count')
+
+
+class StoredJob:
+    """
+    Read-only view of a job from the store, e.g. one run by another worker process.
+
+    It offers what routes, streams and rollouts read from a Job; waiting for it polls the store.
+    """
+
+    def __init__(self, store: 'JobStore', row: Dict):
+        """
+        Initialize the view
+
+        Args:
+            store (JobStore): Store the job is read from
+            row (Dict): Row of the jobs table
+        """
+        self._store = store
+        self.id = row['id']
+        self.password = None
+        self._apply(row)
+
+    def _apply(self, row: Dict) -> None:
+        self.server_id = row['server_id']
+        self.action = row['action']
+        self.username = row['username']
+        self.status = row['status']
+        self.output = row['output']
+        self.error = row['error']
+        self.created_at = row['created_at']
+        self.started_at = row['started_at']
+        self.finished_at = row['finished_at']
+        self.trace_id = row['trace_id']
+        self.convergence = json.loads(row['convergence']) if row['convergence'] else None
+        self.line_count = row['line_count']
+
+    def refresh(self) -> None:
+        """Re-read the job from the store"""
+        row = self._store.job_row(self.id)
+        if row is not None:
+            self._apply(row)
+
+    @property
+    def finished(self) -> bool:
+        """
+        Returns:
+            bool: True if the job succeeded, failed or ended unconfirmed
+        """
+        return self.status in (SUCCEEDED, FAILED, UNCONFIRMED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the job to finish
+
+        Args:
+            timeout (float, optional): Seconds to wait, forever if None
+
+        Returns:
+            bool: True if the job finished
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.refresh()
+            if self.finished:
+                return True
+            remaining = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            time.sleep(remaining)
+
+    def lines_after(self, seq: int, timeout: Optional[float] = None) -> Tuple[List[Tuple[int, float, str]], int]:
+        """
+        Get the output lines after a sequence number, see Job.lines_after
+
+        Args:
+            seq (int): Sequence number of the last line the reader has, 0 for none
+            timeout (float, optional): Seconds to wait when there is nothing new, forever if None
+
+        Returns:
+            Tuple[List[Tuple[int, float, str]], int]: New lines, and the number of lines after
+            seq that were already dropped
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            row, lines, dropped = self._store.lines_after(self.id, seq)
+            if row is not None:
+                self._apply(row)
+            if lines or dropped or self.finished:
+                return lines, dropped
+            remaining = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline - time.monotonic())
+            if remaining <= 0:
+                return lines, dropped
+            time.sleep(remaining)
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the job for a JSON response
+
+        Returns:
+            Dict: Job state without credentials, as Job.to_dict
+        """
+        return {
+            "job_id": self.id,
+            "server_id": self.server_id,
+            "action": self.action,
+            "username": self.username,
+            "status": self.status,
+            "output": self.output,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "output_lines": self.line_count,
+            "trace_id": self.trace_id,
+            "convergence": self.convergence
+        }
+
+
+class StoredRollout:
+    """Read-only view of a rollout from the store, e.g. one run by another worker process"""
+
+    def __init__(self, snapshot: Dict):
+        """
+        Initialize the view
+
+        Args:
+            snapshot (Dict): Rollout.to_dict() as last saved by its worker
+        """
+        self.id = snapshot['rollout_id']
+        self.status = snapshot['status']
+        self._snapshot = snapshot
+
+    def to_dict(self) -> Dict:
+        """
+        Returns:
+            Dict: Rollout state without credentials, as Rollout.to_dict
+        """
+        return self._snapshot
+
+
+class JobStore:
+    """Job, server lease and rollout state shared by all worker processes on a host"""
+
+    def __init__(self, path: Optional[str] = None, lease_ttl: float = DEFAULT_LEASE_TTL):
+        """
+        Initialize the store, creating the database if needed
+
+        Args:
+            path (str, optional): SQLite database path, defaults to EAP_JOB_DB or instance/jobs.db
+            lease_ttl (float): Seconds this worker's rows stay valid without a renewal
+        """
+        self.path = path or os.environ.get('EAP_JOB_DB', DEFAULT_DB_PATH)
+        self.lease_ttl = lease_ttl
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        self._owner: Optional[Tuple[int, str]] = None
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection; SQLite connections cannot be shared between threads or forks"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            self._local.pid = os.getpid()
+        return connection
+
+    @property
+    def owner(self) -> str:
+        """
+        Returns:
+            str: ID of this worker process in the owner columns, new after a fork
+        """
+        if self._owner is None or self._owner[0] != os.getpid():
+            self._owner = (os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+        return self._owner[1]
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction; BEGIN IMMEDIATE serializes it with the other workers' writes"""
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _expire(self, connection: sqlite3.Connection, now: float) -> None:
+        """Fail the jobs and free the servers of workers whose lease ran out (inside a transaction)"""
+        connection.execute(
+            'UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE finished_at IS NULL AND lease_expires <= ?',
+            (FAILED, WORKER_EXITED, now, now)
+        )
+        connection.execute('DELETE FROM server_locks WHERE lease_expires <= ?', (now,))
+
+    def insert_job(self, job: Job) -> Optional[str]:
+        """
+        Store a new job, unless the server's latest unfinished job has the same action
+
+        Args:
+            job (Job): Job just created by this worker
+
+        Returns:
+            Optional[str]: ID of the existing job the new one collapses into, None if it was stored
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            self._expire(connection, now)
+            latest = connection.execute(
+                'SELECT id, action FROM jobs WHERE server_id = ? AND finished_at IS NULL '
+                'ORDER BY created_at DESC, rowid DESC LIMIT 1',
+                (job.server_id,)
+            ).fetchone()
+            if latest is not None and latest['action'] == job.action:
+                return latest['id']
+            connection.execute(
+                'INSERT INTO jobs (id, server_id, action, username, status, created_at, owner, lease_expires) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.server_id, job.action, job.username, job.status, job.created_at,
+                 self.owner, now + self.lease_ttl)
+            )
+        return None
+
+    def acquire_server(self, server_id: str, job_id: str) -> bool:
+        """
+        Take the server's lease for a queued job of this worker
+
+        The lease goes to the oldest queued job of the server across all workers, and only
+        while no other worker holds it. Taking it cancels the convergence watch of the
+        server's previous job.
+
+        Args:
+            server_id (str): Server the job acts on
+            job_id (str): ID of the job about to run
+
+        Returns:
+            bool: True if the job may run now
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            self._expire(connection, now)
+            lock = connection.execute('SELECT owner FROM server_locks WHERE server_id = ?',
+                                      (server_id,)).fetchone()
+            if lock is not None and lock['owner'] != self.owner:
+                return False
+            first = connection.execute(
+                'SELECT id FROM jobs WHERE server_id = ? AND finished_at IS NULL AND status = ? '
+                'ORDER BY created_at, rowid LIMIT 1',
+                (server_id, QUEUED)
+            ).fetchone()
+            if first is not None and first['id'] != job_id:
+                return False
+            connection.execute(
+                'INSERT INTO server_locks (server_id, owner, job_id, lease_expires) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(server_id) DO UPDATE SET owner = excluded.owner, job_id = excluded.job_id, '
+                'lease_expires = excluded.lease_expires',
+                (server_id, self.owner, job_id, now + self.lease_ttl)
+            )
+            # The server's state is about to change again, so an earlier job's watch is moot
+            connection.execute(
+                'UPDATE jobs SET cancel_watch = 1 WHERE server_id = ? AND status = ? AND finished_at IS NULL',
+                (server_id, CONVERGING)
+            )
+        return True
+
+    def release_server(self, server_id: str) -> None:
+        """
+        Give up this worker's lease of a server after its job ran
+
+        Args:
+            server_id (str): Server whose job returned
+        """
+        self._connect().execute('DELETE FROM server_locks WHERE server_id = ? AND owner = ?',
+                                (server_id, self.owner))
+
+    def save_job(self, job: Job, lines: List[Tuple[int, float, str]]) -> None:
+        """
+        Write a job's current state and its output lines not saved yet
+
+        Args:
+            job (Job): Job of this worker
+            lines (List[Tuple[int, float, str]]): (seq, timestamp, text) of the new lines
+        """
+        with self._transaction() as connection:
+            connection.executemany('INSERT OR REPLACE INTO job_lines (job_id, seq, ts, text) VALUES (?, ?, ?, ?)',
+                                   [(job.id, seq, ts, text) for seq, ts, text in lines])
+            line_count = lines[-1][0] if lines else None
+            if line_count is not None and line_count > MAX_OUTPUT_LINES:
+                connection.execute('DELETE FROM job_lines WHERE job_id = ? AND seq <= ?',
+                                   (job.id, line_count - MAX_OUTPUT_LINES))
+            connection.execute(
+                'UPDATE jobs SET status = ?, output = ?, error = ?, started_at = ?, finished_at = ?, '
+                'trace_id = ?, convergence = ?, line_count = COALESCE(?, line_count) WHERE id = ?',
+                (job.status, job.output, job.error, job.started_at, job.finished_at, job.trace_id,
+                 json.dumps(job.convergence) if job.convergence is not None else None, line_count, job.id)
+            )
+            if job.finished_at is not None:
+                self._trim_jobs(connection)
+
+    @staticmethod
+    def _trim_jobs(connection: sqlite3.Connection) -> None:
+        """Delete the oldest finished jobs beyond FINISHED_JOBS_KEPT and their lines"""
+        expired = [row['id'] for row in connection.execute(
+            'SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT -1 OFFSET ?',
+            (FINISHED_JOBS_KEPT,)
+        )]
+        for job_id in expired:
+            connection.execute('DELETE FROM job_lines WHERE job_id = ?', (job_id,))
+            connection.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def renew(self) -> None:
+        """Extend the lease of this worker's unfinished jobs and rollouts and its server leases"""
+        expires = time.time() + self.lease_ttl
+        with self._transaction() as connection:
+            connection.execute('UPDATE jobs SET lease_expires = ? WHERE owner = ? AND finished_at IS NULL',
+                               (expires, self.owner))
+            connection.execute('UPDATE rollouts SET lease_expires = ? WHERE owner = ? AND finished_at IS NULL',
+                               (expires, self.owner))
+            # Only leases of jobs still running, so a lease whose release failed runs out
+            connection.execute(
+                'UPDATE server_locks SET lease_expires = ? WHERE owner = ? AND job_id IN '
+                '(SELECT id FROM jobs WHERE status = ? AND finished_at IS NULL)',
+                (expires, self.owner, RUNNING)
+            )
+
+    def cancelled_watches(self) -> List[str]:
+        """
+        Returns:
+            List[str]: IDs of this worker's converging jobs whose watch a later job cancelled
+        """
+        rows = self._connect().execute(
+            'SELECT id FROM jobs WHERE owner = ? AND finished_at IS NULL AND status = ? AND cancel_watch = 1',
+            (self.owner, CONVERGING)
+        ).fetchall()
+        return [row['id'] for row in rows]
+
+    def job_row(self, job_id: str) -> Optional[Dict]:
+        """
+        Read a job, failing it first if its worker exited
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            Optional[Dict]: Row of the jobs table, None if unknown or trimmed
+        """
+        connection = self._connect()
+        row = connection.execute(f"SELECT {', '.join(_JOB_COLUMNS)}, lease_expires FROM jobs WHERE id = ?",
+                                 (job_id,)).fetchone()
+        if row is not None and row['finished_at'] is None and row['lease_expires'] <= time.time():
+            with self._transaction() as connection:
+                self._expire(connection, time.time())
+            return self.job_row(job_id)
+        return dict(row) if row is not None else None
+
+    def load_job(self, job_id: str) -> Optional[StoredJob]:
+        """
+        Look up a job of any worker
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            Optional[StoredJob]: View of the job, None if unknown or trimmed
+        """
+        row = self.job_row(job_id)
+        return StoredJob(self, row) if row is not None else None
+
+    def lines_after(self, job_id: str, seq: int) -> Tuple[Optional[Dict], List[Tuple[int, float, str]], int]:
+        """
+        Read a job and its stored output lines after a sequence number
+
+        Args:
+            job_id (str): Job ID
+            seq (int): Sequence number of the last line the reader has
+
+        Returns:
+            Tuple: (job row or None, new lines, number of lines after seq already dropped)
+        """
+        row = self.job_row(job_id)
+        if row is None:
+            return None, [], 0
+        # The lines are read after the row, so they are at least as new as its line_count
+        lines = [(line['seq'], line['ts'], line['text']) for line in self._connect().execute(
+            'SELECT seq, ts, text FROM job_lines WHERE job_id = ? AND seq > ? ORDER BY seq', (job_id, seq)
+        )]
+        first = lines[0][0] if lines else row['line_count'] + 1
+        return row, lines, max(0, first - seq - 1)
+
+    def save_rollout(self, snapshot: Dict) -> None:
+        """
+        Write the current state of one of this worker's rollouts
+
+        Args:
+            snapshot (Dict): Rollout.to_dict()
+        """
+        finished_at = snapshot.get('finished_at')
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO rollouts (id, status, snapshot, created_at, finished_at, owner, lease_expires) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET status = excluded.status, '
+                'snapshot = excluded.snapshot, finished_at = excluded.finished_at',
+                (snapshot['rollout_id'], snapshot['status'], json.dumps(snapshot), snapshot['created_at'],
+                 finished_at, self.owner, time.time() + self.lease_ttl)
+            )
+            if finished_at is not None:
+                connection.execute(
+                    'DELETE FROM rollouts WHERE id IN (SELECT id FROM rollouts WHERE finished_at IS NOT NULL '
+                    'ORDER BY finished_at DESC LIMIT -1 OFFSET ?)',
+                    (FINISHED_ROLLOUTS_KEPT,)
+                )
+
+    def load_rollout(self, rollout_id: str) -> Optional[StoredRollout]:
+        """
+        Look up a rollout of any worker
+
+        Args:
+            rollout_id (str): Rollout ID
+
+        Returns:
+            Optional[StoredRollout]: View of the rollout, halted if its worker exited; None if unknown
+        """
+        row = self._connect().execute('SELECT snapshot, finished_at, lease_expires FROM rollouts WHERE id = ?',
+                                      (rollout_id,)).fetchone()
+        if row is None:
+            return None
+        snapshot = json.loads(row['snapshot'])
+        if row['finished_at'] is None and row['lease_expires'] <= time.time():
+            snapshot.update(status=HALTED, message="The worker process running this rollout exited")
+        return StoredRollout(snapshot)
@@ -0,0 +1,419 @@
+"""
+Module for running EAP start/stop operations as background jobs.
+
+Jobs run on a bounded worker pool and are serialized per server: a server never has
+more than one job running, later jobs for it wait in a FIFO queue. Submitting the same
+action as the server's latest unfinished job returns that job instead of a new one.
+
+While a job runs, every output line is recorded with a sequence number and timestamp in
+a bounded buffer, so browsers can follow the operation live (see status_stream.stream_job).
+
+With a `converge` function, a job whose start/stop succeeded then watches its server reach
+the target state. The watch runs on its own thread after the job has handed the server to
+its next queued job; that next job cancels the watch. A watch that runs out of time ends
+the job as UNCONFIRMED.
+
+With a `store` (see job_store.py), jobs are shared with the other worker processes on the
+host: deduplication, per-server serialization and watch cancellation hold across workers,
+and a sync thread writes each job's state and new output lines to the store every
+SYNC_INTERVAL seconds, so any worker can answer lookups and streams of the job.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from job_store import JobStore
+
+# Maximum number of jobs running at the same time across all servers
+DEFAULT_MAX_WORKERS = 4
+
+# Number of finished jobs kept for /jobs lookups
+FINISHED_JOBS_KEPT = 500
+
+# Output lines kept per job for live streaming; older lines are dropped first
+MAX_OUTPUT_LINES = 2000
+
+# Longer output lines are cut to this many characters
+MAX_LINE_CHARS = 2000
+
+# Seconds between writes of running jobs to the shared store
+SYNC_INTERVAL = 0.5
+
+QUEUED = 'queued'
+RUNNING = 'running'
+CONVERGING = 'converging'  # the start/stop returned, waiting for the server to reach the target state
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+UNCONFIRMED = 'unconfirmed'  # the start/stop returned, but the target state was not seen in time
+
+
+class Job:
+    """A start/stop operation submitted for one server"""
+
+    def __init__(self, server_id: str, action: str, username: str, password: str):
+        """
+        Initialize a job
+
+        Args:
+            server_id (str): ID of the server to manage
+            action (str): "start" or "stop"
+            username (str): User who submitted the job
+            password (str): Password used for the remote session, dropped once the job finishes
+        """
+        self.id = uuid.uuid4().hex
+        self.server_id = server_id
+        self.action = action
+        self.username = username
+        self._password = password
+        self.status = QUEUED
+        self.output: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # ID of the job's trace on /admin/traces, set by the runner
+        self.trace_id: Optional[str] = None
+        # States seen after the start/stop until the server reached the target, set by the runner
+        self.convergence: Optional[Dict] = None
+        self._done = threading.Event()
+        # (sequence number, epoch time, text) of the latest output lines
+        self._lines: Deque[Tuple[int, float, str]] = deque(maxlen=MAX_OUTPUT_LINES)
+        self._line_count = 0
+        self._changed = threading.Condition()
+        # Set when a later job for the server makes the convergence watch pointless
+        self.cancel_watch = threading.Event()
+        # Lines not written to the shared store yet; None when the job is not stored
+        self._unsaved: Optional[Deque[Tuple[int, float, str]]] = None
+
+    @property
+    def password(self) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: Password for the remote session, None once the job finished
+        """
+        return self._password
+
+    @property
+    def finished(self) -> bool:
+        """
+        Returns:
+            bool: True if the job succeeded, failed or ended unconfirmed
+        """
+        return self.status in (SUCCEEDED, FAILED, UNCONFIRMED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the job to finish
+
+        Args:
+            timeout (float, optional): Seconds to wait, forever if None
+
+        Returns:
+            bool: True if the job finished
+        """
+        return self._done.wait(timeout)
+
+    def append_line(self, text: str) -> None:
+        """
+        Record one output line and wake stream readers; safe to call from any thread
+
+        Args:
+            text (str): Output line
+        """
+        with self._changed:
+            self._line_count += 1
+            line = (self._line_count, time.time(), text[:MAX_LINE_CHARS])
+            self._lines.append(line)
+            if self._unsaved is not None:
+                self._unsaved.append(line)
+            self._changed.notify_all()
+
+    def take_unsaved_lines(self) -> List[Tuple[int, float, str]]:
+        """
+        Returns:
+            List[Tuple[int, float, str]]: Lines recorded since the last call, for the shared store
+        """
+        with self._changed:
+            lines = list(self._unsaved or ())
+            if self._unsaved is not None:
+                self._unsaved.clear()
+            return lines
+
+    def lines_after(self, seq: int, timeout: Optional[float] = None) -> Tuple[List[Tuple[int, float, str]], int]:
+        """
+        Get the output lines after a sequence number, waiting for new ones while the job is unfinished
+
+        Args:
+            seq (int): Sequence number of the last line the reader has, 0 for none
+            timeout (float, optional): Seconds to wait when there is nothing new, forever if None
+
+        Returns:
+            Tuple[List[Tuple[int, float, str]], int]: (seq, timestamp, text) of the new lines, and the
+            number of lines after seq that were already dropped from the buffer
+        """
+        with self._changed:
+            if self._line_count <= seq and not self.finished:
+                self._changed.wait(timeout)
+            lines = [line for line in self._lines if line[0] > seq]
+            first = lines[0][0] if lines else self._line_count + 1
+            return lines, max(0, first - seq - 1)
+
+    def _notify(self) -> None:
+        """Wake stream readers after a status change"""
+        with self._changed:
+            self._changed.notify_all()
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the job for a JSON response
+
+        Returns:
+            Dict: Job state without credentials
+        """
+        return {
+            "job_id": self.id,
+            "server_id": self.server_id,
+            "action": self.action,
+            "username": self.username,
+            "status": self.status,
+            "output": self.output,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "output_lines": self._line_count,
+            "trace_id": self.trace_id,
+            "convergence": self.convergence
+        }
+
+
+class JobQueue:
+    """Bounded worker pool running jobs one at a time per server"""
+
+    def __init__(self, runner: Callable[[Job], Optional[str]], max_workers: int = DEFAULT_MAX_WORKERS,
+                 converge: Optional[Callable[[Job], str]] = None, store: Optional['JobStore'] = None):
+        """
+        Initialize the job queue
+
+        Args:
+            runner (Callable): Function executing a job and returning its captured output;
+                raising marks the job failed
+            max_workers (int): Maximum number of jobs running at the same time
+            converge (Callable, optional): Function watching a succeeded job's server until it
+                reaches the target state or job.cancel_watch is set, returning the job's final
+                status (SUCCEEDED or UNCONFIRMED)
+            store (JobStore, optional): Store sharing the jobs with the other worker processes
+        """
+        self._runner = runner
+        self._converge = converge
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='eap-job')
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: Dict[str, Deque[Job]] = {}
+        self._running: Dict[str, Job] = {}
+        self._converging: Dict[str, Job] = {}
+        self._sync_thread: Optional[threading.Thread] = None
+
+    def submit(self, server_id: str, action: str, username: str, password: str) -> Tuple[Job, bool]:
+        """
+        Submit a job, collapsing it into the server's latest unfinished job if the action matches
+
+        Args:
+            server_id (str): ID of the server to manage
+            action (str): "start" or "stop"
+            username (str): User submitting the job
+            password (str): Password for the remote session
+
+        Returns:
+            Tuple[Job, bool]: The job, and True if it was newly created; with a store, the
+            existing job may be a StoredJob run by another worker
+        """
+        with self._lock:
+            pending = self._pending.setdefault(server_id, deque())
+            job = Job(server_id, action, username, password)
+            if self.store is not None:
+                # Also renews the leases of this worker's rollouts, which may only reuse other workers' jobs
+                self._start_sync()
+                # The store knows the latest unfinished job of every worker, this one included
+                existing_id = self.store.insert_job(job)
+                if existing_id is not None:
+                    return self._jobs.get(existing_id) or self.store.load_job(existing_id), False
+                job._unsaved = deque(maxlen=MAX_OUTPUT_LINES)
+            else:
+                latest = pending[-1] if pending else (self._running.get(server_id)
+                                                      or self._converging.get(server_id))
+                if latest is not None and latest.action == action:
+                    return latest, False
+
+            self._jobs[job.id] = job
+            pending.append(job)
+            self._dispatch(server_id)
+            return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Look up a job
+
+        Args:
+            job_id (str): ID returned by submit()
+
+        Returns:
+            Optional[Job]: The job or None if unknown or expired; with a store, jobs of other
+            workers are returned as StoredJob
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            return self.store.load_job(job_id)
+        return job
+
+    def _dispatch(self, server_id: str) -> None:
+        """Start the next queued job of a server if none is running (caller holds the lock)"""
+        if server_id in self._running:
+            return
+        pending = self._pending.get(server_id)
+        if not pending:
+            return
+        job = pending[0]
+        if self.store is not None:
+            try:
+                acquired = self.store.acquire_server(server_id, job.id)
+            except sqlite3.Error:
+                acquired = False
+            if not acquired:
+                # Another worker runs a job on the server or has an older one queued; the sync thread retries
+                return
+        pending.popleft()
+        self._running[server_id] = job
+        watched = self._converging.get(server_id)
+        if watched is not None:
+            # The server's state is about to change again, so the earlier job's watch is moot
+            watched.cancel_watch.set()
+        self._executor.submit(self._run, job)
+
+    def _run(self, job: Job) -> None:
+        """Execute a job and hand the server to its next queued job"""
+        job.status = RUNNING
+        job.started_at = time.time()
+        job._notify()
+        self._save(job)
+        watch = False
+        try:
+            job.output = self._runner(job)
+            watch = self._converge is not None
+            job.status = CONVERGING if watch else SUCCEEDED
+        except Exception as e:
+            job.error = str(e)
+            job.output = getattr(e, 'output', None) or job.output
+            job.status = FAILED
+        finally:
+            # Stored before the server is released, so no worker collapses a new job into this one
+            if watch:
+                self._save(job)
+            else:
+                self._finish(job)
+            with self._lock:
+                self._running.pop(job.server_id, None)
+                if watch:
+                    self._converging[job.server_id] = job
+                self._release(job.server_id)
+                self._dispatch(job.server_id)
+            if watch:
+                job._notify()
+                threading.Thread(target=self._watch, args=(job,), name=f'eap-watch-{job.id[:8]}',
+                                 daemon=True).start()
+
+    def _watch(self, job: Job) -> None:
+        """Watch a succeeded job's server converge, outside the server's serialization slot"""
+        try:
+            status = self._converge(job)
+        except Exception as e:
+            job.error = f"Convergence watch failed: {e}"
+            status = UNCONFIRMED
+        with self._lock:
+            if self._converging.get(job.server_id) is job:
+                del self._converging[job.server_id]
+        job.status = status
+        self._finish(job)
+
+    def _finish(self, job: Job) -> None:
+        """Mark a job finished, drop its password and wake its waiters"""
+        job.finished_at = time.time()
+        job._password = None
+        # Stored before waiters wake, so every worker sees the job finished once they do
+        self._save(job)
+        with self._lock:
+            self._trim()
+        job._done.set()
+        job._notify()
+
+    def _trim(self) -> None:
+        """Forget the oldest finished jobs beyond FINISHED_JOBS_KEPT (caller holds the lock)"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._jobs[job_id]
+
+    def _release(self, server_id: str) -> None:
+        """Give up the server's lease in the store, if there is one (caller holds the lock)"""
+        if self.store is None:
+            return
+        try:
+            self.store.release_server(server_id)
+        except sqlite3.Error:
+            # Not renewed once the job is no longer running, so the lease runs out on its own
+            pass
+
+    def _save(self, job: Job) -> None:
+        """Write a job's state and new output lines to the store, if there is one"""
+        if self.store is None:
+            return
+        try:
+            self.store.save_job(job, job.take_unsaved_lines())
+        except sqlite3.Error:
+            # The next sync retries; the job itself must not fail because the store is busy
+            pass
+
+    def _start_sync(self) -> None:
+        """Start the thread syncing with the store on first use (caller holds the lock)"""
+        if self._sync_thread is None:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name='eap-job-sync', daemon=True)
+            self._sync_thread.start()
+
+    def _sync_loop(self) -> None:
+        last_renewal = time.monotonic()
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            try:
+                if time.monotonic() - last_renewal >= self.store.lease_ttl / 3:
+                    self.store.renew()
+                    last_renewal = time.monotonic()
+                self._sync()
+            except sqlite3.Error:
+                continue
+
+    def _sync(self) -> None:
+        """
+        Write running and converging jobs to the store, pass on watch cancellations from
+        other workers, and retry queued jobs waiting for another worker's server lease
+        """
+        with self._lock:
+            active = list(self._running.values()) + list(self._converging.values())
+            converging = {job.id: job for job in self._converging.values()}
+            waiting = [server_id for server_id, pending in self._pending.items()
+                       if pending and server_id not in self._running]
+        for job in active:
+            self._save(job)
+        if converging:
+            for job_id in self.store.cancelled_watches():
+                if job_id in converging:
+                    converging[job_id].cancel_watch.set()
+        if waiting:
+            with self._lock:
+                for server_id in waiting:
+                    self._dispatch(server_id)
@@ -1,180 +1,217 @@
-import json
 import subprocess
 import os
-import logging
 import datetime
-from logging.handlers import RotatingFileHandler
+import time
+
+from admission import ACTION, get_admission
+from app_logging import get_logger, is_debug_enabled, truncate_output
+from deadline import DEFAULT_ACTION_TIMEOUT, deadline_scope
+from metrics import ACTIONS, track_remote_call
+from models.server_config import ServerConfig
+from operation_history import get_operation_history
+from remote_executor import RemoteCall, get_executor
+from tracing import TRACER
 
 # Configure logging
 def setup_logger():
     """
-    Sets up a logger with both file and console handlers.
-    File logs will be stored in 'logs/jboss_management.log' with rotation.
+    Sets up the JBoss management logger.
+    Records are queued and written by a background thread as JSON lines to
+    'logs/jboss_management.log' (with rotation), INFO and above also to the console.
     """
-    # Create logs directory if it doesn't exist
-    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # Create logger
-    logger = logging.getLogger('jboss_management')
-    logger.setLevel(logging.DEBUG)
-    
-    # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s [%(levelname)s] %(message)s\n'
-        'Details: %(details)s\n'
-        '-------------------------'
-    )
-    console_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-    
-    # File handler (with rotation)
-    file_handler = RotatingFileHandler(
-        os.path.join(log_dir, 'jboss_management.log'),
-        maxBytes=1024*1024,  # 1MB
-        backupCount=5
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(file_formatter)
-    
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(console_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
+    return get_logger('jboss_management')
 
 # Initialize logger
 logger = setup_logger()
 
-def manage_jboss(server_key, action, username, password, config_path="config.json"):
+def _prepare_action(server_key, action, username, password, config_path, on_output=None):
     """
-    Manages JBoss (start or stop) on a given server by reading the *entire command* 
-    from a JSON config (including directory changes). Passes credentials dynamically to PowerShell.
+    Validates the request and builds the remote call of a start/stop operation.
+    Must run inside the operation's deadline scope, which the call captures.
 
-    :param server_key: The key in the JSON ("wpdhsappl84", "prod92", etc.)
-    :param action: "start" or "stop"
-    :param username: The credential username for the remote machine
-    :param password: The credential password for the remote machine
-    :param config_path: Path to the JSON configuration file
+    :return: RemoteCall for the process-wide remote executor
     """
-    
-    try:
-        # Log operation start
-        logger.info(
-            f"Initiating JBoss {action} operation for server {server_key}",
-            extra={'details': {
-                'server': server_key,
-                'action': action,
-                'username': username,
-                'config_path': config_path,
-                'timestamp': datetime.datetime.now().isoformat()
-            }}
-        )
-
-        # 1. Load the configuration
-        if not os.path.exists(config_path):
-            error_msg = f"Could not find config file: {config_path}"
-            logger.error(error_msg, extra={'details': {'error_type': 'FileNotFound'}})
-            raise FileNotFoundError(error_msg)
-
-        with open(config_path, 'r') as f:
-            config = json.load(f)
-            logger.debug(
-                "Successfully loaded configuration file",
-                extra={'details': {'config_path': config_path}}
-            )
-
-        servers = config.get("servers", {})
-        server_data = servers.get(server_key)
-        if not server_data:
-            error_msg = f"Server '{server_key}' not found in configuration"
-            logger.error(error_msg, extra={'details': {'available_servers': list(servers.keys())}})
-            raise ValueError(error_msg)
-
-        # 2. Decide which CLI command to run
-        if action.lower() == "start":
-            jboss_script = server_data["start_jboss"]
-        elif action.lower() == "stop":
-            jboss_script = server_data["stop_jboss"]
-        else:
-            error_msg = "Invalid action. Must be 'start' or 'stop'"
-            logger.error(error_msg, extra={'details': {'provided_action': action}})
-            raise ValueError(error_msg)
+    # Log operation start
+    logger.info(
+        f"Initiating JBoss {action} operation for server {server_key}",
+        extra={'server': server_key, 'details': {
+            'server': server_key,
+            'action': action,
+            'username': username,
+            'config_path': config_path,
+            'timestamp': datetime.datetime.now().isoformat()
+        }}
+    )
 
+    # 1. Load the configuration
+    if not os.path.exists(config_path):
+        error_msg = f"Could not find config file: {config_path}"
+        logger.error(error_msg, extra={'server': server_key, 'details': {'error_type': 'FileNotFound'}})
+        raise FileNotFoundError(error_msg)
+
+    # Shared, already parsed configuration; reloaded only when the file changes
+    server_config = ServerConfig.get_instance(config_path)
+
+    if server_config.get_entry(server_key) is None:
+        error_msg = f"Server '{server_key}' not found in configuration"
+        logger.error(error_msg, extra={'server': server_key, 'details': {'available_servers': server_config.server_ids()}})
+        raise ValueError(error_msg)
+
+    # 2. Decide which CLI command to run
+    if action.lower() in ("start", "stop"):
+        jboss_script = server_config.get_command(server_key, action.lower())
+    else:
+        error_msg = "Invalid action. Must be 'start' or 'stop'"
+        logger.error(error_msg, extra={'server': server_key, 'details': {'provided_action': action}})
+        raise ValueError(error_msg)
+
+    if is_debug_enabled(server_key):
         logger.debug(
             f"Retrieved JBoss {action} script from configuration",
-            extra={'details': {'script': jboss_script}}
+            extra={'server': server_key, 'details': {'script': jboss_script}}
         )
 
-        # 3. Construct PowerShell script
-        powershell_script = f'''
-        $securePassword = ConvertTo-SecureString "{password}" -AsPlainText -Force
-        $cred = New-Object System.Management.Automation.PSCredential ("{username}", $securePassword)
+    # 3. Construct PowerShell script; $session is the pooled PSSession to the server
+    powershell_script = f'''
+    Invoke-Command -Session $session -ScriptBlock {{
+        {jboss_script}
+    }}
+    '''
 
-        Write-Host "Creating PowerShell session to {server_key}..."
-        $session = New-PSSession -ComputerName {server_key} -Credential $cred
+    logger.debug(
+        "Constructed PowerShell script",
+        extra={'server': server_key, 'details': {'script_length': len(powershell_script)}}
+    )
 
-        Invoke-Command -Session $session -ScriptBlock {{
-            {jboss_script}
+    # 4. Invoke PowerShell through the remote executor (a warm pooled session by default)
+    logger.info(
+        f"Executing PowerShell script for {action} operation",
+        extra={'server': server_key, 'details': {
+            'server': server_key,
+            'action': action,
+            'execution_time': datetime.datetime.now().isoformat()
         }}
+    )
+    return RemoteCall(
+        username, password, server_key, powershell_script, action.lower(),
+        arguments={"command": jboss_script}, on_output=on_output
+    )
 
-        Remove-PSSession -Session $session
-        '''
-
-        logger.debug(
-            "Constructed PowerShell script",
-            extra={'details': {'script_length': len(powershell_script)}}
-        )
+def _finish_action(call, action, result):
+    """
+    Checks the result of a start/stop operation.
 
-        # 4. Invoke PowerShell
+    :return: Output captured from the remote script
+    :raises subprocess.CalledProcessError: If the script reported errors
+    """
+    # 5. Check results
+    if result.ok:
         logger.info(
-            f"Executing PowerShell script for {action} operation",
-            extra={'details': {
-                'server': server_key,
-                'action': action,
+            f"Successfully executed {action} operation",
+            extra={'server': call.server, 'details': {
+                'stdout': truncate_output(result.output),
                 'execution_time': datetime.datetime.now().isoformat()
             }}
         )
+        ACTIONS.inc(server=call.server, action=action.lower(), outcome='succeeded')
+        return result.output
+
+    error_msg = "PowerShell script reported errors"
+    logger.error(
+        error_msg,
+        extra={'server': call.server, 'details': {
+            'output': truncate_output(result.output)
+        }}
+    )
+    raise subprocess.CalledProcessError(
+        1, call.script, output=result.output
+    )
 
-        process = subprocess.run(
-            ["powershell.exe", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", powershell_script],
-            capture_output=True, text=True
+def _record_operation(server_key, action, username, outcome, started_at, error=None):
+    """
+    Writes a finished start/stop operation to the operation history (see operation_history.py).
+    A history that cannot be written is logged and does not fail the operation.
+    """
+    try:
+        get_operation_history().record(server_key, str(action).lower(), username, outcome, started_at,
+                                       time.time() - started_at, None if error is None else str(error))
+    except Exception as e:
+        # Recording is a side effect; the start/stop already ran and keeps its own outcome
+        logger.warning(
+            "Could not record operation in history",
+            extra={'server': server_key, 'details': {'error_type': type(e).__name__, 'error_message': str(e)}}
         )
 
-        # 5. Check results
-        if process.returncode == 0:
-            logger.info(
-                f"Successfully executed {action} operation",
-                extra={'details': {
-                    'stdout': process.stdout,
-                    'execution_time': datetime.datetime.now().isoformat()
-                }}
-            )
-        else:
-            error_msg = f"PowerShell script failed with return code {process.returncode}"
-            logger.error(
-                error_msg,
-                extra={'details': {
-                    'stderr': process.stderr,
-                    'stdout': process.stdout,
-                    'return_code': process.returncode
-                }}
-            )
-            raise subprocess.CalledProcessError(
-                process.returncode, process.args,
-                output=process.stdout, stderr=process.stderr
-            )
+def _record_failure(server_key, action, error):
+    """
+    Counts and logs a failed start/stop operation.
+
+    :return: Outcome recorded for the operation
+    """
+    if isinstance(error, ConnectionError):
+        outcome = 'connection_failed'
+    elif isinstance(error, TimeoutError):
+        outcome = 'timed_out'
+    else:
+        outcome = 'failed'
+    ACTIONS.inc(server=server_key, action=str(action).lower(), outcome=outcome)
+    logger.exception(
+        f"Unexpected error during {action} operation",
+        extra={'server': server_key, 'details': {
+            'error_type': type(error).__name__,
+            'error_message': str(error)
+        }}
+    )
+    return outcome
+
+def manage_jboss(server_key, action, username, password, config_path="config.json", on_output=None):
+    """
+    Manages JBoss (start or stop) on a given server by reading the *entire command* 
+    from a JSON config (including directory changes). Runs through the process-wide remote
+    executor, by default a warm PSSession from the shared session pool.
 
+    :param server_key: The key in the JSON ("wpdhsappl84", "prod92", etc.)
+    :param action: "start" or "stop"
+    :param username: The credential username for the remote machine
+    :param password: The credential password for the remote machine
+    :param config_path: Path to the JSON configuration file
+    :param on_output: Optional callable receiving each output line as soon as it arrives
+    :return: Output captured from the remote script
+    """
+    started_at = time.time()
+    try:
+        # Bounded by the caller's deadline or DEFAULT_ACTION_TIMEOUT; on timeout the remote
+        # process tree is killed and the partial output travels on the TimeoutError.
+        # Traced as a span of the caller's trace, or as its own sampled trace
+        with TRACER.trace('manage_jboss', server=server_key, action=action), \
+                deadline_scope(DEFAULT_ACTION_TIMEOUT):
+            call = _prepare_action(server_key, action, username, password, config_path, on_output)
+            # Start/stop runs ahead of every queued status check
+            with get_admission().slot(server_key, ACTION), track_remote_call(server_key, action.lower()):
+                result = get_executor().execute(call)
+        output = _finish_action(call, action, result)
     except Exception as e:
-        logger.exception(
-            f"Unexpected error during {action} operation",
-            extra={'details': {
-                'error_type': type(e).__name__,
-                'error_message': str(e)
-            }}
-        )
+        _record_operation(server_key, action, username, _record_failure(server_key, action, e), started_at, e)
+        raise
+    _record_operation(server_key, action, username, 'succeeded', started_at)
+    return output
+
+async def manage_jboss_async(server_key, action, username, password, config_path="config.json", on_output=None):
+    """
+    Same as manage_jboss, awaiting the remote executor on the event loop instead of
+    blocking a thread (see async_runtime.py).
+    """
+    started_at = time.time()
+    try:
+        with TRACER.trace('manage_jboss', server=server_key, action=action), \
+                deadline_scope(DEFAULT_ACTION_TIMEOUT):
+            call = _prepare_action(server_key, action, username, password, config_path, on_output)
+            async with get_admission().slot_async(server_key, ACTION):
+                with track_remote_call(server_key, action.lower()):
+                    result = await get_executor().execute_async(call)
+        output = _finish_action(call, action, result)
+    except Exception as e:
+        _record_operation(server_key, action, username, _record_failure(server_key, action, e), started_at, e)
         raise
+    _record_operation(server_key, action, username, 'succeeded', started_at)
+    return output
@@ -0,0 +1,298 @@
+"""
+Module for in-process metrics exposed in the Prometheus text format.
+
+Counters, gauges and histograms keep one value (or bucket array) per label set behind a
+single lock per metric, so recording costs a dict lookup and a few additions and can stay
+on in production. `/metrics` renders every registered metric with REGISTRY.render().
+
+Remote calls are broken down into phases on the `eap_remote_phase_seconds` histogram:
+    acquire  waiting for a free slot in the session pool
+    spawn    starting powershell.exe
+    session  creating the PSSession (New-PSSession)
+    exec     running the status or start/stop script (or the JBoss HTTP request)
+    parse    parsing the status payload
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from tracing import record_span, span
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Format a label set as {name="value",...}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value, using integers where possible"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """Base of all metric types: a name, help text and label names"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """
+        Returns:
+            List[str]: HELP, TYPE and sample lines of the metric
+        """
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """
+        Increase the counter
+
+        Args:
+            amount (float): Amount to add
+            **labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Value per label set that can go up and down"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increase the gauge by amount"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Decrease the gauge by amount"""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge to value"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets per label set"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last)], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record one observation
+
+        Args:
+            value (float): Observed value, seconds for latency histograms
+            **labels: Label values
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock seconds spent in the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a counter"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge"""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Register a function called before every render, e.g. to set gauges from pool stats
+
+        Args:
+            collector (Callable): Function without arguments
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format
+
+        Returns:
+            str: Exposition text ending with a newline
+        """
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collector in collectors:
+            collector()
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry and the metrics of the remote call path
+REGISTRY = MetricsRegistry()
+
+REMOTE_PHASE_SECONDS = REGISTRY.histogram(
+    'eap_remote_phase_seconds', 'Seconds spent per phase of remote calls', ('server', 'phase'))
+REMOTE_CALL_SECONDS = REGISTRY.histogram(
+    'eap_remote_call_seconds', 'Seconds per remote call end to end', ('server', 'kind'))
+REMOTE_CALLS_IN_FLIGHT = REGISTRY.gauge(
+    'eap_remote_calls_in_flight', 'Remote calls currently executing', ('kind',))
+CONNECTION_FAILURES = REGISTRY.counter(
+    'eap_connection_failures_total', 'Remote calls that failed to connect', ('server', 'kind'))
+TIMEOUTS = REGISTRY.counter(
+    'eap_timeouts_total', 'Remote calls that timed out', ('server', 'kind'))
+STATUS_CHECKS = REGISTRY.counter(
+    'eap_status_checks_total', 'Status checks by outcome', ('server', 'outcome'))
+ACTIONS = REGISTRY.counter(
+    'eap_actions_total', 'EAP start/stop operations by outcome', ('server', 'action', 'outcome'))
+
+
+def observe_phase(server: str, phase: str, seconds: float) -> None:
+    """
+    Record the duration of one phase of a remote call
+
+    Args:
+        server (str): Server the call went to
+        phase (str): acquire, spawn, session, exec or parse
+        seconds (float): Duration
+    """
+    REMOTE_PHASE_SECONDS.observe(seconds, server=server, phase=phase)
+    # Also a span of the request's trace, if it is traced
+    record_span(phase, seconds, server=server)
+
+
+@contextmanager
+def track_remote_call(server: str, kind: str) -> Iterator[None]:
+    """
+    Time a remote call end to end, count it as in flight and count connection failures and timeouts
+
+    Args:
+        server (str): Server the call goes to
+        kind (str): status, start or stop
+    """
+    REMOTE_CALLS_IN_FLIGHT.inc(kind=kind)
+    start = time.perf_counter()
+    try:
+        with span(f"remote {kind}", server=server):
+            yield
+    except ConnectionError:
+        CONNECTION_FAILURES.inc(server=server, kind=kind)
+        raise
+    except TimeoutError:
+        TIMEOUTS.inc(server=server, kind=kind)
+        raise
+    finally:
+        REMOTE_CALLS_IN_FLIGHT.dec(kind=kind)
+        REMOTE_CALL_SECONDS.observe(time.perf_counter() - start, server=server, kind=kind)
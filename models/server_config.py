@@ -1,50 +1,283 @@
 """
 Module for managing server configuration and services
 """
+import hashlib
 import json
 import os
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app_logging import get_logger
+from models.server_inventory import ServerInventory
+
+logger = get_logger('eap_status')
+
+# Default location of the server configuration file
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'config', 'server_config.json')
+
+# Minimum seconds between two checks of the config file's modification time
+RELOAD_CHECK_INTERVAL = 1.0
+
+# Config keys holding the JBoss commands, by command kind
+COMMAND_KEYS = {
+    'check': 'check_jboss_is_running',
+    'start': 'start_jboss',
+    'stop': 'stop_jboss'
+}
+
+
+class ServerEntry:
+    """Precomputed lookups for one configured server"""
+
+    def __init__(self, server_id: str, info: Dict):
+        """
+        Initialize a server entry from its configuration
+
+        Args:
+            server_id (str): ID of the server
+            info (Dict): Server configuration from the JSON file
+        """
+        self.server_id = server_id
+        self.info = info
+        self.name = info.get('name', server_id)
+        self.services = info.get('services', [])
+        self.service_names = [service['name'] for service in self.services]
+        self.commands = {kind: info.get(key) for kind, key in COMMAND_KEYS.items()}
+        self.environment: Optional[str] = info.get('environment')
+        self.tags: List[str] = list(info.get('tags', []))
+
+
+class _ConfigState:
+    """Parsed configuration, swapped as a whole on reload"""
+
+    def __init__(self, config: Dict, digest: str, signature: Tuple[int, int]):
+        self.config = config
+        self.digest = digest
+        self.signature = signature
+        self.entries = {server_id: ServerEntry(server_id, info)
+                        for server_id, info in config.get('servers', {}).items()}
+        self._inventory: Optional[ServerInventory] = None
+        self._inventory_lock = threading.Lock()
+
+    @property
+    def inventory(self) -> ServerInventory:
+        """Search index of the servers, built on first use"""
+        with self._inventory_lock:
+            if self._inventory is None:
+                self._inventory = ServerInventory(self.entries.values())
+            return self._inventory
+
 
 class ServerConfig:
     """Class to manage server configuration and services"""
-    
-    def __init__(self):
-        """Initialize ServerConfig with the configuration file"""
-        self.config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                                      'config', 'server_config.json')
-        self.config = self._load_config()
-    
-    def _load_config(self) -> Dict:
+
+    _instances: Dict[str, 'ServerConfig'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, config_path: Optional[str] = None):
+        """
+        Initialize ServerConfig with the configuration file
+
+        Prefer ServerConfig.get_instance(), which shares one object per file across the process.
+
+        Args:
+            config_path (str, optional): Path to the JSON file, defaults to config/server_config.json
+        """
+        self.config_path = os.path.abspath(config_path) if config_path else DEFAULT_CONFIG_PATH
+        self._reload_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._failed_signature: Optional[Tuple[int, int]] = None
+        self._state = self._load_state()
+
+    @classmethod
+    def get_instance(cls, config_path: Optional[str] = None) -> 'ServerConfig':
+        """
+        Get the process-wide ServerConfig for a configuration file
+
+        Args:
+            config_path (str, optional): Path to the JSON file, defaults to config/server_config.json
+
+        Returns:
+            ServerConfig: Shared instance, reloaded automatically when the file changes
+        """
+        path = os.path.abspath(config_path) if config_path else DEFAULT_CONFIG_PATH
+        instance = cls._instances.get(path)
+        if instance is None:
+            with cls._instances_lock:
+                instance = cls._instances.get(path)
+                if instance is None:
+                    instance = cls(path)
+                    cls._instances[path] = instance
+        return instance
+
+    def _file_signature(self) -> Tuple[int, int]:
+        """
+        Get the modification time and size of the config file
+
+        Returns:
+            Tuple[int, int]: (mtime in nanoseconds, size in bytes)
+        """
+        stat = os.stat(self.config_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_state(self) -> _ConfigState:
         """
         Load the server configuration from JSON file
-        
+
+        Returns:
+            _ConfigState: Parsed configuration with its per-server index
+        """
+        signature = self._file_signature()
+        with open(self.config_path, 'rb') as f:
+            raw = f.read()
+        return _ConfigState(json.loads(raw), hashlib.sha256(raw).hexdigest(), signature)
+
+    def _current(self) -> _ConfigState:
+        """
+        Get the current configuration, reloading it if the file changed
+
+        The file's mtime and size are checked at most once per RELOAD_CHECK_INTERVAL. When
+        they changed, the file is re-read and only re-parsed if its content hash differs.
+        A file that cannot be read or parsed keeps the last good configuration in place.
+
+        Returns:
+            _ConfigState: Current configuration
+        """
+        now = time.monotonic()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return self._state
+
+        with self._reload_lock:
+            if now - self._last_check < RELOAD_CHECK_INTERVAL:
+                return self._state
+            self._last_check = now
+            state = self._state
+            try:
+                signature = self._file_signature()
+                if signature in (state.signature, self._failed_signature):
+                    return state
+                with open(self.config_path, 'rb') as f:
+                    raw = f.read()
+                digest = hashlib.sha256(raw).hexdigest()
+                if digest == state.digest:
+                    state.signature = signature
+                    return state
+                new_state = _ConfigState(json.loads(raw), digest, signature)
+                # Build the index now, so a file with a wrong structure is rejected here
+                # instead of failing requests later
+                new_state.inventory
+                self._state = new_state
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                # Report a broken file once, not on every check, until it changes again
+                self._failed_signature = signature if not isinstance(e, OSError) else None
+                logger.error(f"Error reloading server configuration {self.config_path}, keeping the previous one: "
+                             f"{type(e).__name__}: {str(e)}", extra={'config_path': self.config_path})
+            return self._state
+
+    @property
+    def config(self) -> Dict:
+        """
+        Get the full configuration dictionary
+
         Returns:
             Dict: Server configuration dictionary
         """
-        with open(self.config_path, 'r') as f:
-            return json.load(f)
-    
+        return self._current().config
+
+    def server_ids(self) -> List[str]:
+        """
+        Get the IDs of all configured servers
+
+        Returns:
+            List[str]: Server IDs in configuration order
+        """
+        return list(self._current().entries)
+
+    def get_entry(self, server_id: str) -> Optional[ServerEntry]:
+        """
+        Get the precomputed entry of a server
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            Optional[ServerEntry]: Server entry or None if not found
+        """
+        return self._current().entries.get(server_id)
+
     def get_server_info(self, server_id: str) -> Optional[Dict]:
         """
         Get information for a specific server
-        
+
         Args:
             server_id (str): ID of the server
-            
+
         Returns:
             Optional[Dict]: Server information or None if not found
         """
-        return self.config['servers'].get(server_id)
-    
+        entry = self.get_entry(server_id)
+        return entry.info if entry else None
+
     def get_server_services(self, server_id: str) -> List[Dict]:
         """
         Get services associated with a server
-        
+
         Args:
             server_id (str): ID of the server
-            
+
         Returns:
             List[Dict]: List of services for the server or empty list if server not found
         """
-        server_info = self.get_server_info(server_id)
-        return server_info['services'] if server_info else []
+        entry = self.get_entry(server_id)
+        return entry.services if entry else []
+
+    def get_service_names(self, server_id: str) -> List[str]:
+        """
+        Get the names of the services associated with a server
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            List[str]: Service names or empty list if server not found
+        """
+        entry = self.get_entry(server_id)
+        return entry.service_names if entry else []
+
+    def get_command(self, server_id: str, kind: str) -> Optional[str]:
+        """
+        Get a JBoss command of a server
+
+        Args:
+            server_id (str): ID of the server
+            kind (str): "check", "start" or "stop"
+
+        Returns:
+            Optional[str]: The configured command or None if server or command not found
+        """
+        entry = self.get_entry(server_id)
+        return entry.commands.get(kind) if entry else None
+
+    def get_display_name(self, server_id: str) -> Optional[str]:
+        """
+        Get the display name of a server
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            Optional[str]: Display name or None if server not found
+        """
+        entry = self.get_entry(server_id)
+        return entry.name if entry else None
+
+    def inventory(self) -> ServerInventory:
+        """
+        Get the search index of the configured servers
+
+        Returns:
+            ServerInventory: Index built once per configuration version
+        """
+        return self._current().inventory
@@ -0,0 +1,178 @@
+"""
+Module for searching and paging through the configured servers
+"""
+import base64
+import bisect
+import json
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Page size of inventory queries when the caller does not give one, and its upper bound
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that was not produced by ServerInventory"""
+
+
+def encode_cursor(sort_key: Tuple[str, str]) -> str:
+    """
+    Encode the sort key of the last server on a page as an opaque cursor
+
+    Args:
+        sort_key (Tuple[str, str]): (lower-cased name, server ID)
+
+    Returns:
+        str: URL-safe cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(sort_key)).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Args:
+        cursor (str): Cursor from a previous page
+
+    Returns:
+        Tuple[str, str]: Sort key of the last server of that page
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not (isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)):
+            raise ValueError(cursor)
+        return key[0], key[1]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+class ServerInventory:
+    """
+    In-memory index of the configured servers, built once per configuration
+
+    Servers are kept sorted by display name, with inverted indexes for environment and tag,
+    so a page costs a binary search to the cursor plus a scan of the matching servers.
+    Pages are keyed on the last server's sort key, so they stay consistent when the
+    configuration is reloaded between two page requests.
+    """
+
+    def __init__(self, entries: Iterable):
+        """
+        Build the index
+
+        Args:
+            entries (Iterable[ServerEntry]): Configured servers
+        """
+        self._entries = sorted(entries, key=lambda entry: (entry.name.lower(), entry.server_id))
+        self._keys = [(entry.name.lower(), entry.server_id) for entry in self._entries]
+        self._search_text = [' '.join([entry.server_id, entry.name, entry.environment or ''] + entry.tags).lower()
+                             for entry in self._entries]
+        self._by_environment: Dict[str, Set[int]] = {}
+        self._by_tag: Dict[str, Set[int]] = {}
+        for position, entry in enumerate(self._entries):
+            if entry.environment:
+                self._by_environment.setdefault(entry.environment.lower(), set()).add(position)
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag.lower(), set()).add(position)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def server_ids(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Every server ID, in the order the server list shows them
+        """
+        return [entry.server_id for entry in self._entries]
+
+    def environments(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Every environment in use, sorted
+        """
+        return sorted({entry.environment for entry in self._entries if entry.environment})
+
+    def tags(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Every tag in use, sorted
+        """
+        return sorted({tag for entry in self._entries for tag in entry.tags})
+
+    def _candidates(self, environment: Optional[str], tags: List[str]) -> Optional[Set[int]]:
+        """
+        Intersect the inverted indexes of the filters
+
+        Returns:
+            Optional[Set[int]]: Positions matching every filter, None if there is no filter
+        """
+        sets = []
+        if environment:
+            sets.append(self._by_environment.get(environment.lower(), set()))
+        sets.extend(self._by_tag.get(tag.lower(), set()) for tag in tags)
+        if not sets:
+            return None
+        return set.intersection(*sorted(sets, key=len))
+
+    def search(self, query: str = '', environment: Optional[str] = None, tags: Optional[List[str]] = None,
+               cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """
+        Get one page of servers matching a search
+
+        Args:
+            query (str): Words that must all appear in the server ID, name, environment or tags
+            environment (str, optional): Only servers of this environment
+            tags (List[str], optional): Only servers carrying every one of these tags
+            cursor (str, optional): "next_cursor" of the previous page
+            limit (int): Maximum servers per page, capped at MAX_PAGE_SIZE
+
+        Returns:
+            Dict: {"servers": [...], "next_cursor": str|None, "total": int}
+
+        Raises:
+            InvalidCursor: If the cursor is malformed
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        words = query.lower().split()
+        candidates = self._candidates(environment, tags or [])
+        start = bisect.bisect_right(self._keys, decode_cursor(cursor)) if cursor else 0
+
+        def matches(position: int) -> bool:
+            if candidates is not None and position not in candidates:
+                return False
+            text = self._search_text[position]
+            return all(word in text for word in words)
+
+        positions = sorted(candidates) if candidates is not None else range(len(self._entries))
+        matching = [position for position in positions if matches(position)]
+        first = bisect.bisect_left(matching, start)
+        page = matching[first:first + limit]
+        has_more = first + limit < len(matching)
+        return {
+            "servers": [self._to_dict(self._entries[position]) for position in page],
+            "next_cursor": encode_cursor(self._keys[page[-1]]) if has_more else None,
+            "total": len(matching)
+        }
+
+    @staticmethod
+    def _to_dict(entry) -> Dict:
+        """
+        Serialize a server for the inventory API
+
+        Args:
+            entry (ServerEntry): Server to serialize
+
+        Returns:
+            Dict: ID, display name, environment, tags and service names
+        """
+        return {
+            "server_id": entry.server_id,
+            "name": entry.name,
+            "environment": entry.environment,
+            "tags": entry.tags,
+            "services": entry.service_names
+        }
@@ -1,6 +1,7 @@
 """
 Module for handling server selection functionality
 """
+from models.server_config import ServerConfig
 
 class ServerSelection:
     """Class to manage server selection options and related functionality"""
@@ -8,14 +9,13 @@ class ServerSelection:
     @staticmethod
     def get_server_options():
         """
-        Returns a list of available server options
+        Returns a list of available server options, derived from the server configuration
         
         Returns:
             list: List of server options as tuples (server_id, server_name)
         """
-        return [
-            ('', 'Select a Server'),  # Default option
-            ('prod92', 'Prod 92'),
-            ('prod94', 'Prod 94'),
-            ('wpdhsappl84', 'WPDHSappl84')
+        server_config = ServerConfig.get_instance()
+        return [('', 'Select a Server')] + [  # Default option
+            (server_id, server_config.get_display_name(server_id))
+            for server_id in server_config.server_ids()
         ]
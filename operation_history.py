@@ -0,0 +1,214 @@
+"""
+Module for recording start/stop operations in an indexed store for audit queries.
+
+Every manage_jboss operation is written as one row (server, action, user, outcome, start
+time, duration, error) to a SQLite database shared by the worker processes on the host.
+Queries filter on indexed columns and page with a keyset cursor on (started_at, id), so
+"every stop on prod92 this month" stays a short index range scan no matter how much
+history has accumulated; the rotated free-text log no longer has to be grepped.
+
+The database path comes from EAP_OPERATION_DB (default instance/operations.db).
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from models.server_inventory import InvalidCursor
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'operations.db')
+
+# Page size of history queries when the caller does not give one, and its upper bound
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Filters accepted by query(), mapped to their column
+FILTER_COLUMNS = {
+    'server': 'server',
+    'action': 'action',
+    'user': 'username',
+    'outcome': 'outcome'
+}
+
+# One composite index per filter, ending in the sort key, so a filtered page is a range scan
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    server TEXT NOT NULL,
+    action TEXT NOT NULL,
+    username TEXT,
+    outcome TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS operations_started_at ON operations (started_at, id);
+CREATE INDEX IF NOT EXISTS operations_server ON operations (server, started_at, id);
+CREATE INDEX IF NOT EXISTS operations_action ON operations (action, started_at, id);
+CREATE INDEX IF NOT EXISTS operations_username ON operations (username, started_at, id);
+CREATE INDEX IF NOT EXISTS operations_outcome ON operations (outcome, started_at, id);
+'''
+
+_COLUMNS = ('id', 'server', 'action', 'username', 'outcome', 'started_at', 'duration', 'error')
+
+
+def encode_cursor(started_at: float, operation_id: int) -> str:
+    """
+    Encode the sort key of the last operation on a page as an opaque cursor
+
+    Args:
+        started_at (float): Start time of the operation
+        operation_id (int): Row ID of the operation
+
+    Returns:
+        str: URL-safe cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps([started_at, operation_id]).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Args:
+        cursor (str): Cursor from a previous page
+
+    Returns:
+        Tuple[float, int]: Sort key of the last operation of that page
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not (isinstance(key, list) and len(key) == 2 and isinstance(key[0], (int, float))
+                and isinstance(key[1], int)):
+            raise ValueError(cursor)
+        return float(key[0]), key[1]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+class OperationHistory:
+    """Indexed record of start/stop operations shared by all worker processes on a host"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the store, creating the database if needed
+
+        Args:
+            path (str, optional): SQLite database path, defaults to EAP_OPERATION_DB or instance/operations.db
+        """
+        self.path = path or os.environ.get('EAP_OPERATION_DB', DEFAULT_DB_PATH)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection; SQLite connections cannot be shared between threads or forks"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.pid = os.getpid()
+        return connection
+
+    def record(self, server: str, action: str, username: Optional[str], outcome: str,
+               started_at: float, duration: float, error: Optional[str] = None) -> int:
+        """
+        Record a finished operation
+
+        Args:
+            server (str): Server ID
+            action (str): "start" or "stop"
+            username (str, optional): User who requested the operation
+            outcome (str): "succeeded", "failed", "connection_failed" or "timed_out"
+            started_at (float): Start time in epoch seconds
+            duration (float): Seconds the operation took
+            error (str, optional): Error message of a failed operation
+
+        Returns:
+            int: ID of the new entry
+        """
+        return self._connect().execute(
+            'INSERT INTO operations (server, action, username, outcome, started_at, duration, error) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (server, action, username, outcome, started_at, duration, error)
+        ).lastrowid
+
+    def query(self, filters: Optional[Dict[str, str]] = None, since: Optional[float] = None,
+              until: Optional[float] = None, cursor: Optional[str] = None,
+              limit: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """
+        Get one page of operations, newest first
+
+        Args:
+            filters (Dict[str, str], optional): Exact matches on "server", "action", "user" or "outcome"
+            since (float, optional): Only operations started at or after this epoch time
+            until (float, optional): Only operations started before this epoch time
+            cursor (str, optional): "next_cursor" of the previous page
+            limit (int): Maximum operations per page, capped at MAX_PAGE_SIZE
+
+        Returns:
+            Dict: {"operations": [...], "next_cursor": str|None}
+
+        Raises:
+            InvalidCursor: If the cursor is malformed
+            KeyError: If a filter is not one of FILTER_COLUMNS
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        clauses: List[str] = []
+        params: List = []
+        for name, value in (filters or {}).items():
+            clauses.append(f'{FILTER_COLUMNS[name]} = ?')
+            params.append(value)
+        if since is not None:
+            clauses.append('started_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('started_at < ?')
+            params.append(until)
+        if cursor:
+            started_at, operation_id = decode_cursor(cursor)
+            # Row-value comparison, which SQLite answers from the index; the equivalent OR
+            # expression makes it merge two index scans and sort the result
+            clauses.append('(started_at, id) < (?, ?)')
+            params.extend([started_at, operation_id])
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        # One row past the page tells whether there is a next page
+        rows = self._connect().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM operations {where}"
+            'ORDER BY started_at DESC, id DESC LIMIT ?',
+            params + [limit + 1]
+        ).fetchall()
+
+        page = [dict(zip(_COLUMNS, row)) for row in rows[:limit]]
+        for operation in page:
+            operation['user'] = operation.pop('username')
+        has_more = len(rows) > limit
+        return {
+            "operations": page,
+            "next_cursor": encode_cursor(page[-1]['started_at'], page[-1]['id']) if has_more else None
+        }
+
+
+_history: Optional[OperationHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_operation_history() -> OperationHistory:
+    """
+    Get the process-wide operation history, opening the database on first use
+
+    Returns:
+        OperationHistory: Store at EAP_OPERATION_DB
+    """
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = OperationHistory()
+        return _history
@@ -1,109 +1,248 @@
-import subprocess
+import json
+import time
 
-def check_services_powershell(username, password, server, service, jboss_cli_command=None):
+from admission import call_priority, get_admission
+from app_logging import get_logger, is_debug_enabled, truncate_output
+from metrics import observe_phase, track_remote_call
+from ps_session_pool import RemoteTimeoutError, is_connection_error, ps_quote
+from remote_executor import (JBOSS_RESULT_MARKER, SERVICE_RESULT_MARKER, STATUS, STATUS_PAYLOAD_MARKER,
+                             RemoteCall, get_executor)
+
+logger = get_logger('eap_status')
+
+
+class StatusCheckTimeout(TimeoutError):
+    """A status check hit its deadline; carries the results finished before it"""
+
+    def __init__(self, message, payload):
+        """
+        Args:
+            message (str): Error message
+            payload (dict): Partial status payload, see parse_partial_status
+        """
+        super().__init__(message)
+        self.payload = payload
+
+
+def parse_status_payload(output):
     """
-    Check the status of a single service using PowerShell, with enhanced JBoss checking.
+    Parse the JSON status payload written by the remote status script
     Args:
-        username (str): Username for authentication
-        password (str): Password for authentication
-        server (str): Server to check the service on
-        service (str): Name of the service to check
-        jboss_cli_command (str, optional): JBoss CLI command to execute. If None, falls back to standard service check.
+        output (str): Output from the PowerShell command
     Returns:
-        str: Output from PowerShell command
+        dict: {"jboss": {"status": str|None, "error": str|None} or None,
+               "services": {name: {"running": bool|None, "status": str|None, "error": str|None}}}
     Raises:
-        ValueError: If username or password is None or empty
-        ConnectionError: If connection to remote server fails
+        ValueError: If the output has no status payload
     """
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith(STATUS_PAYLOAD_MARKER):
+            payload = json.loads(line[len(STATUS_PAYLOAD_MARKER):])
+            break
+    else:
+        raise ValueError("PowerShell output did not contain a status payload")
+
+    # ConvertTo-Json collapses single-element arrays into the element itself
+    services = payload.get("services") or []
+    if isinstance(services, dict):
+        services = [services]
+
+    return {
+        "jboss": payload.get("jboss"),
+        "services": {service["name"]: service for service in services}
+    }
+
 
+def parse_partial_status(output, services):
+    """
+    Collect the per-item results a status check wrote before it was cut off
+    Args:
+        output (str): Output captured up to the timeout
+        services (list): Names of all services that were being checked
+    Returns:
+        dict: Same shape as parse_status_payload, plus "timed_out": names of the services
+              without a result
+    """
+    jboss = None
+    results = {}
+    for line in output.splitlines():
+        line = line.strip()
+        try:
+            if line.startswith(JBOSS_RESULT_MARKER):
+                jboss = json.loads(line[len(JBOSS_RESULT_MARKER):])
+            elif line.startswith(SERVICE_RESULT_MARKER):
+                entry = json.loads(line[len(SERVICE_RESULT_MARKER):])
+                results[entry["name"]] = entry
+        except (ValueError, KeyError):
+            # The line being written when the process was killed may be cut short
+            continue
+    return {
+        "jboss": jboss,
+        "services": results,
+        "timed_out": [service for service in services if service not in results]
+    }
+
+
+def _build_status_call(username, password, server, services, jboss_cli_command=None):
+    """
+    Build the remote call of a status check, see check_services_powershell
+    Returns:
+        RemoteCall: Status call bounded by the deadline of the current scope
+    Raises:
+        ValueError: If username or password is None or empty
+    """
     # Validate inputs
     if not username or not password:
-        print(f"Validation failed: Username: {username}, Password: {password}")
+        logger.warning("Status check rejected: missing credentials", extra={'server': server, 'username': username})
         raise ValueError("Username and password are required")
-    else:
-        print(f"Validation passed: Username: {username}, Password: {password}")
 
+    service_list = ", ".join(ps_quote(service) for service in services)
 
-    # Build the PowerShell script
+    # Build the PowerShell script; $session is the pooled PSSession to the server
     ps_script = f'''
-$password = ConvertTo-SecureString "{password}" -AsPlainText -Force
-$cred = New-Object System.Management.Automation.PSCredential ("{username}", $password)
-$session = New-PSSession -ComputerName {server} -Credential $cred
+$eapServices = @({service_list})
+$eapJbossCliCommand = {ps_quote(jboss_cli_command or "")}
 
 Invoke-Command -Session $session -ScriptBlock {{
-    param([string] $service, [string] $serverParam, [string] $jbossCliCommand)
-    Write-Host "Checking service: $service"
-    try {{
-        if ($jbossCliCommand) {{
-            # JBoss-specific check
-            $targetDirectory = "D:\\EAP\\jboss-eap-7.4\\bin"
-            Set-Location -Path $targetDirectory
-            $serverLower = $serverParam.ToLower()
-            $statusOutput = Invoke-Expression $jbossCliCommand
-            $status = $null
-
-            # Parse the output to find the status
+    param([string[]] $services, [string] $jbossCliCommand)
+    $result = @{{ jboss = $null; services = @() }}
+    $jbossStatus = $null
+
+    if ($jbossCliCommand) {{
+        # JBoss-specific check, run once for all services
+        try {{
+            $statusOutput = Invoke-Expression $jbossCliCommand 2>&1
             foreach ($line in $statusOutput) {{
-                if ($line -match '"result"\\s*=>\\s*"(\\w+)"') {{
-                    $status = $matches[1]
+                if ("$line" -match '"result"\s*=>\s*"(\w+)"') {{
+                    $jbossStatus = $matches[1]
                     break
                 }}
             }}
+            $result.jboss = @{{ status = $jbossStatus; error = $null }}
+        }} catch {{
+            $result.jboss = @{{ status = $null; error = $_.Exception.Message }}
+        }}
+        Write-Output ("{JBOSS_RESULT_MARKER}" + ($result.jboss | ConvertTo-Json -Compress))
+    }}
 
-            # Determine the status
-            if ($status -eq "STARTED" -or $status -eq "STARTING") {{
-                Write-Host "Service '$service' is running."
-            }} elseif ($status -eq "STOPPED" -or $status -eq "STOPPING") {{
-                Write-Host "Service '$service' is not running."
-            }} else {{
-                Write-Host "Service '$service' status unknown: $status"
-            }}
-        }} else {{
-            # Standard service check
-            $svc = Get-Service -Name $service -ErrorAction Stop
-            if ($svc.Status -eq "Running") {{
-                Write-Host "Service '$service' is running."
+    foreach ($service in $services) {{
+        $entry = @{{ name = $service; running = $null; status = $null; error = $null }}
+        try {{
+            if ($jbossCliCommand) {{
+                $entry.status = $jbossStatus
+                # STARTING and STOPPING stay $null: the server is neither up nor down yet
+                if ($jbossStatus -eq "STARTED") {{
+                    $entry.running = $true
+                }} elseif ($jbossStatus -eq "STOPPED") {{
+                    $entry.running = $false
+                }}
             }} else {{
-                Write-Host "Service '$service' is not running."
+                # Standard service check
+                $svc = Get-Service -Name $service -ErrorAction Stop
+                $entry.status = "$($svc.Status)"
+                $entry.running = ($svc.Status -eq "Running")
             }}
+        }} catch {{
+            $entry.error = $_.Exception.Message
         }}
-    }} catch {{
-        # Properly format the error message
-Write-Host "An error occurred while checking $service: $(${_.Exception.Message})"
-
+        $result.services += $entry
+        # Written per service, so a check cut off by its deadline still reports what finished
+        Write-Output ("{SERVICE_RESULT_MARKER}" + ($entry | ConvertTo-Json -Compress))
     }}
-}} -ArgumentList '{service}', '{server}', '{jboss_cli_command or ""}'
 
-Remove-PSSession $session
+    Write-Output ("{STATUS_PAYLOAD_MARKER}" + ($result | ConvertTo-Json -Compress -Depth 4))
+}} -ArgumentList $eapServices, $eapJbossCliCommand
 '''
 
-    # Print the PowerShell command being sent (with sensitive info masked)
-    masked_script = ps_script.replace(password, "********") if password else ps_script
-    print("\n=== PowerShell Command Being Sent ===")
-    print(masked_script)
-    print("===================================\n")
-
-    # Execute the PowerShell script
-    result = subprocess.run(
-        ["powershell", "-NoProfile", "-Command", ps_script],
-        capture_output=True,
-        text=True
+    # Full script dumps only for servers with debug switched on
+    if is_debug_enabled(server):
+        logger.debug("PowerShell status script", extra={'server': server, 'script': ps_script})
+
+    return RemoteCall(
+        username, password, server, ps_script, STATUS,
+        arguments={"services": list(services), "jboss_cli_command": jboss_cli_command}
     )
 
-    # Print the response
-    print("\n=== PowerShell Response ===")
-    print(result.stdout)
-    if result.stderr:
-        print("\n=== PowerShell Errors ===")
-        print(result.stderr)
-    print("===========================\n")
 
-    # Check for connection errors in both stdout and stderr
-    output = result.stdout + result.stderr
-    if "New-PSSession : " in output and "Connecting to remote server" in output and "failed" in output:
-        raise ConnectionError("Failed to connect to remote server. Please check credentials.")
+def _parse_status_result(call, result):
+    """
+    Parse the output of a finished status call
+    Args:
+        call (RemoteCall): The status call
+        result (HostResult): Its output
+    Returns:
+        dict: Parsed status payload, see parse_status_payload
+    Raises:
+        ValueError: If the output has no status payload
+    """
+    if is_debug_enabled(call.server):
+        logger.debug("PowerShell status response", extra={'server': call.server, 'ok': result.ok,
+                                                          'output': truncate_output(result.output)})
+
+    started = time.perf_counter()
+    payload = parse_status_payload(result.output)
+    observe_phase(call.server, 'parse', time.perf_counter() - started)
+    return payload
+
+
+def check_services_powershell(username, password, server, services, jboss_cli_command=None):
+    """
+    Check the status of all services of a server in one remote invocation, with enhanced JBoss checking.
+    The check runs through the process-wide remote executor (a warm pooled PSSession by default),
+    runs the JBoss CLI command once, and writes a single JSON payload that is parsed in one pass.
+    It is bounded by the deadline of the current scope (see deadline.py).
+    Args:
+        username (str): Username for authentication
+        password (str): Password for authentication
+        server (str): Server to check the services on
+        services (list): Names of the services to check
+        jboss_cli_command (str, optional): JBoss CLI command to execute. If given, its status is reported
+            for every service; if None, falls back to standard Windows service checks.
+    Returns:
+        dict: Parsed status payload, see parse_status_payload
+    Raises:
+        ValueError: If username or password is None or empty, or the output has no status payload
+        ConnectionError: If connection to remote server fails
+        StatusCheckTimeout: If the deadline passed; carries the per-service results finished before it
+    """
+    call = _build_status_call(username, password, server, services, jboss_cli_command)
+
+    # Execute the PowerShell script through the remote executor (raises ConnectionError if it cannot connect),
+    # once the admission controller grants a slot (raises Overloaded if the check is shed)
+    with get_admission().slot(server, call_priority(STATUS)), track_remote_call(server, STATUS):
+        try:
+            result = get_executor().execute(call)
+        except RemoteTimeoutError as e:
+            # The host was killed at the deadline; keep the per-service results it already wrote
+            raise StatusCheckTimeout(str(e), parse_partial_status(e.output, services)) from e
+
+        # Check for connection errors in the merged output
+        if is_connection_error(result.output):
+            raise ConnectionError("Failed to connect to remote server. Please check credentials.")
+
+    return _parse_status_result(call, result)
+
+
+async def check_services_powershell_async(username, password, server, services, jboss_cli_command=None):
+    """
+    Same as check_services_powershell, awaiting the executor on the event loop instead of
+    blocking a thread (see async_runtime.py)
+    """
+    call = _build_status_call(username, password, server, services, jboss_cli_command)
+
+    async with get_admission().slot_async(server, call_priority(STATUS)):
+        with track_remote_call(server, STATUS):
+            try:
+                result = await get_executor().execute_async(call)
+            except RemoteTimeoutError as e:
+                raise StatusCheckTimeout(str(e), parse_partial_status(e.output, services)) from e
+
+            # Check for connection errors in the merged output
+            if is_connection_error(result.output):
+                raise ConnectionError("Failed to connect to remote server. Please check credentials.")
 
-    return result.stdout
+    return _parse_status_result(call, result)
 
 
 # import subprocess
@@ -0,0 +1,189 @@
+"""
+Module for warming status snapshots and remote sessions right after a login.
+
+The first dashboard view after a login used to pay the full cold cost of every server
+the user opened: config parsing, PowerShell process and PSSession creation, and the
+JBoss CLI start-up. On login the Prefetcher takes the servers the user recently started
+or stopped, then the rest in server list order, refreshes every snapshot that is missing
+or stale with the user's credentials, and opens the user's remote session to each server,
+so home() and the first server selection are answered from warm data.
+
+Every prefetched server costs a remote session per user, so only the first
+EAP_PREFETCH_SERVERS servers are prefetched per login (default DEFAULT_PREFETCH_SERVERS).
+EAP_PREFETCH=0 turns prefetching off.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from admission import BACKGROUND, Overloaded, get_admission, priority_scope
+from app_logging import get_logger
+from deadline import DEFAULT_STATUS_TIMEOUT, deadline_scope, remaining
+from metrics import REGISTRY
+from models.server_config import ServerConfig
+from operation_history import get_operation_history
+from remote_executor import get_executor
+
+logger = get_logger('eap_status')
+
+# Servers prefetched at the same time
+DEFAULT_PREFETCH_WORKERS = 4
+
+# Servers prefetched per login when EAP_PREFETCH_SERVERS is not set
+DEFAULT_PREFETCH_SERVERS = 8
+
+# Recent operations looked at to find the servers a user works with
+RECENT_OPERATIONS = 50
+
+PREFETCHES = REGISTRY.counter('eap_prefetch_total', 'Servers prefetched after a login', ('outcome',))
+
+
+def prefetch_enabled() -> bool:
+    """
+    Returns:
+        bool: False if EAP_PREFETCH switches login prefetching off
+    """
+    return os.environ.get('EAP_PREFETCH', '1').lower() not in ('0', 'false', 'no', 'off')
+
+
+class Prefetcher:
+    """Background warm-up of status snapshots and remote sessions for a user that just logged in"""
+
+    def __init__(self, poller, max_workers: int = DEFAULT_PREFETCH_WORKERS,
+                 max_servers: Optional[int] = None):
+        """
+        Initialize the prefetcher
+
+        Args:
+            poller (StatusPoller): Poller whose snapshot cache is filled
+            max_workers (int): Servers prefetched at the same time
+            max_servers (int, optional): Servers prefetched per login, defaults to
+                EAP_PREFETCH_SERVERS or DEFAULT_PREFETCH_SERVERS
+        """
+        self.poller = poller
+        self.max_workers = max_workers
+        self.max_servers = max_servers if max_servers is not None else int(
+            os.environ.get('EAP_PREFETCH_SERVERS', DEFAULT_PREFETCH_SERVERS))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cancelled: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, username: str, password: str, server_ids: Optional[List[str]] = None) -> bool:
+        """
+        Start prefetching for a user without waiting for it
+
+        Args:
+            username (str): User that logged in
+            password (str): The user's password
+            server_ids (List[str], optional): Servers to prefetch, in order; defaults to the
+                servers the user recently operated, then the rest in server list order
+
+        Returns:
+            bool: False if a prefetch for this user is already running
+        """
+        with self._lock:
+            if username in self._cancelled:
+                return False
+            cancelled = self._cancelled[username] = threading.Event()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='prefetch')
+            executor = self._executor
+
+        if server_ids is None:
+            # Also builds the parsed configuration and inventory home() renders from
+            server_ids = self._recent_first(username, ServerConfig.get_instance().inventory().server_ids())
+        server_ids = server_ids[:self.max_servers]
+
+        started = time.perf_counter()
+        pending = [len(server_ids)]
+
+        def run(server_id: str) -> None:
+            try:
+                if not cancelled.is_set():
+                    self._prefetch_server(server_id, username, password)
+            finally:
+                with self._lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                    if finished and self._cancelled.get(username) is cancelled:
+                        del self._cancelled[username]
+                if finished:
+                    logger.info(
+                        f"Prefetched {len(server_ids)} servers for {username}",
+                        extra={'details': {'duration': round(time.perf_counter() - started, 3),
+                                           'cancelled': cancelled.is_set()}}
+                    )
+
+        if not server_ids:
+            with self._lock:
+                del self._cancelled[username]
+            return True
+        for server_id in server_ids:
+            executor.submit(run, server_id)
+        return True
+
+    @staticmethod
+    def _recent_first(username: str, server_ids: List[str]) -> List[str]:
+        """
+        Order servers so the ones a user recently started or stopped come first
+
+        Args:
+            username (str): User that logged in
+            server_ids (List[str]): Configured servers in server list order
+
+        Returns:
+            List[str]: The same servers, most recently operated first
+        """
+        try:
+            operations = get_operation_history().query(filters={'user': username},
+                                                       limit=RECENT_OPERATIONS)['operations']
+        except Exception as e:
+            logger.debug(f"Could not read recent operations of {username}",
+                         extra={'details': {'error_type': type(e).__name__, 'error_message': str(e)}})
+            return server_ids
+        configured = set(server_ids)
+        recent = dict.fromkeys(op['server'] for op in operations if op['server'] in configured)
+        return list(recent) + [server_id for server_id in server_ids if server_id not in recent]
+
+    def _prefetch_server(self, server_id: str, username: str, password: str) -> None:
+        """
+        Fill one server's snapshot and open the user's session to it; failures are only counted,
+        the regular status path reports them when the server is opened
+        """
+        with deadline_scope(DEFAULT_STATUS_TIMEOUT):
+            try:
+                cached = self.poller.get_cached(server_id)
+                outcome = 'cached'
+                if cached is None or cached.age > self.poller.current_interval(server_id):
+                    with priority_scope(BACKGROUND):
+                        self.poller.refresh(server_id, username, password)
+                    outcome = 'refreshed'
+                # A check already opened the session unless it was shared with another user's check
+                with get_admission().slot(server_id, BACKGROUND):
+                    if get_executor().warm(username, password, server_id, remaining()) and outcome == 'cached':
+                        outcome = 'warmed'
+                PREFETCHES.inc(outcome=outcome)
+            except Overloaded:
+                # Remote execution is busy; the servers are checked when they are opened
+                PREFETCHES.inc(outcome='shed')
+            except Exception as e:
+                PREFETCHES.inc(outcome='failed')
+                logger.debug(
+                    f"Prefetch of {server_id} failed",
+                    extra={'server': server_id, 'details': {'error_type': type(e).__name__,
+                                                            'error_message': str(e)}}
+                )
+
+    def cancel(self, username: str) -> None:
+        """
+        Skip the servers a user's prefetch has not started yet, e.g. on logout
+
+        Args:
+            username (str): User whose prefetch is cancelled
+        """
+        with self._lock:
+            cancelled = self._cancelled.pop(username, None)
+        if cancelled is not None:
+            cancelled.set()
@@ -0,0 +1,994 @@
+"""
+Module for pooling long-lived PowerShell remoting sessions.
+
+Each pooled host is a powershell.exe process that created one PSSession to a server
+and keeps it open. Scripts are sent to the host over stdin and run with `$session`
+already connected, so status checks and start/stop calls skip process start-up,
+ConvertTo-SecureString and New-PSSession after the first call.
+
+In the asyncio mode (EAP_ASYNC=1) the hosts are AsyncPowerShellHost processes started with
+asyncio.create_subprocess_exec and read line by line on the event loop, so a status check
+waiting on a server holds no thread (see get_async_session_pool).
+
+StandInHost replaces powershell.exe in tests, so pooling and eviction can be exercised on
+machines without Windows. To run the whole app without Windows, select the simulated
+backend with EAP_EXECUTOR=simulated (see remote_executor.py) instead.
+"""
+import asyncio
+import base64
+import hashlib
+import locale
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import observe_phase
+
+# Defaults for the process-wide pool
+DEFAULT_MAX_SIZE = 8
+DEFAULT_IDLE_TIMEOUT = 300  # seconds a host may sit unused before it is closed
+DEFAULT_HEALTH_CHECK_INTERVAL = 60  # seconds of idleness after which a host is re-checked
+DEFAULT_ACQUIRE_TIMEOUT = 120  # seconds to wait for a free host when the pool is full
+
+# Characters PowerShell accepts as single quotes, including the typographic ones
+_PS_SINGLE_QUOTES = "'\u2018\u2019\u201a\u201b"
+
+
+def ps_quote(value) -> str:
+    """
+    Quote a value as a PowerShell single-quoted string literal, in which nothing is expanded
+
+    Args:
+        value (str): Value to quote, e.g. a password
+
+    Returns:
+        str: Value wrapped in single quotes with embedded quotes doubled
+    """
+    return "'" + "".join(c + c if c in _PS_SINGLE_QUOTES else c for c in str(value)) + "'"
+
+
+def is_connection_error(output: str) -> bool:
+    """
+    Check PowerShell output for a failed New-PSSession
+
+    Args:
+        output (str): Combined stdout/stderr from PowerShell
+
+    Returns:
+        bool: True if the output reports a remote connection failure
+    """
+    return "New-PSSession" in output and "Connecting to remote server" in output and "failed" in output
+
+
+def kill_process_tree(process: subprocess.Popen) -> None:
+    """
+    Kill a process and every process it started, then reap it
+
+    Args:
+        process (subprocess.Popen): Process started in its own process group (POSIX) or
+            process group/console (Windows)
+    """
+    if process.poll() is None:
+        try:
+            if os.name == 'nt':
+                # /T takes the whole tree, e.g. jboss-cli.ps1 and its java.exe
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        if process.poll() is None:
+            process.kill()
+    process.wait()
+
+
+class RemoteTimeoutError(TimeoutError):
+    """A remote script did not finish in time; carries the output written before the deadline"""
+
+    def __init__(self, message: str, output: str = ""):
+        """
+        Initialize the error
+
+        Args:
+            message (str): Error message
+            output (str): Partial output captured before the timeout
+        """
+        super().__init__(message)
+        self.output = output
+
+
+class HostResult:
+    """Output of one script run on a pooled host"""
+
+    def __init__(self, output: str, ok: bool):
+        """
+        Initialize a host result
+
+        Args:
+            output (str): Everything the script wrote, stdout and errors merged
+            ok (bool): False if the script raised or wrote any error record
+        """
+        self.output = output
+        self.ok = ok
+
+
+# Command line of a host process; scripts arrive on stdin one line at a time
+HOST_COMMAND = ("powershell", "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-Command", "-")
+
+
+# Last line sent to a host being closed
+_CLOSE_LINE = "if ($session) { Remove-PSSession $session }; exit\n"
+
+# Longest output line an asyncio host reads, e.g. a status payload of many services
+_ASYNC_LINE_LIMIT = 16 * 1024 * 1024
+
+
+def _own_process_group() -> Dict:
+    """
+    Returns:
+        Dict: Process creation arguments that start the host in its own process group, so
+        a timeout can kill everything the host started
+    """
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def _session_script(username: str, password: str, server: str) -> str:
+    """
+    Returns:
+        str: Statements creating `$session`, the PSSession every later script runs against
+    """
+    return f'''
+$password = ConvertTo-SecureString {ps_quote(password)} -AsPlainText -Force
+$cred = New-Object System.Management.Automation.PSCredential ({ps_quote(username)}, $password)
+$session = New-PSSession -ComputerName {ps_quote(server)} -Credential $cred
+'''
+
+
+def _framed_script(script: str) -> Tuple[str, str]:
+    """
+    Frame a script for a host's stdin
+
+    The script is sent as one base64 line so multi-line scripts survive `-Command -`, and is
+    followed by a done marker line carrying the success flag.
+
+    Args:
+        script (str): PowerShell statements to run
+
+    Returns:
+        Tuple[str, str]: Done marker, and the line to write to the host's stdin
+    """
+    marker = f"__EAP_DONE_{uuid.uuid4().hex}__"
+    encoded = base64.b64encode(script.encode('utf-8')).decode('ascii')
+    line = (
+        "$Error.Clear(); "
+        f"try {{ Invoke-Expression ([Text.Encoding]::UTF8.GetString([Convert]::FromBase64String('{encoded}'))) 2>&1 | Out-String -Stream }} "
+        "catch { Write-Output \"ERROR: $($_.Exception.Message)\" }; "
+        f"Write-Output \"{marker}:$($Error.Count -eq 0)\"\n"
+    )
+    return marker, line
+
+
+class PowerShellHost:
+    """A powershell.exe process holding one open PSSession to a server"""
+
+    command = HOST_COMMAND
+
+    def __init__(self, username: str, password: str, server: str):
+        """
+        Initialize the host; the process is started by open()
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server to open the PSSession to
+        """
+        self.username = username
+        self.password = password
+        self.server = server
+        self._process: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._reader: Optional[threading.Thread] = None
+
+    def open(self, timeout: Optional[float] = None) -> None:
+        """
+        Start powershell.exe and create the PSSession
+
+        Args:
+            timeout (float, optional): Seconds New-PSSession may take
+
+        Raises:
+            ConnectionError: If the PSSession cannot be created
+            TimeoutError: If New-PSSession did not finish in time; the process tree is killed
+        """
+        started = time.perf_counter()
+        self._process = subprocess.Popen(
+            list(self.command),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            **_own_process_group()
+        )
+        self._reader = threading.Thread(target=self._read_output, name=f'ps-host-{self.server}', daemon=True)
+        self._reader.start()
+        observe_phase(self.server, 'spawn', time.perf_counter() - started)
+
+        started = time.perf_counter()
+        result = self.run(_session_script(self.username, self.password, self.server), timeout=timeout)
+        observe_phase(self.server, 'session', time.perf_counter() - started)
+        if not result.ok or is_connection_error(result.output):
+            self.close()
+            raise ConnectionError("Failed to connect to remote server. Please check credentials.")
+
+    def _read_output(self) -> None:
+        """Copy process output lines into the line queue until the process exits"""
+        for line in self._process.stdout:
+            self._lines.put(line.rstrip('\r\n'))
+        self._lines.put(None)
+
+    def run(self, script: str, timeout: Optional[float] = None,
+            on_line: Optional[Callable[[str], None]] = None) -> HostResult:
+        """
+        Run a script in the host; `$session` refers to the open PSSession
+
+        Args:
+            script (str): PowerShell statements to run
+            timeout (float, optional): Seconds to wait for the script to finish
+            on_line (Callable, optional): Called with every output line as soon as it arrives
+
+        Returns:
+            HostResult: Script output and success flag
+
+        Raises:
+            RuntimeError: If the host process exited
+            RemoteTimeoutError: If the script did not finish in time; the host's process tree
+                is killed and the output written so far is attached to the error
+        """
+        if self._process is None or self._process.poll() is not None:
+            raise RuntimeError(f"PowerShell host for {self.server} is not running")
+
+        marker, line = _framed_script(script)
+        self._process.stdin.write(line)
+        self._process.stdin.flush()
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        output: List[str] = []
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self.kill()
+                raise RemoteTimeoutError(f"PowerShell host for {self.server} timed out", "\n".join(output))
+            try:
+                out_line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if out_line is None:
+                raise RuntimeError(f"PowerShell host for {self.server} exited unexpectedly")
+            if out_line.startswith(marker):
+                return HostResult("\n".join(output), out_line.endswith("True"))
+            output.append(out_line)
+            if on_line is not None:
+                on_line(out_line)
+
+    def is_healthy(self) -> bool:
+        """
+        Check that the process is alive and the PSSession is still open
+
+        Returns:
+            bool: True if the host can take more scripts
+        """
+        if self._process is None or self._process.poll() is not None:
+            return False
+        try:
+            result = self.run("if ($session -and $session.State -eq 'Opened') { 'healthy' }", timeout=15)
+        except (RuntimeError, TimeoutError):
+            return False
+        return 'healthy' in result.output
+
+    def kill(self) -> None:
+        """Kill the process tree without waiting for PowerShell, e.g. after a timeout"""
+        process, self._process = self._process, None
+        if process is not None:
+            kill_process_tree(process)
+
+    def close(self) -> None:
+        """Remove the PSSession and stop the process"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            try:
+                process.stdin.write(_CLOSE_LINE)
+                process.stdin.flush()
+                process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                kill_process_tree(process)
+
+
+class AsyncPowerShellHost:
+    """
+    A powershell.exe process holding one open PSSession to a server, driven from an asyncio
+    event loop with asyncio subprocess pipes, so a running script occupies no thread.
+
+    open, run and is_healthy are coroutines and must be awaited on the loop that opened the
+    host; close and kill can be called from any thread.
+    """
+
+    command = HOST_COMMAND
+
+    def __init__(self, username: str, password: str, server: str):
+        """
+        Initialize the host; the process is started by open()
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server to open the PSSession to
+        """
+        self.username = username
+        self.password = password
+        self.server = server
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._encoding = locale.getpreferredencoding(False)
+
+    async def open(self, timeout: Optional[float] = None) -> None:
+        """
+        Start powershell.exe and create the PSSession
+
+        Args:
+            timeout (float, optional): Seconds New-PSSession may take
+
+        Raises:
+            ConnectionError: If the PSSession cannot be created
+            TimeoutError: If New-PSSession did not finish in time; the process tree is killed
+        """
+        started = time.perf_counter()
+        self._loop = asyncio.get_running_loop()
+        self._process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            limit=_ASYNC_LINE_LIMIT,
+            **_own_process_group()
+        )
+        observe_phase(self.server, 'spawn', time.perf_counter() - started)
+
+        started = time.perf_counter()
+        result = await self.run(_session_script(self.username, self.password, self.server), timeout=timeout)
+        observe_phase(self.server, 'session', time.perf_counter() - started)
+        if not result.ok or is_connection_error(result.output):
+            self.close()
+            raise ConnectionError("Failed to connect to remote server. Please check credentials.")
+
+    async def run(self, script: str, timeout: Optional[float] = None,
+                  on_line: Optional[Callable[[str], None]] = None) -> HostResult:
+        """
+        Run a script in the host; `$session` refers to the open PSSession
+
+        Args:
+            script (str): PowerShell statements to run
+            timeout (float, optional): Seconds to wait for the script to finish
+            on_line (Callable, optional): Called with every output line as soon as it arrives
+
+        Returns:
+            HostResult: Script output and success flag
+
+        Raises:
+            RuntimeError: If the host process exited
+            RemoteTimeoutError: If the script did not finish in time; the host's process tree
+                is killed and the output written so far is attached to the error
+        """
+        process = self._process
+        if process is None or process.returncode is not None:
+            raise RuntimeError(f"PowerShell host for {self.server} is not running")
+
+        marker, line = _framed_script(script)
+        process.stdin.write(line.encode(self._encoding))
+        try:
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            raise RuntimeError(f"PowerShell host for {self.server} exited unexpectedly")
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        output: List[str] = []
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                raw = await asyncio.wait_for(process.stdout.readline(), remaining)
+            except asyncio.TimeoutError:
+                self.kill()
+                raise RemoteTimeoutError(f"PowerShell host for {self.server} timed out", "\n".join(output))
+            if not raw:
+                raise RuntimeError(f"PowerShell host for {self.server} exited unexpectedly")
+            out_line = raw.decode(self._encoding, errors='replace').rstrip('\r\n')
+            if out_line.startswith(marker):
+                return HostResult("\n".join(output), out_line.endswith("True"))
+            output.append(out_line)
+            if on_line is not None:
+                on_line(out_line)
+
+    async def is_healthy(self) -> bool:
+        """
+        Check that the process is alive and the PSSession is still open
+
+        Returns:
+            bool: True if the host can take more scripts
+        """
+        if self._process is None or self._process.returncode is not None:
+            return False
+        try:
+            result = await self.run("if ($session -and $session.State -eq 'Opened') { 'healthy' }", timeout=15)
+        except (RuntimeError, TimeoutError):
+            return False
+        return 'healthy' in result.output
+
+    def kill(self) -> None:
+        """Kill the process tree without waiting for PowerShell, e.g. after a timeout"""
+        process, self._process = self._process, None
+        if process is not None:
+            self._on_loop(process, self._kill_tree(process))
+
+    def close(self) -> None:
+        """Remove the PSSession and stop the process, without waiting for either"""
+        process, self._process = self._process, None
+        if process is not None:
+            self._on_loop(process, self._shutdown(process))
+
+    def _on_loop(self, process: asyncio.subprocess.Process, coro) -> None:
+        """Run a coroutine on the host's loop from any thread, without waiting for it"""
+        try:
+            asyncio.run_coroutine_threadsafe(coro, self._loop)
+        except RuntimeError:
+            # The loop is closed, so nothing can talk to the process any more: kill its group
+            coro.close()
+            if process.returncode is None and os.name != 'nt':
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+    async def _shutdown(self, process: asyncio.subprocess.Process) -> None:
+        if process.returncode is None:
+            try:
+                process.stdin.write(_CLOSE_LINE.encode(self._encoding))
+                await process.stdin.drain()
+                await asyncio.wait_for(process.wait(), 10)
+                return
+            except (OSError, asyncio.TimeoutError):
+                pass
+        await self._kill_tree(process)
+
+    @staticmethod
+    async def _kill_tree(process: asyncio.subprocess.Process) -> None:
+        """Kill a host and every process it started, then reap it"""
+        if process.returncode is None:
+            try:
+                if os.name == 'nt':
+                    # /T takes the whole tree, e.g. jboss-cli.ps1 and its java.exe
+                    taskkill = await asyncio.create_subprocess_exec(
+                        "taskkill", "/F", "/T", "/PID", str(process.pid),
+                        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+                    await asyncio.wait_for(taskkill.wait(), 30)
+                else:
+                    os.killpg(process.pid, signal.SIGKILL)
+            except (OSError, asyncio.TimeoutError):
+                pass
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+        await process.wait()
+
+
+class StandInHost:
+    """In-process stand-in for PowerShellHost that never starts powershell.exe, used by tests"""
+
+    def __init__(self, username: str, password: str, server: str,
+                 responder: Optional[Callable[[str, str], HostResult]] = None):
+        """
+        Initialize the stand-in host
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server the host pretends to be connected to
+            responder (Callable, optional): Function (server, script) -> HostResult producing
+                the script output; by default every script succeeds with no output, so tests
+                that parse the output pass their own
+        """
+        self.username = username
+        self.password = password
+        self.server = server
+        self._responder = responder or (lambda server, script: HostResult("", True))
+        self._open = False
+
+    def open(self, timeout: Optional[float] = None) -> None:
+        """Pretend to create the PSSession"""
+        self._open = True
+
+    def run(self, script: str, timeout: Optional[float] = None,
+            on_line: Optional[Callable[[str], None]] = None) -> HostResult:
+        """
+        Run a script through the responder
+
+        Args:
+            script (str): PowerShell statements that would have been run
+            timeout (float, optional): Unused, kept for interface compatibility
+            on_line (Callable, optional): Called with every line of the responder output
+
+        Returns:
+            HostResult: Responder output
+        """
+        if not self._open:
+            raise RuntimeError(f"Stand-in host for {self.server} is not open")
+        result = self._responder(self.server, script)
+        if on_line is not None:
+            for line in result.output.splitlines():
+                on_line(line)
+        return result
+
+    def is_healthy(self) -> bool:
+        """
+        Returns:
+            bool: True while the host is open
+        """
+        return self._open
+
+    def close(self) -> None:
+        """Pretend to remove the PSSession"""
+        self._open = False
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    """Wake a coroutine waiting for a host, unless it stopped waiting"""
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _PooledHost:
+    """Bookkeeping wrapper around a host owned by the pool"""
+
+    def __init__(self, key: Tuple[str, str], password_hash: str, host):
+        self.key = key
+        self.password_hash = password_hash
+        self.host = host
+        self.last_used = time.monotonic()
+        self.last_checked = self.last_used
+
+
+class SessionPool:
+    """Pool of warm PowerShell hosts keyed by (username, server)"""
+
+    def __init__(self, host_factory: Callable = PowerShellHost, max_size: int = DEFAULT_MAX_SIZE,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+                 acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT):
+        """
+        Initialize the pool
+
+        Args:
+            host_factory (Callable): Factory (username, password, server) -> host
+            max_size (int): Maximum number of hosts, idle and busy, across all keys
+            idle_timeout (float): Seconds an idle host is kept before eviction
+            health_check_interval (float): Idle seconds after which a host is health-checked before reuse
+            acquire_timeout (float): Seconds to wait for a free slot when the pool is full
+        """
+        self._host_factory = host_factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle: Dict[Tuple[str, str], List[_PooledHost]] = {}
+        self._busy: Dict[Tuple[str, str], int] = {}
+        self._size = 0
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.spawned = 0
+        self._reaper: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _hash_password(password: str) -> str:
+        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+    def _idle_count(self) -> int:
+        return sum(len(hosts) for hosts in self._idle.values())
+
+    def _pop_oldest_idle(self) -> Optional[_PooledHost]:
+        """Remove and return the least recently used idle host (caller holds the lock)"""
+        oldest = None
+        for hosts in self._idle.values():
+            for pooled in hosts:
+                if oldest is None or pooled.last_used < oldest.last_used:
+                    oldest = pooled
+        if oldest is not None:
+            self._idle[oldest.key].remove(oldest)
+        return oldest
+
+    def _try_reserve(self, key: Tuple[str, str]) -> Tuple[bool, Optional[_PooledHost], Optional[_PooledHost]]:
+        """
+        Take an idle host for the key, or a slot for a new one (caller holds the lock)
+
+        Returns:
+            Tuple: (False if the caller has to wait, idle host of the key to reuse, idle host
+            of another key whose slot was taken over and must be closed)
+        """
+        hosts = self._idle.get(key, [])
+        reuse = victim = None
+        if hosts:
+            reuse = hosts.pop()
+        elif self._size < self.max_size:
+            self._size += 1
+        else:
+            # When the pool is full, wait for our own busy hosts before recycling
+            # the least recently used idle slot of another key
+            victim = self._pop_oldest_idle() if not self._busy.get(key) else None
+            if victim is None:
+                return False, None, None
+        self._busy[key] = self._busy.get(key, 0) + 1
+        return True, reuse, victim
+
+    def _notify(self) -> None:
+        """Wake every thread and coroutine waiting for a host (caller holds the lock)"""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+        self._async_waiters.clear()
+
+    def _acquire_deadline(self, timeout: Optional[float]) -> float:
+        return time.monotonic() + (self.acquire_timeout if timeout is None else min(self.acquire_timeout, timeout))
+
+    def _acquire(self, username: str, password: str, server: str,
+                 timeout: Optional[float] = None) -> _PooledHost:
+        """
+        Take an idle host for the key or create a new one
+
+        Args:
+            timeout (float, optional): Seconds the caller allows for waiting and session creation
+
+        Raises:
+            TimeoutError: If no slot frees up within acquire_timeout (or timeout), or a new
+                PSSession is not created in time
+            ConnectionError: If a new PSSession cannot be created
+        """
+        self._start_reaper()
+        key = (username, server)
+        password_hash = self._hash_password(password)
+        deadline = self._acquire_deadline(timeout)
+        while True:
+            started = time.perf_counter()
+            with self._cond:
+                while True:
+                    reserved, reuse, victim = self._try_reserve(key)
+                    if reserved:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("PowerShell session pool is exhausted")
+                    self._cond.wait(remaining)
+            observe_phase(server, 'acquire', time.perf_counter() - started)
+
+            if victim is not None:
+                victim.host.close()
+
+            if reuse is not None:
+                stale = time.monotonic() - reuse.last_checked > self.health_check_interval
+                if reuse.password_hash != password_hash or (stale and not reuse.host.is_healthy()):
+                    # Credentials changed or the session went bad: drop it and try again
+                    reuse.host.close()
+                    self._discard(key)
+                    continue
+                reuse.last_checked = time.monotonic()
+                return reuse
+
+            # A slot is reserved (either new or recycled from a victim): create the host
+            try:
+                host = self._host_factory(username, password, server)
+                with self._cond:
+                    self.spawned += 1
+                host.open(timeout=None if timeout is None else max(0.0, deadline - time.monotonic()))
+            except Exception:
+                self._discard(key)
+                raise
+            return _PooledHost(key, password_hash, host)
+
+    async def _acquire_async(self, username: str, password: str, server: str,
+                             timeout: Optional[float] = None) -> _PooledHost:
+        """
+        Coroutine version of _acquire for pools of AsyncPowerShellHost; waiting for a free
+        slot and opening the session do not block the event loop
+        """
+        self._start_reaper()
+        key = (username, server)
+        password_hash = self._hash_password(password)
+        deadline = self._acquire_deadline(timeout)
+        loop = asyncio.get_running_loop()
+        while True:
+            started = time.perf_counter()
+            while True:
+                with self._cond:
+                    reserved, reuse, victim = self._try_reserve(key)
+                    if not reserved:
+                        waiter = loop.create_future()
+                        self._async_waiters.append((loop, waiter))
+                if reserved:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("PowerShell session pool is exhausted")
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    pass
+            observe_phase(server, 'acquire', time.perf_counter() - started)
+
+            if victim is not None:
+                victim.host.close()
+
+            if reuse is not None:
+                stale = time.monotonic() - reuse.last_checked > self.health_check_interval
+                if reuse.password_hash != password_hash or (stale and not await reuse.host.is_healthy()):
+                    reuse.host.close()
+                    self._discard(key)
+                    continue
+                reuse.last_checked = time.monotonic()
+                return reuse
+
+            try:
+                host = self._host_factory(username, password, server)
+                with self._cond:
+                    self.spawned += 1
+                await host.open(timeout=None if timeout is None else max(0.0, deadline - time.monotonic()))
+            except BaseException:
+                # Also on cancellation, or the slot would stay reserved for good
+                self._discard(key)
+                raise
+            return _PooledHost(key, password_hash, host)
+
+    def _release(self, pooled: _PooledHost, broken: bool = False) -> None:
+        """Return a host to the idle list, or close it if it is broken"""
+        if broken:
+            pooled.host.close()
+            self._discard(pooled.key)
+            return
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._busy[pooled.key] -= 1
+            self._idle.setdefault(pooled.key, []).append(pooled)
+            self._notify()
+
+    def _discard(self, key: Tuple[str, str]) -> None:
+        """Free the slot of a busy host that was closed"""
+        with self._cond:
+            self._size -= 1
+            self._busy[key] -= 1
+            self._notify()
+
+    @contextmanager
+    def session(self, username: str, password: str, server: str, timeout: Optional[float] = None):
+        """
+        Borrow a warm host for (username, server)
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server to connect to
+            timeout (float, optional): Seconds allowed for waiting on a slot and opening a session
+
+        Yields:
+            host: An open PowerShellHost (or stand-in) with `$session` connected
+        """
+        pooled = self._acquire(username, password, server, timeout)
+        broken = False
+        try:
+            yield pooled.host
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self._release(pooled, broken=broken)
+
+    def run(self, username: str, password: str, server: str, script: str,
+            timeout: Optional[float] = None, on_line: Optional[Callable[[str], None]] = None) -> HostResult:
+        """
+        Run a script on a pooled host for (username, server)
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server to run against
+            script (str): PowerShell statements; `$session` is the open PSSession
+            timeout (float, optional): Seconds allowed for the whole call, including waiting for a host
+            on_line (Callable, optional): Called with every output line of the script as it arrives
+
+        Returns:
+            HostResult: Script output and success flag
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.session(username, password, server, timeout) as host:
+            started = time.perf_counter()
+            result = host.run(script, timeout=None if deadline is None else max(0.0, deadline - time.monotonic()),
+                              on_line=on_line)
+            observe_phase(server, 'exec', time.perf_counter() - started)
+            if not result.ok and not host.is_healthy():
+                raise ConnectionError("Remote PowerShell session was lost. Please try again.")
+            return result
+
+    @asynccontextmanager
+    async def session_async(self, username: str, password: str, server: str, timeout: Optional[float] = None):
+        """
+        Borrow a warm AsyncPowerShellHost for (username, server) from the event loop
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server to connect to
+            timeout (float, optional): Seconds allowed for waiting on a slot and opening a session
+
+        Yields:
+            host: An open AsyncPowerShellHost with `$session` connected
+        """
+        pooled = await self._acquire_async(username, password, server, timeout)
+        broken = False
+        try:
+            yield pooled.host
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            self._release(pooled, broken=broken)
+
+    async def run_async(self, username: str, password: str, server: str, script: str,
+                        timeout: Optional[float] = None,
+                        on_line: Optional[Callable[[str], None]] = None) -> HostResult:
+        """
+        Run a script on a pooled AsyncPowerShellHost for (username, server), see run
+
+        Returns:
+            HostResult: Script output and success flag
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        async with self.session_async(username, password, server, timeout) as host:
+            started = time.perf_counter()
+            result = await host.run(script, timeout=None if deadline is None else max(0.0, deadline - time.monotonic()),
+                                    on_line=on_line)
+            observe_phase(server, 'exec', time.perf_counter() - started)
+            if not result.ok and not await host.is_healthy():
+                raise ConnectionError("Remote PowerShell session was lost. Please try again.")
+            return result
+
+    def evict_idle(self) -> int:
+        """
+        Close hosts that have been idle longer than idle_timeout
+
+        Returns:
+            int: Number of hosts closed
+        """
+        cutoff = time.monotonic() - self.idle_timeout
+        expired: List[_PooledHost] = []
+        with self._cond:
+            for key, hosts in self._idle.items():
+                keep = [pooled for pooled in hosts if pooled.last_used >= cutoff]
+                expired.extend(pooled for pooled in hosts if pooled.last_used < cutoff)
+                self._idle[key] = keep
+            self._size -= len(expired)
+            self._notify()
+        for pooled in expired:
+            pooled.host.close()
+        return len(expired)
+
+    def close_user(self, username: str) -> int:
+        """
+        Close the idle hosts of a user, e.g. on logout
+
+        Args:
+            username (str): Username whose sessions are closed
+
+        Returns:
+            int: Number of hosts closed
+        """
+        with self._cond:
+            closed = [pooled for key, hosts in self._idle.items() if key[0] == username for pooled in hosts]
+            for key in [key for key in self._idle if key[0] == username]:
+                del self._idle[key]
+            self._size -= len(closed)
+            self._notify()
+        for pooled in closed:
+            pooled.host.close()
+        return len(closed)
+
+    def close_all(self) -> None:
+        """Close every idle host; busy hosts are closed when they are released broken or evicted"""
+        with self._cond:
+            hosts = [pooled for hosts in self._idle.values() for pooled in hosts]
+            self._idle.clear()
+            self._size -= len(hosts)
+            self._notify()
+        for pooled in hosts:
+            pooled.host.close()
+
+    def stats(self) -> Dict:
+        """
+        Get pool statistics
+
+        Returns:
+            Dict: Current size, idle count and number of hosts spawned so far
+        """
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": self._idle_count(),
+                "max_size": self.max_size,
+                "spawned": self.spawned
+            }
+
+    def _start_reaper(self) -> None:
+        """Start the idle eviction thread on first use"""
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, name='ps-session-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap(self) -> None:
+        while True:
+            time.sleep(max(1.0, min(30.0, self.idle_timeout / 2)))
+            self.evict_idle()
+
+
+_pool: Optional[SessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """
+    Get the process-wide session pool, creating it on first use
+
+    Returns:
+        SessionPool: Pool backed by powershell.exe
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool(
+                host_factory=PowerShellHost,
+                max_size=int(os.environ.get('EAP_SESSION_POOL_SIZE', DEFAULT_MAX_SIZE)),
+                idle_timeout=float(os.environ.get('EAP_SESSION_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT))
+            )
+        return _pool
+
+
+_async_pool: Optional[SessionPool] = None
+
+
+def get_async_session_pool() -> SessionPool:
+    """
+    Get the process-wide pool of AsyncPowerShellHost for the asyncio mode (see async_runtime.py),
+    creating it on first use; its hosts belong to the async runtime's event loop
+
+    Returns:
+        SessionPool: Pool sized like the one of get_session_pool
+    """
+    global _async_pool
+    with _pool_lock:
+        if _async_pool is None:
+            _async_pool = SessionPool(
+                host_factory=AsyncPowerShellHost,
+                max_size=int(os.environ.get('EAP_SESSION_POOL_SIZE', DEFAULT_MAX_SIZE)),
+                idle_timeout=float(os.environ.get('EAP_SESSION_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT))
+            )
+        return _async_pool
@@ -0,0 +1,562 @@
+"""
+Module for executing remote PowerShell work through a pluggable backend.
+
+check_services_powershell and manage_jboss build their scripts and hand them to the
+process-wide executor as a RemoteCall. The PowerShell backend runs them on the session
+pool; the simulated backend never starts a process and fakes per-server latency,
+failures and JBoss status, so throughput and tail latency can be measured on any machine.
+
+Select the backend with EAP_EXECUTOR=powershell (default), EAP_EXECUTOR=simulated or
+EAP_EXECUTOR=jboss-http (see jboss_http_client.py).
+
+Every backend also has `execute_async` for the asyncio mode (see async_runtime.py). The
+simulated backend waits with asyncio.sleep and the PowerShell backend reads asyncio
+subprocess pipes; backends that can only block run their `execute` on the event loop's
+offload threads.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+from async_runtime import async_enabled, get_runtime
+from deadline import current_deadline
+from metrics import observe_phase
+from ps_session_pool import (HostResult, RemoteTimeoutError, SessionPool, get_async_session_pool,
+                             get_session_pool)
+
+# Prefix of the output line carrying the JSON status payload of a status check
+STATUS_PAYLOAD_MARKER = "__EAP_STATUS_JSON__"
+
+# Prefixes of the per-item lines written while a status check runs, so a check that
+# times out still yields the results finished before the deadline
+JBOSS_RESULT_MARKER = "__EAP_JBOSS_JSON__"
+SERVICE_RESULT_MARKER = "__EAP_SERVICE_JSON__"
+
+# Progress lines written by a simulated start/stop
+ACTION_PROGRESS_STEPS = 5
+
+# Kinds of remote calls
+STATUS = 'status'
+START = 'start'
+STOP = 'stop'
+
+
+class RemoteCall:
+    """One unit of remote work for an executor"""
+
+    def __init__(self, username: str, password: str, server: str, script: str, kind: str,
+                 arguments: Optional[Dict] = None, deadline: Optional[float] = None,
+                 on_output: Optional[Callable[[str], None]] = None):
+        """
+        Initialize a remote call
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server to run on
+            script (str): PowerShell statements; `$session` is the PSSession to the server
+            kind (str): STATUS, START or STOP
+            arguments (Dict, optional): What the script does in structured form, e.g.
+                {"services": [...], "jboss_cli_command": "..."}, for backends that do not
+                run the script itself
+            deadline (float, optional): Absolute time.monotonic() deadline, defaults to the
+                deadline of the current scope (see deadline.py)
+            on_output (Callable, optional): Called with every output line as soon as the
+                backend has it, e.g. to stream a start/stop operation to the browser
+        """
+        self.username = username
+        self.password = password
+        self.server = server
+        self.script = script
+        self.kind = kind
+        self.arguments = arguments or {}
+        self.deadline = deadline if deadline is not None else current_deadline()
+        self.on_output = on_output
+
+    def emit(self, output: str) -> None:
+        """
+        Pass output lines to the on_output callback, if any
+
+        Args:
+            output (str): One or more lines of output
+        """
+        if self.on_output is not None:
+            for line in output.splitlines():
+                self.on_output(line)
+
+    def remaining(self) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: Seconds left until the deadline (never negative), None if unbounded
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class RemoteExecutor(ABC):
+    """Interface of remote execution backends"""
+
+    name = 'base'
+
+    @abstractmethod
+    def execute(self, call: RemoteCall) -> HostResult:
+        """
+        Run a remote call
+
+        Args:
+            call (RemoteCall): Work to run
+
+        Returns:
+            HostResult: Output and success flag
+
+        Raises:
+            ConnectionError: If the server cannot be reached
+            TimeoutError: If the call's deadline passed; RemoteTimeoutError carries partial output
+        """
+
+    async def execute_async(self, call: RemoteCall) -> HostResult:
+        """
+        Run a remote call from the event loop; by default `execute` runs on an offload thread
+
+        Args:
+            call (RemoteCall): Work to run
+
+        Returns:
+            HostResult: Output and success flag
+
+        Raises:
+            ConnectionError: If the server cannot be reached
+            TimeoutError: If the call's deadline passed; RemoteTimeoutError carries partial output
+        """
+        return await asyncio.to_thread(self.execute, call)
+
+    def warm(self, username: str, password: str, server: str, timeout: Optional[float] = None) -> bool:
+        """
+        Prepare the connection a later call of (username, server) would use, e.g. a PSSession
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+            server (str): Server to connect to
+            timeout (float, optional): Seconds allowed
+
+        Returns:
+            bool: True if something was warmed, False if the backend has nothing to prepare
+
+        Raises:
+            ConnectionError: If the server cannot be reached
+            TimeoutError: If the connection was not ready in time
+        """
+        return False
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        """
+        Get executor statistics
+
+        Returns:
+            Dict: At least "calls" and "spawned" (processes or sessions started)
+        """
+
+
+class PowerShellExecutor(RemoteExecutor):
+    """
+    Runs scripts with PowerShell remoting on warm pooled sessions. In the asyncio mode every
+    call, sync callers included, runs on the event loop's AsyncPowerShellHost pool, so a
+    process keeps one set of PSSessions and no thread waits on a remote script.
+    """
+
+    name = 'powershell'
+
+    def __init__(self, pool: Optional[SessionPool] = None, async_pool: Optional[SessionPool] = None,
+                 async_mode: Optional[bool] = None):
+        """
+        Initialize the executor
+
+        Args:
+            pool (SessionPool, optional): Session pool to use, defaults to the process-wide pool
+            async_pool (SessionPool, optional): Pool of AsyncPowerShellHost used from the event
+                loop, defaults to the process-wide async pool
+            async_mode (bool, optional): Route sync calls through the event loop too; defaults
+                to EAP_ASYNC
+        """
+        self._pool = pool
+        self._async_pool = async_pool
+        self.async_mode = async_enabled() if async_mode is None else async_mode
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> SessionPool:
+        """
+        Returns:
+            SessionPool: The session pool scripts run on
+        """
+        if self.async_mode:
+            return self.async_pool
+        return self._pool or get_session_pool()
+
+    @property
+    def async_pool(self) -> SessionPool:
+        """
+        Returns:
+            SessionPool: The AsyncPowerShellHost pool execute_async runs on
+        """
+        return self._async_pool or get_async_session_pool()
+
+    def execute(self, call: RemoteCall) -> HostResult:
+        if self.async_mode:
+            return get_runtime().run(self.execute_async(call))
+        with self._lock:
+            self._calls += 1
+        return self.pool.run(call.username, call.password, call.server, call.script,
+                             timeout=call.remaining(), on_line=call.on_output)
+
+    async def execute_async(self, call: RemoteCall) -> HostResult:
+        with self._lock:
+            self._calls += 1
+        return await self.async_pool.run_async(call.username, call.password, call.server, call.script,
+                                               timeout=call.remaining(), on_line=call.on_output)
+
+    def warm(self, username: str, password: str, server: str, timeout: Optional[float] = None) -> bool:
+        if self.async_mode:
+            return get_runtime().run(self._warm_async(username, password, server, timeout))
+        # Borrowing a host opens its PSSession; returning it leaves the session idle in the pool
+        with self.pool.session(username, password, server, timeout):
+            return True
+
+    async def _warm_async(self, username: str, password: str, server: str, timeout: Optional[float]) -> bool:
+        async with self.async_pool.session_async(username, password, server, timeout):
+            return True
+
+    def stats(self) -> Dict:
+        stats = dict(self.pool.stats())
+        with self._lock:
+            stats["calls"] = self._calls
+        return stats
+
+
+class SimulatedServerProfile:
+    """Simulated behaviour of one server"""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, session_latency: float = 1.5,
+                 failure_rate: float = 0.0, connection_failure_rate: float = 0.0,
+                 jboss_status: str = 'STARTED', action_latency: float = 5.0, settle_time: float = 0.0):
+        """
+        Initialize a server profile
+
+        Args:
+            latency (float): Mean seconds per status call on a warm session
+            jitter (float): Maximum random seconds added to or removed from each latency
+            session_latency (float): Extra seconds for the first call of a (user, server) session
+            failure_rate (float): Probability that a call reports a script error
+            connection_failure_rate (float): Probability that a call fails to connect
+            jboss_status (str): Initial JBoss status reported by status checks
+            action_latency (float): Mean seconds per start/stop call
+            settle_time (float): Seconds JBoss reports STARTING/STOPPING after a start/stop call returns
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.session_latency = session_latency
+        self.failure_rate = failure_rate
+        self.connection_failure_rate = connection_failure_rate
+        self.jboss_status = jboss_status
+        self.action_latency = action_latency
+        self.settle_time = settle_time
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SimulatedServerProfile':
+        """
+        Build a profile from a dictionary of constructor arguments
+
+        Args:
+            data (Dict): Profile settings
+
+        Returns:
+            SimulatedServerProfile: The profile
+        """
+        return cls(**data)
+
+
+class SimulatedExecutor(RemoteExecutor):
+    """Stand-in backend that simulates remote calls without starting any process"""
+
+    name = 'simulated'
+
+    def __init__(self, default_profile: Optional[SimulatedServerProfile] = None,
+                 profiles: Optional[Dict[str, SimulatedServerProfile]] = None, seed: Optional[int] = None):
+        """
+        Initialize the simulated executor
+
+        Args:
+            default_profile (SimulatedServerProfile, optional): Profile of servers without their own
+            profiles (Dict[str, SimulatedServerProfile], optional): Profiles by server ID
+            seed (int, optional): Random seed for reproducible runs
+        """
+        self.default_profile = default_profile or SimulatedServerProfile()
+        self.profiles = profiles or {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._jboss_status: Dict[str, str] = {}
+        # Server -> (final JBoss status, monotonic time it is reached) of a start/stop still settling
+        self._settling: Dict[str, Tuple[str, float]] = {}
+        self._sessions = set()
+        self._calls = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+
+    @classmethod
+    def from_env(cls) -> 'SimulatedExecutor':
+        """
+        Build the executor from EAP_SIMULATED_PROFILE, a JSON file of the form
+        {"default": {...profile...}, "servers": {"prod92": {...profile...}}}
+
+        Returns:
+            SimulatedExecutor: Executor using the file's profiles, or defaults if unset
+        """
+        path = os.environ.get('EAP_SIMULATED_PROFILE')
+        if not path:
+            return cls()
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(
+            default_profile=SimulatedServerProfile.from_dict(data.get('default', {})),
+            profiles={server: SimulatedServerProfile.from_dict(profile)
+                      for server, profile in data.get('servers', {}).items()}
+        )
+
+    def profile(self, server: str) -> SimulatedServerProfile:
+        """
+        Returns:
+            SimulatedServerProfile: Profile of the server
+        """
+        return self.profiles.get(server, self.default_profile)
+
+    def _delay(self, mean: float, jitter: float) -> float:
+        """
+        Returns:
+            float: Random delay around mean
+        """
+        with self._lock:
+            return max(0.0, mean + self._random.uniform(-jitter, jitter))
+
+    def execute(self, call: RemoteCall) -> HostResult:
+        steps = self._simulate(call)
+        try:
+            delay, partial_output = next(steps)
+            while True:
+                remaining = call.remaining()
+                if remaining is not None and remaining < delay:
+                    time.sleep(remaining)
+                    delay, partial_output = steps.throw(
+                        RemoteTimeoutError(f"Simulated call to {call.server} timed out", partial_output))
+                else:
+                    time.sleep(delay)
+                    delay, partial_output = next(steps)
+        except StopIteration as finished:
+            return finished.value
+
+    async def execute_async(self, call: RemoteCall) -> HostResult:
+        steps = self._simulate(call)
+        try:
+            delay, partial_output = next(steps)
+            while True:
+                remaining = call.remaining()
+                if remaining is not None and remaining < delay:
+                    await asyncio.sleep(remaining)
+                    delay, partial_output = steps.throw(
+                        RemoteTimeoutError(f"Simulated call to {call.server} timed out", partial_output))
+                else:
+                    await asyncio.sleep(delay)
+                    delay, partial_output = next(steps)
+        except StopIteration as finished:
+            return finished.value
+
+    def warm(self, username: str, password: str, server: str, timeout: Optional[float] = None) -> bool:
+        profile = self.profile(server)
+        with self._lock:
+            new_session = (username, server) not in self._sessions
+            if new_session:
+                self._sessions.add((username, server))
+        if new_session:
+            delay = self._delay(profile.session_latency, profile.jitter)
+            if timeout is not None and timeout < delay:
+                time.sleep(timeout)
+                with self._lock:
+                    self._sessions.discard((username, server))
+                raise TimeoutError(f"Simulated session to {server} was not ready in time")
+            time.sleep(delay)
+        return True
+
+    def _simulate(self, call: RemoteCall) -> Generator[Tuple[float, str], None, HostResult]:
+        """
+        Simulate a call as a series of waits, so the same logic serves execute and execute_async
+
+        Yields:
+            Tuple[float, str]: Seconds to wait and the output written so far; the driver throws
+            RemoteTimeoutError into the generator if the deadline comes first
+
+        Returns:
+            HostResult: Output and success flag
+        """
+        profile = self.profile(call.server)
+        with self._lock:
+            self._calls += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+            new_session = (call.username, call.server) not in self._sessions
+            if new_session:
+                self._sessions.add((call.username, call.server))
+            roll = self._random.random()
+        try:
+            if new_session:
+                started = time.perf_counter()
+                yield self._delay(profile.session_latency, profile.jitter), ""
+                observe_phase(call.server, 'session', time.perf_counter() - started)
+            if roll < profile.connection_failure_rate:
+                with self._lock:
+                    self._sessions.discard((call.username, call.server))
+                raise ConnectionError("Failed to connect to remote server. Please check credentials.")
+
+            started = time.perf_counter()
+            if call.kind == STATUS:
+                output = yield from self._status_output(call, profile)
+            else:
+                output = yield from self._action_progress(call, profile)
+            observe_phase(call.server, 'exec', time.perf_counter() - started)
+
+            if roll < profile.connection_failure_rate + profile.failure_rate:
+                error = f"ERROR: simulated failure on {call.server}"
+                call.emit(error)
+                return HostResult(error if call.kind == STATUS else output + "\n" + error, False)
+
+            if call.kind == STATUS:
+                return HostResult(output, True)
+            return HostResult(self._action_output(call, output), True)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _status_output(self, call: RemoteCall,
+                       profile: SimulatedServerProfile) -> Generator[Tuple[float, str], None, str]:
+        """
+        Write the per-item lines and status payload the remote status script would write,
+        spreading the profile latency over the JBoss check and each service
+        """
+        with self._lock:
+            settling = self._settling.get(call.server)
+            if settling is not None and time.monotonic() >= settling[1]:
+                self._jboss_status[call.server] = settling[0]
+                del self._settling[call.server]
+            status = self._jboss_status.get(call.server, profile.jboss_status)
+        jboss_cli_command = call.arguments.get('jboss_cli_command')
+        service_names = call.arguments.get('services', [])
+        steps = len(service_names) + (1 if jboss_cli_command else 0)
+        lines: List[str] = []
+
+        jboss = None
+        if jboss_cli_command:
+            yield self._delay(profile.latency / steps, profile.jitter / steps), ""
+            jboss = {"status": status, "error": None}
+            lines.append(JBOSS_RESULT_MARKER + json.dumps(jboss, separators=(',', ':')))
+            call.emit(lines[-1])
+
+        services: List[Dict] = []
+        for service in service_names:
+            yield self._delay(profile.latency / steps, profile.jitter / steps), "\n".join(lines)
+            running = (True if status == 'STARTED' else False if status == 'STOPPED' else None) \
+                if jboss_cli_command else True
+            entry = {"name": service, "running": running,
+                     "status": status if jboss_cli_command else "Running", "error": None}
+            services.append(entry)
+            lines.append(SERVICE_RESULT_MARKER + json.dumps(entry, separators=(',', ':')))
+            call.emit(lines[-1])
+
+        if not steps:
+            yield self._delay(profile.latency, profile.jitter), ""
+        payload = {"jboss": jboss, "services": services}
+        lines.append(STATUS_PAYLOAD_MARKER + json.dumps(payload, separators=(',', ':')))
+        call.emit(lines[-1])
+        return "\n".join(lines)
+
+    def _action_progress(self, call: RemoteCall,
+                         profile: SimulatedServerProfile) -> Generator[Tuple[float, str], None, str]:
+        """Write progress lines over the action latency, like a JBoss start script logging as it boots"""
+        verb = 'Starting' if call.kind == START else 'Stopping'
+        lines = [f"{verb} {call.server}..."]
+        call.emit(lines[-1])
+        for step in range(1, ACTION_PROGRESS_STEPS + 1):
+            yield (self._delay(profile.action_latency / ACTION_PROGRESS_STEPS, profile.jitter / ACTION_PROGRESS_STEPS),
+                   "\n".join(lines))
+            lines.append(f"{verb} {call.server}: {100 * step // ACTION_PROGRESS_STEPS}%")
+            call.emit(lines[-1])
+        return "\n".join(lines)
+
+    def _action_output(self, call: RemoteCall, progress: str) -> str:
+        """Apply a start/stop to the simulated JBoss status and return its output"""
+        final = 'STARTED' if call.kind == START else 'STOPPED'
+        settle_time = self.profile(call.server).settle_time
+        with self._lock:
+            self._settling.pop(call.server, None)
+            if settle_time > 0:
+                # Like a real start script, the call returns while JBoss is still booting or shutting down
+                self._jboss_status[call.server] = 'STARTING' if call.kind == START else 'STOPPING'
+                self._settling[call.server] = (final, time.monotonic() + settle_time)
+            else:
+                self._jboss_status[call.server] = final
+        outcome = '{"outcome" => "success"}'
+        call.emit(outcome)
+        return progress + "\n" + outcome
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "spawned": len(self._sessions),
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight
+            }
+
+
+_executor: Optional[RemoteExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> RemoteExecutor:
+    """
+    Get the process-wide remote executor, creating it on first use
+
+    Returns:
+        RemoteExecutor: Backend selected by EAP_EXECUTOR ("powershell", "simulated" or "jboss-http")
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            backend = os.environ.get('EAP_EXECUTOR', 'powershell')
+            if backend == 'simulated':
+                _executor = SimulatedExecutor.from_env()
+            elif backend == 'jboss-http':
+                # Imported here because jboss_http_client builds on this module
+                from jboss_http_client import JBossHttpExecutor
+                _executor = JBossHttpExecutor()
+            else:
+                _executor = PowerShellExecutor()
+        return _executor
+
+
+def set_executor(executor: RemoteExecutor) -> None:
+    """
+    Replace the process-wide remote executor
+
+    Args:
+        executor (RemoteExecutor): Backend to use from now on
+    """
+    global _executor
+    with _executor_lock:
+        _executor = executor
@@ -0,0 +1,267 @@
+"""
+Module for rolling start/stop of many servers in waves.
+
+A rollout splits the selected servers into waves of at most `wave_size` servers. Each
+wave's start/stop runs through the job queue (so per-server serialization still
+applies), then the rollout waits until every server in the wave reports the target
+state before the next wave begins; a job that watched its server converge already
+answers that, and only the others are checked here. When more than `max_failures` servers of a wave fail
+or miss the target state in time, the rollout halts and the remaining waves are skipped.
+
+When the job queue has a store (see job_store.py), the rollout's state is saved there as it
+progresses, so any worker process can answer a lookup of it.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from convergence import READY, TARGET_STATUS, reached_target
+from jobs import FAILED, UNCONFIRMED, Job, JobQueue
+from status_poller import StatusSnapshot
+
+# Defaults for a rollout
+DEFAULT_WAVE_SIZE = 2
+DEFAULT_MAX_FAILURES = 0
+DEFAULT_WAVE_TIMEOUT = 600  # seconds a wave may take to reach the target state
+DEFAULT_CHECK_INTERVAL = 10  # seconds between status checks while waiting
+
+# Number of finished rollouts kept for lookups
+FINISHED_ROLLOUTS_KEPT = 50
+
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+HALTED = 'halted'
+
+
+def _last_state(job: Job) -> Optional[str]:
+    """
+    Returns:
+        Optional[str]: Last server state the job's convergence watch saw, None if it saw none
+    """
+    transitions = (job.convergence or {}).get("transitions") or []
+    return transitions[-1]["state"] if transitions else None
+
+
+class Rollout:
+    """A start/stop of many servers, executed in waves"""
+
+    def __init__(self, action: str, servers: List[str], username: str, password: str,
+                 wave_size: int, max_failures: int, wave_timeout: float):
+        """
+        Initialize a rollout
+
+        Args:
+            action (str): "start" or "stop"
+            servers (List[str]): Server IDs in rollout order
+            username (str): User who started the rollout
+            password (str): Password for the remote sessions, dropped once the rollout finishes
+            wave_size (int): Maximum number of servers acted on at the same time
+            max_failures (int): Failed servers tolerated per wave before the rollout halts
+            wave_timeout (float): Seconds a wave may take to reach the target state
+        """
+        self.id = uuid.uuid4().hex
+        self.action = action
+        self.username = username
+        self.password: Optional[str] = password
+        self.wave_size = wave_size
+        self.max_failures = max_failures
+        self.wave_timeout = wave_timeout
+        self.status = RUNNING
+        self.message: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.waves: List[Dict] = [
+            {"servers": {server_id: {"status": "pending"} for server_id in servers[i:i + wave_size]},
+             "status": "pending"}
+            for i in range(0, len(servers), wave_size)
+        ]
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the rollout for a JSON response
+
+        Returns:
+            Dict: Rollout state without credentials
+        """
+        return {
+            "rollout_id": self.id,
+            "action": self.action,
+            "username": self.username,
+            "status": self.status,
+            "message": self.message,
+            "wave_size": self.wave_size,
+            "max_failures": self.max_failures,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "waves": self.waves
+        }
+
+
+class RolloutManager:
+    """Runs rollouts in background threads on top of the job queue"""
+
+    def __init__(self, job_queue: JobQueue, status_check: Callable[[str, str, str], StatusSnapshot],
+                 check_interval: float = DEFAULT_CHECK_INTERVAL):
+        """
+        Initialize the rollout manager
+
+        Args:
+            job_queue (JobQueue): Queue running the per-server start/stop jobs
+            status_check (Callable): Function (server_id, username, password) -> StatusSnapshot
+                returning a fresh status
+            check_interval (float): Seconds between status checks while a wave converges
+        """
+        self._job_queue = job_queue
+        self._store = job_queue.store
+        self._status_check = status_check
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._rollouts: "OrderedDict[str, Rollout]" = OrderedDict()
+
+    def start(self, action: str, servers: List[str], username: str, password: str,
+              wave_size: int = DEFAULT_WAVE_SIZE, max_failures: int = DEFAULT_MAX_FAILURES,
+              wave_timeout: float = DEFAULT_WAVE_TIMEOUT) -> Rollout:
+        """
+        Start a rollout in the background
+
+        Args:
+            action (str): "start" or "stop"
+            servers (List[str]): Server IDs in rollout order
+            username (str): Username for authentication
+            password (str): Password for authentication
+            wave_size (int): Maximum number of servers acted on at the same time
+            max_failures (int): Failed servers tolerated per wave before the rollout halts
+            wave_timeout (float): Seconds a wave may take to reach the target state
+
+        Returns:
+            Rollout: The running rollout
+
+        Raises:
+            ValueError: If the action, servers or limits are invalid
+        """
+        if action not in TARGET_STATUS:
+            raise ValueError("Action must be either 'start' or 'stop'")
+        if not servers:
+            raise ValueError("At least one server is required")
+        if wave_size < 1 or max_failures < 0:
+            raise ValueError("wave_size must be at least 1 and max_failures at least 0")
+
+        rollout = Rollout(action, list(dict.fromkeys(servers)), username, password,
+                          wave_size, max_failures, wave_timeout)
+        with self._lock:
+            self._rollouts[rollout.id] = rollout
+            finished = [rollout_id for rollout_id, item in self._rollouts.items() if item.status != RUNNING]
+            for rollout_id in finished[:max(0, len(finished) - FINISHED_ROLLOUTS_KEPT)]:
+                del self._rollouts[rollout_id]
+        self._save(rollout)
+        threading.Thread(target=self._run, args=(rollout,), name=f'rollout-{rollout.id[:8]}',
+                         daemon=True).start()
+        return rollout
+
+    def get(self, rollout_id: str) -> Optional[Rollout]:
+        """
+        Look up a rollout
+
+        Args:
+            rollout_id (str): ID returned by start()
+
+        Returns:
+            Optional[Rollout]: The rollout or None if unknown; with a store, rollouts of other
+            workers are returned as StoredRollout
+        """
+        with self._lock:
+            rollout = self._rollouts.get(rollout_id)
+        if rollout is None and self._store is not None:
+            return self._store.load_rollout(rollout_id)
+        return rollout
+
+    def _save(self, rollout: Rollout) -> None:
+        """Write the rollout's progress to the store, if there is one"""
+        if self._store is None:
+            return
+        try:
+            self._store.save_rollout(rollout.to_dict())
+        except sqlite3.Error:
+            # Saved again at the next step; the rollout itself goes on
+            pass
+
+    def _run(self, rollout: Rollout) -> None:
+        """Execute the waves of a rollout one after another"""
+        try:
+            for index, wave in enumerate(rollout.waves):
+                failures = self._run_wave(rollout, wave)
+                if failures > rollout.max_failures:
+                    rollout.status = HALTED
+                    rollout.message = (f"Wave {index + 1} had {failures} failed server(s), "
+                                       f"more than the {rollout.max_failures} allowed")
+                    for skipped in rollout.waves[index + 1:]:
+                        skipped["status"] = "skipped"
+                    return
+            rollout.status = SUCCEEDED
+        except Exception as e:
+            rollout.status = HALTED
+            rollout.message = str(e)
+        finally:
+            rollout.finished_at = time.time()
+            rollout.password = None
+            self._save(rollout)
+
+    def _run_wave(self, rollout: Rollout, wave: Dict) -> int:
+        """
+        Act on every server of a wave and wait until they reach the target state
+
+        Returns:
+            int: Number of servers that failed or did not converge before the wave timeout
+        """
+        wave["status"] = "running"
+        deadline = time.monotonic() + rollout.wave_timeout
+        results = wave["servers"]
+
+        jobs = {}
+        for server_id in results:
+            job, _ = self._job_queue.submit(server_id, rollout.action, rollout.username, rollout.password)
+            jobs[server_id] = job
+            results[server_id].update({"status": "running", "job_id": job.id})
+        self._save(rollout)
+
+        converging = []
+        for server_id, job in jobs.items():
+            if not job.wait(max(0.0, deadline - time.monotonic())):
+                results[server_id]["status"] = "timed_out"
+            elif job.status == FAILED:
+                results[server_id].update({"status": "failed", "error": job.error})
+            elif job.status == UNCONFIRMED:
+                # The job's own watch did not see the target state in time
+                results[server_id].update({"status": "timed_out", "jboss_status": _last_state(job)})
+            elif job.convergence is not None and job.convergence["status"] == READY:
+                results[server_id].update({"status": "succeeded", "jboss_status": job.convergence["target"],
+                                           "time_to_ready": job.convergence["time_to_ready"]})
+            else:
+                # Not watched by the job (watch off or cancelled)
+                results[server_id]["status"] = "converging"
+                converging.append(server_id)
+            self._save(rollout)
+
+        # Wait for the remaining servers whose job succeeded to report the target state
+        while converging:
+            for server_id in list(converging):
+                snapshot = self._status_check(server_id, rollout.username, rollout.password)
+                results[server_id]["jboss_status"] = snapshot.jboss_status if snapshot else None
+                if reached_target(snapshot, rollout.action):
+                    results[server_id]["status"] = "succeeded"
+                    converging.remove(server_id)
+            self._save(rollout)
+            if not converging:
+                break
+            if time.monotonic() >= deadline:
+                for server_id in converging:
+                    results[server_id]["status"] = "timed_out"
+                break
+            time.sleep(min(self._check_interval, max(0.0, deadline - time.monotonic())))
+
+        failures = sum(1 for result in results.values() if result["status"] != "succeeded")
+        wave["status"] = "succeeded" if not failures else "failed"
+        return failures
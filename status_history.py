@@ -0,0 +1,431 @@
+"""
+Module for keeping a history of service status samples.
+
+Every status check the poller makes is recorded as one sample per service:
+(time, state, check latency). Each (server, service) series keeps its recent samples
+in fixed-size `array` ring buffers, so memory per series stays constant however long
+the app runs. Samples are also appended to one binary segment file per UTC day under
+history/ (or EAP_HISTORY_DIR), and queries reaching back past the ring buffer read
+those files instead.
+
+Queries return the state spans of a time range (downsampled to at most `max_spans`
+spans per service) and the uptime percentage over the time the state was known.
+"""
+import bisect
+import datetime
+import json
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from status_poller import StatusSnapshot
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history')
+
+# Samples kept in memory per series (3.5 days at the default 15 second poll interval)
+DEFAULT_CAPACITY = 20160
+
+# Segment files older than this many days are deleted
+RETENTION_DAYS = 30
+
+# Seconds between flushes of the open segment file
+FLUSH_INTERVAL = 5.0
+
+# Two samples further apart than this many seconds leave an unknown gap between them
+MAX_SAMPLE_GAP = 300.0
+
+# Default maximum number of spans returned per service
+DEFAULT_MAX_SPANS = 200
+
+# Sample states
+UNKNOWN = -1
+STOPPED = 0
+RUNNING = 1
+STATE_NAMES = {UNKNOWN: 'unknown', STOPPED: 'stopped', RUNNING: 'running'}
+
+# On-disk record: epoch time, series number, state, check latency in seconds
+_RECORD = struct.Struct('<dHbf')
+_SERIES_FILE = 'series.json'
+
+
+def _state_of(running: Optional[bool]) -> int:
+    """Map a service's running flag to a sample state"""
+    if running is None:
+        return UNKNOWN
+    return RUNNING if running else STOPPED
+
+
+class _TimesView:
+    """Chronological, read-only view of a ring's timestamps for bisect"""
+
+    def __init__(self, ring: 'SeriesRing'):
+        self._ring = ring
+
+    def __len__(self) -> int:
+        return self._ring.count
+
+    def __getitem__(self, index: int) -> float:
+        return self._ring.times[(self._ring.start + index) % self._ring.capacity]
+
+
+class SeriesRing:
+    """Fixed-capacity ring buffer of (time, state, latency) samples backed by arrays"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        Initialize the ring
+
+        Args:
+            capacity (int): Maximum number of samples kept; the oldest are overwritten
+        """
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.states = array('b', bytes(capacity))
+        self.latencies = array('f', bytes(4 * capacity))
+        self.start = 0
+        self.count = 0
+
+    @property
+    def oldest(self) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: Time of the oldest sample kept, None if empty
+        """
+        return self.times[self.start] if self.count else None
+
+    def append(self, timestamp: float, state: int, latency: float) -> None:
+        """
+        Add a sample, overwriting the oldest one when full
+
+        Args:
+            timestamp (float): Epoch time of the sample
+            state (int): RUNNING, STOPPED or UNKNOWN
+            latency (float): Seconds the check took
+        """
+        if self.count < self.capacity:
+            index = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[index] = timestamp
+        self.states[index] = state
+        self.latencies[index] = latency
+
+    def samples(self, since: float, until: float) -> List[Tuple[float, int, float]]:
+        """
+        Get the samples in a time range, plus the last sample before it
+
+        Args:
+            since (float): Start of the range (epoch seconds)
+            until (float): End of the range (epoch seconds)
+
+        Returns:
+            List[Tuple[float, int, float]]: (time, state, latency) in chronological order
+        """
+        view = _TimesView(self)
+        first = max(0, bisect.bisect_left(view, since) - 1)
+        last = bisect.bisect_right(view, until)
+        result = []
+        for offset in range(first, last):
+            index = (self.start + offset) % self.capacity
+            result.append((self.times[index], self.states[index], self.latencies[index]))
+        return result
+
+
+class StatusHistory:
+    """Per-service status history with in-memory rings and daily on-disk segments"""
+
+    def __init__(self, directory: Optional[str] = None, capacity: int = DEFAULT_CAPACITY,
+                 persist: bool = True):
+        """
+        Initialize the history store
+
+        Args:
+            directory (str, optional): Segment directory, defaults to EAP_HISTORY_DIR or history/
+            capacity (int): Samples kept in memory per series
+            persist (bool): Append samples to segment files
+        """
+        self.directory = directory or os.environ.get('EAP_HISTORY_DIR', DEFAULT_HISTORY_DIR)
+        self.capacity = capacity
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._rings: Dict[Tuple[str, str], SeriesRing] = {}
+        self._series_ids: Dict[Tuple[str, str], int] = {}
+        self._segment = None
+        self._segment_day: Optional[str] = None
+        self._last_flush = 0.0
+        if persist:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_series()
+
+    def _load_series(self) -> None:
+        """Read the series numbering used by existing segment files"""
+        path = os.path.join(self.directory, _SERIES_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._series_ids[(entry['server'], entry['service'])] = entry['id']
+
+    def _series_id(self, key: Tuple[str, str]) -> int:
+        """Get the on-disk number of a series, registering it if new (caller holds the lock)"""
+        series_id = self._series_ids.get(key)
+        if series_id is None:
+            series_id = len(self._series_ids)
+            self._series_ids[key] = series_id
+            with open(os.path.join(self.directory, _SERIES_FILE), 'a') as f:
+                f.write(json.dumps({"id": series_id, "server": key[0], "service": key[1]}) + '\n')
+        return series_id
+
+    @staticmethod
+    def _day(timestamp: float) -> str:
+        return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%d')
+
+    def _segment_path(self, day: str) -> str:
+        return os.path.join(self.directory, f'{day}.seg')
+
+    def _open_segment(self, timestamp: float):
+        """Get the segment file for the sample's day, rolling over at midnight UTC (caller holds the lock)"""
+        day = self._day(timestamp)
+        if day != self._segment_day:
+            if self._segment is not None:
+                self._segment.close()
+            self._segment = open(self._segment_path(day), 'ab')
+            self._segment_day = day
+            self._delete_expired_segments()
+        return self._segment
+
+    def _delete_expired_segments(self) -> None:
+        """Remove segment files older than RETENTION_DAYS"""
+        cutoff = self._day(time.time() - RETENTION_DAYS * 86400)
+        for name in os.listdir(self.directory):
+            if name.endswith('.seg') and name[:-4] < cutoff:
+                os.remove(os.path.join(self.directory, name))
+
+    def record(self, snapshot: StatusSnapshot) -> None:
+        """
+        Record one sample per service of a status snapshot
+
+        Args:
+            snapshot (StatusSnapshot): Result of a status check; failed checks record unknown states
+        """
+        latency = snapshot.duration or 0.0
+        records = []
+        with self._lock:
+            for service in snapshot.services:
+                key = (snapshot.server_id, service['name'])
+                state = UNKNOWN if snapshot.error else _state_of(service.get('running'))
+                ring = self._rings.get(key)
+                if ring is None:
+                    ring = self._rings[key] = SeriesRing(self.capacity)
+                ring.append(snapshot.checked_at, state, latency)
+                if self.persist:
+                    records.append(_RECORD.pack(snapshot.checked_at, self._series_id(key), state, latency))
+
+            if records:
+                segment = self._open_segment(snapshot.checked_at)
+                segment.write(b''.join(records))
+                if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                    segment.flush()
+                    self._last_flush = time.monotonic()
+
+    def _disk_samples(self, series_id: int, since: float, until: float) -> List[Tuple[float, int, float]]:
+        """
+        Read a series' samples in a range from the segment files; runs without the lock so
+        reads never hold up record(), after the caller flushed the current segment
+        """
+        samples: List[Tuple[float, int, float]] = []
+        previous: Optional[Tuple[float, int, float]] = None
+        # Only days that can still have a segment are read; include the day before the range
+        # so the state at its start is known
+        now = time.time()
+        since = max(since, now - (RETENTION_DAYS + 1) * 86400)
+        until = min(until, now + 86400)
+        if since > until:
+            return []
+        day = datetime.datetime.fromtimestamp(since - 86400, datetime.timezone.utc).date()
+        last_day = datetime.datetime.fromtimestamp(until, datetime.timezone.utc).date()
+        while day <= last_day:
+            path = self._segment_path(day.strftime('%Y-%m-%d'))
+            day += datetime.timedelta(days=1)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            data = data[:len(data) - len(data) % _RECORD.size]
+            for timestamp, record_series, state, latency in _RECORD.iter_unpack(data):
+                if record_series != series_id or timestamp > until:
+                    continue
+                if timestamp < since:
+                    previous = (timestamp, state, latency)
+                else:
+                    samples.append((timestamp, state, latency))
+        samples.sort()
+        return ([previous] if previous else []) + samples
+
+    def samples(self, server_id: str, service: str, since: float,
+                until: float) -> List[Tuple[float, int, float]]:
+        """
+        Get the samples of one service in a time range, plus the last sample before it
+
+        Args:
+            server_id (str): ID of the server
+            service (str): Service name
+            since (float): Start of the range (epoch seconds)
+            until (float): End of the range (epoch seconds)
+
+        Returns:
+            List[Tuple[float, int, float]]: (time, state, latency) in chronological order
+        """
+        key = (server_id, service)
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is not None and ring.oldest is not None and ring.oldest <= since:
+                return ring.samples(since, until)
+            if not self.persist:
+                return ring.samples(since, until) if ring is not None else []
+            series_id = self._series_ids.get(key)
+            if series_id is None:
+                return []
+            if self._segment is not None:
+                self._segment.flush()
+        return self._disk_samples(series_id, since, until)
+
+    def services(self, server_id: str) -> List[str]:
+        """
+        Get the services with recorded history for a server
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            List[str]: Service names
+        """
+        with self._lock:
+            keys = set(self._rings) | set(self._series_ids)
+        return sorted(service for server, service in keys if server == server_id)
+
+    def query(self, server_id: str, services: Iterable[str], since: float, until: float,
+              max_spans: int = DEFAULT_MAX_SPANS) -> Dict:
+        """
+        Summarize the history of a server's services in a time range
+
+        Args:
+            server_id (str): ID of the server
+            services (Iterable[str]): Service names to include
+            since (float): Start of the range (epoch seconds)
+            until (float): End of the range (epoch seconds)
+            max_spans (int): Maximum number of spans per service; shorter spans are merged
+                into windows reporting their dominant state
+
+        Returns:
+            Dict: {"server_id", "since", "until", "services": {name: {"uptime_percent",
+            "running_seconds", "stopped_seconds", "unknown_seconds", "samples",
+            "avg_latency", "spans": [{"state", "start", "end"}]}}}
+        """
+        result = {"server_id": server_id, "since": since, "until": until, "services": {}}
+        for service in services:
+            samples = self.samples(server_id, service, since, until)
+            spans = build_spans(samples, since, until)
+            totals = {RUNNING: 0.0, STOPPED: 0.0, UNKNOWN: 0.0}
+            for state, start, end in spans:
+                totals[state] += end - start
+            known = totals[RUNNING] + totals[STOPPED]
+            in_range = [sample for sample in samples if sample[0] >= since]
+            result["services"][service] = {
+                "uptime_percent": round(100.0 * totals[RUNNING] / known, 2) if known else None,
+                "running_seconds": round(totals[RUNNING], 1),
+                "stopped_seconds": round(totals[STOPPED], 1),
+                "unknown_seconds": round(totals[UNKNOWN], 1),
+                "samples": len(in_range),
+                "avg_latency": (round(sum(sample[2] for sample in in_range) / len(in_range), 3)
+                                if in_range else None),
+                "spans": [{"state": STATE_NAMES[state], "start": start, "end": end}
+                          for state, start, end in downsample_spans(spans, since, until, max_spans)]
+            }
+        return result
+
+
+def build_spans(samples: List[Tuple[float, int, float]], since: float,
+                until: float) -> List[Tuple[int, float, float]]:
+    """
+    Turn samples into consecutive state spans covering [since, until]
+
+    A sample's state lasts until the next sample, or at most MAX_SAMPLE_GAP seconds;
+    time not covered by any sample is unknown.
+
+    Args:
+        samples (List[Tuple[float, int, float]]): Chronological (time, state, latency) samples
+        since (float): Start of the range
+        until (float): End of the range
+
+    Returns:
+        List[Tuple[int, float, float]]: (state, start, end) spans in order
+    """
+    spans: List[Tuple[int, float, float]] = []
+
+    def add(state: int, start: float, end: float) -> None:
+        start, end = max(start, since), min(end, until)
+        if end <= start:
+            return
+        if spans and spans[-1][0] == state and spans[-1][2] >= start:
+            spans[-1] = (state, spans[-1][1], end)
+        else:
+            spans.append((state, start, end))
+
+    cursor = since
+    for index, (timestamp, state, _) in enumerate(samples):
+        following = samples[index + 1][0] if index + 1 < len(samples) else until
+        if timestamp > cursor:
+            add(UNKNOWN, cursor, timestamp)
+        end = min(following, timestamp + MAX_SAMPLE_GAP)
+        add(state, timestamp, end)
+        cursor = max(cursor, end)
+    add(UNKNOWN, cursor, until)
+    return spans
+
+
+def downsample_spans(spans: List[Tuple[int, float, float]], since: float, until: float,
+                     max_spans: int) -> List[Tuple[int, float, float]]:
+    """
+    Reduce spans to at most max_spans by merging fixed windows into their dominant state
+
+    Args:
+        spans (List[Tuple[int, float, float]]): (state, start, end) spans from build_spans
+        since (float): Start of the range
+        until (float): End of the range
+        max_spans (int): Maximum number of spans returned
+
+    Returns:
+        List[Tuple[int, float, float]]: The spans unchanged if few enough, else merged windows
+    """
+    if len(spans) <= max_spans or until <= since:
+        return spans
+
+    width = (until - since) / max_spans
+    windows: List[Tuple[int, float, float]] = []
+    index = 0
+    for window in range(max_spans):
+        start = since + window * width
+        end = until if window == max_spans - 1 else start + width
+        durations = {RUNNING: 0.0, STOPPED: 0.0, UNKNOWN: 0.0}
+        while index < len(spans) and spans[index][2] <= start:
+            index += 1
+        probe = index
+        while probe < len(spans) and spans[probe][1] < end:
+            state, span_start, span_end = spans[probe]
+            durations[state] += min(span_end, end) - max(span_start, start)
+            probe += 1
+        state = max(durations, key=durations.get)
+        if windows and windows[-1][0] == state:
+            windows[-1] = (state, windows[-1][1], end)
+        else:
+            windows.append((state, start, end))
+    return windows
@@ -0,0 +1,858 @@
+"""
+Module for background polling of server service status.
+
+A single StatusPoller keeps one status snapshot per configured server and refreshes
+each server on its own interval, so browser tabs read the cached snapshot instead of
+opening a new PowerShell session on every request. In async mode (EAP_ASYNC=1) the
+background refreshes run as coroutines on the shared event loop of async_runtime.py.
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from admission import Overloaded
+from app_logging import get_logger
+from async_runtime import get_runtime
+from circuit_breaker import OPEN, CircuitBreaker, CircuitBreakerRegistry
+from deadline import DEFAULT_STATUS_TIMEOUT, deadline_scope, remaining
+from metrics import STATUS_CHECKS
+from models.server_config import ServerConfig
+from powershellStatusChecker import check_services_powershell, check_services_powershell_async
+from tracing import annotate, span
+
+logger = get_logger('eap_status')
+
+# Default refresh interval in seconds when a server has no "poll_interval" configured
+DEFAULT_POLL_INTERVAL = 15
+
+# A snapshot older than this many poll intervals is treated as a cache miss
+STALE_AFTER_INTERVALS = 3
+
+# Adaptive polling: right after a state change a server is polled at
+# max(MIN_POLL_INTERVAL, poll_interval * FAST_POLL_FACTOR); every unchanged check then
+# stretches the interval by STABLE_GROWTH_FACTOR, up to poll_interval * MAX_STABLE_FACTOR.
+# "min_poll_interval" / "max_poll_interval" config keys override the bounds per server.
+MIN_POLL_INTERVAL = 5
+FAST_POLL_FACTOR = 1 / 3
+STABLE_GROWTH_FACTOR = 1.5
+MAX_STABLE_FACTOR = 4
+
+# Snapshot errors counted as failures by the circuit breaker
+BREAKER_FAILURES = ("connection_failed", "timed_out")
+
+# A deadline more than this many seconds shorter than DEFAULT_STATUS_TIMEOUT was set by the caller
+# (e.g. ?timeout= on /get_services); a check it cuts off is not cached, published or counted
+CALLER_DEADLINE_SLACK = 1.0
+
+# Maximum number of undelivered change events kept per subscriber
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def _caller_bound() -> bool:
+    """
+    Returns:
+        bool: True if the current deadline gives a check less time than DEFAULT_STATUS_TIMEOUT
+    """
+    return remaining(DEFAULT_STATUS_TIMEOUT) < DEFAULT_STATUS_TIMEOUT - CALLER_DEADLINE_SLACK
+
+
+class _SharedCheck:
+    """An in-flight check of one server; followers read the leader's snapshot once done is set"""
+
+    __slots__ = ('done', 'snapshot')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.snapshot: Optional['StatusSnapshot'] = None
+
+
+class StatusSnapshot:
+    """Result of one status check for a server"""
+
+    def __init__(self, server_id: str, services: List[Dict], error: Optional[str] = None,
+                 message: Optional[str] = None, checked_at: Optional[float] = None,
+                 jboss_status: Optional[str] = None, duration: Optional[float] = None):
+        """
+        Initialize a status snapshot
+
+        Args:
+            server_id (str): ID of the server the snapshot belongs to
+            services (List[Dict]): Service statuses as {"name": str, "running": bool|None}
+            error (str, optional): Error code if the check failed ("connection_failed", "timed_out",
+                "check_failed", or "circuit_open" when the check was skipped)
+            message (str, optional): Human readable error message
+            checked_at (float, optional): Epoch time the check finished, defaults to now
+            jboss_status (str, optional): Raw JBoss server-config status, e.g. "STARTED"
+            duration (float, optional): Seconds the check took, set by the poller
+        """
+        self.server_id = server_id
+        self.services = services
+        self.error = error
+        self.message = message
+        self.checked_at = checked_at if checked_at is not None else time.time()
+        self.jboss_status = jboss_status
+        self.duration = duration
+        # Set when no fresh result is available ("circuit_open", or a wait that hit its deadline):
+        # last successful snapshot and, with an open breaker, the time of the next probe
+        self.last_known: Optional[StatusSnapshot] = None
+        self.retry_at: Optional[float] = None
+
+    @property
+    def age(self) -> float:
+        """
+        Get the age of the snapshot
+
+        Returns:
+            float: Seconds since the check finished
+        """
+        return max(0.0, time.time() - self.checked_at)
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the snapshot for a JSON response
+
+        Returns:
+            Dict: Snapshot with services, check time and age
+        """
+        data = {
+            "server_id": self.server_id,
+            "services": self.services,
+            "checked_at": self.checked_at,
+            "age": round(self.age, 1),
+            "jboss_status": self.jboss_status
+        }
+        if self.error:
+            data["error"] = self.error
+            data["message"] = self.message
+        if self.last_known is not None:
+            data["last_known"] = self.last_known.to_dict()
+        if self.retry_at is not None:
+            data["retry_at"] = self.retry_at
+        return data
+
+
+def _initial_statuses(server_id: str) -> List[Dict]:
+    """
+    Returns:
+        List[Dict]: Every configured service of the server with N/A status
+    """
+    services = ServerConfig.get_instance().get_server_services(server_id)
+    return [{
+        "name": service['name'],
+        "running": None  # None indicates N/A status
+    } for service in services]
+
+
+def _check_inputs(server_id: str, username: str, password: str) -> Tuple[List[str], Optional[str]]:
+    """
+    Validate a status check request and look up what it has to cover
+
+    Args:
+        server_id (str): ID of the server to check
+        username (str): Username for authentication
+        password (str): Password for authentication
+
+    Returns:
+        Tuple[List[str], Optional[str]]: Service names and the JBoss status command
+
+    Raises:
+        ValueError: If credentials are missing or the server is not configured
+    """
+    server_config = ServerConfig.get_instance()
+    if not username or not password:
+        raise ValueError("Missing credentials")
+    if server_config.get_entry(server_id) is None:
+        raise ValueError(f"Server '{server_id}' not found in configuration")
+
+    # Get service names and JBoss status command from config
+    return server_config.get_service_names(server_id), server_config.get_command(server_id, 'check')
+
+
+def _ok_snapshot(server_id: str, service_statuses: List[Dict], payload: Dict) -> StatusSnapshot:
+    """
+    Build the snapshot of a successful check from its status payload
+
+    Args:
+        server_id (str): ID of the server
+        service_statuses (List[Dict]): Service statuses initialized to N/A
+        payload (Dict): Parsed status payload
+
+    Returns:
+        StatusSnapshot: Snapshot of the service statuses
+    """
+    jboss_status = payload['jboss'].get('status') if payload['jboss'] else None
+
+    # Update service statuses with PowerShell results
+    for service in service_statuses:
+        result = payload['services'].get(service['name'])
+        if result is not None:
+            service['running'] = result.get('running')
+
+    STATUS_CHECKS.inc(server=server_id, outcome="ok")
+    return StatusSnapshot(server_id, service_statuses, jboss_status=jboss_status)
+
+
+def _failed_snapshot(server_id: str, service_statuses: List[Dict], error: Exception) -> StatusSnapshot:
+    """
+    Build the snapshot of a failed check
+
+    Args:
+        server_id (str): ID of the server
+        service_statuses (List[Dict]): Service statuses initialized to N/A
+        error (Exception): Error raised by the check
+
+    Returns:
+        StatusSnapshot: Snapshot with the error code; services keep N/A status, except the
+        ones a timed-out check finished before its deadline
+    """
+    if isinstance(error, Overloaded):
+        # Not run at all; the poller keeps the cached snapshot and answers with the last known state
+        STATUS_CHECKS.inc(server=server_id, outcome="overloaded")
+        return StatusSnapshot(server_id, service_statuses, error="overloaded", message=str(error))
+    if isinstance(error, ConnectionError):
+        STATUS_CHECKS.inc(server=server_id, outcome="connection_failed")
+        return StatusSnapshot(server_id, service_statuses, error="connection_failed", message=str(error))
+    if isinstance(error, TimeoutError):
+        STATUS_CHECKS.inc(server=server_id, outcome="timed_out")
+        # Keep the services that finished before the deadline; mark the rest as timed out
+        partial = getattr(error, 'payload', None) or {"jboss": None, "services": {},
+                                                      "timed_out": [s['name'] for s in service_statuses]}
+        for service in service_statuses:
+            result = partial['services'].get(service['name'])
+            if result is not None:
+                service['running'] = result.get('running')
+            if service['name'] in partial['timed_out']:
+                service['timed_out'] = True
+        return StatusSnapshot(server_id, service_statuses, error="timed_out", message=str(error),
+                              jboss_status=(partial['jboss'] or {}).get('status'))
+    logger.warning(f"Error checking service status for {server_id}: {str(error)}",
+                   extra={'server': server_id, 'error_type': type(error).__name__})
+    # Keep N/A status for all services on error
+    STATUS_CHECKS.inc(server=server_id, outcome="check_failed")
+    return StatusSnapshot(server_id, service_statuses, error="check_failed", message=str(error))
+
+
+def check_server_status(server_id: str, username: str, password: str) -> StatusSnapshot:
+    """
+    Run a status check for every configured service of a server
+
+    Args:
+        server_id (str): ID of the server to check
+        username (str): Username for authentication
+        password (str): Password for authentication
+
+    Returns:
+        StatusSnapshot: Snapshot of the service statuses; services keep N/A status on error
+    """
+    service_statuses = _initial_statuses(server_id)
+    try:
+        service_names, jboss_cli_command = _check_inputs(server_id, username, password)
+        # One remote invocation checks every service and the JBoss status together, bounded by
+        # the caller's deadline or DEFAULT_STATUS_TIMEOUT
+        with deadline_scope(DEFAULT_STATUS_TIMEOUT):
+            payload = check_services_powershell(username, password, server_id, service_names, jboss_cli_command)
+    except Exception as e:
+        return _failed_snapshot(server_id, service_statuses, e)
+    return _ok_snapshot(server_id, service_statuses, payload)
+
+
+async def check_server_status_async(server_id: str, username: str, password: str) -> StatusSnapshot:
+    """
+    Same as check_server_status, run as a coroutine on the event loop (see async_runtime.py)
+    """
+    service_statuses = _initial_statuses(server_id)
+    try:
+        service_names, jboss_cli_command = _check_inputs(server_id, username, password)
+        with deadline_scope(DEFAULT_STATUS_TIMEOUT):
+            payload = await check_services_powershell_async(username, password, server_id,
+                                                            service_names, jboss_cli_command)
+    except Exception as e:
+        return _failed_snapshot(server_id, service_statuses, e)
+    return _ok_snapshot(server_id, service_statuses, payload)
+
+
+def diff_snapshots(old: Optional[StatusSnapshot], new: StatusSnapshot) -> Optional[Dict]:
+    """
+    Compute the status transitions between two snapshots of a server
+
+    Args:
+        old (Optional[StatusSnapshot]): Previous snapshot, None if there was none
+        new (StatusSnapshot): New snapshot
+
+    Returns:
+        Optional[Dict]: Compact diff {"server_id", "checked_at", "changes": {service: running}}
+        plus "error"/"message"/"jboss_status" when those changed; None if nothing changed
+    """
+    old_running = {service['name']: service['running'] for service in old.services} if old else {}
+    changes = {service['name']: service['running'] for service in new.services
+               if old is None or old_running.get(service['name'], object()) != service['running']}
+
+    diff = {"server_id": new.server_id, "checked_at": new.checked_at, "changes": changes}
+    if old is None or old.error != new.error:
+        diff["error"] = new.error
+        diff["message"] = new.message
+    if old is None or old.jboss_status != new.jboss_status:
+        diff["jboss_status"] = new.jboss_status
+
+    if not changes and len(diff) == 3:
+        return None
+    return diff
+
+
+class StatusSubscription:
+    """Queue of status change events for one stream subscriber"""
+
+    def __init__(self, server_id: Optional[str] = None):
+        """
+        Initialize the subscription
+
+        Args:
+            server_id (str, optional): Only receive changes for this server; None for all servers
+        """
+        self.server_id = server_id
+        self.events: "queue.Queue[Dict]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when events were dropped because the subscriber fell behind
+        self.overflowed = False
+
+    def publish(self, diff: Dict) -> None:
+        """
+        Queue a change event without ever blocking the poller
+
+        Args:
+            diff (Dict): Change event from diff_snapshots
+        """
+        if self.server_id is not None and diff['server_id'] != self.server_id:
+            return
+        try:
+            self.events.put_nowait(diff)
+        except queue.Full:
+            self.overflowed = True
+
+
+class StatusPoller:
+    """Background poller that keeps a status snapshot cache for every configured server"""
+
+    def __init__(self, check_func: Callable[[str, str, str], StatusSnapshot] = check_server_status,
+                 max_workers: int = 4, breakers: Optional[CircuitBreakerRegistry] = None,
+                 credential_source: Optional[Callable[[], Optional[Tuple[str, str]]]] = None,
+                 async_check_func: Optional[Callable[[str, str, str], Awaitable[StatusSnapshot]]] = None):
+        """
+        Initialize the poller
+
+        Args:
+            check_func (Callable): Function (server_id, username, password) -> StatusSnapshot
+            max_workers (int): Maximum number of servers refreshed at the same time
+            breakers (CircuitBreakerRegistry, optional): Per-server circuit breakers, default settings if None
+            credential_source (Callable, optional): Function returning the (username, password) used
+                for background refreshes, e.g. a shared credential store; if None, the credentials
+                registered with add_credentials() are used
+            async_check_func (Callable, optional): Coroutine function with the signature of
+                check_func; if set, every check runs on the shared event loop. Background refreshes
+                are then not limited by max_workers, and callers of refresh() only wait for the result
+        """
+        self._check_func = check_func
+        self._async_check_func = async_check_func
+        self._max_workers = max_workers
+        self.breakers = breakers or CircuitBreakerRegistry()
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, StatusSnapshot] = {}
+        self._last_good: Dict[str, StatusSnapshot] = {}
+        self._intervals: Dict[str, float] = {}
+        self._in_flight: Dict[str, _SharedCheck] = {}
+        self._next_due: Dict[str, float] = {}
+        self._credentials: Dict[str, str] = {}
+        self._credential_source = credential_source
+        self._subscribers: List[StatusSubscription] = []
+        self._listeners: List[Callable[[StatusSnapshot], None]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def async_mode(self) -> bool:
+        """
+        Returns:
+            bool: True if checks run as coroutines on the shared event loop
+        """
+        return self._async_check_func is not None
+
+    def add_credentials(self, username: str, password: str) -> None:
+        """
+        Register credentials used for background refreshes; the latest login wins
+
+        Args:
+            username (str): Username for authentication
+            password (str): Password for authentication
+        """
+        with self._lock:
+            self._credentials.pop(username, None)
+            self._credentials[username] = password
+
+    def remove_credentials(self, username: str) -> None:
+        """
+        Forget the credentials of a user, e.g. on logout
+
+        Args:
+            username (str): Username to remove
+        """
+        with self._lock:
+            self._credentials.pop(username, None)
+
+    def _current_credentials(self) -> Optional[Tuple[str, str]]:
+        """
+        Get the most recently registered credentials
+
+        Returns:
+            Optional[Tuple[str, str]]: (username, password) or None if nobody is logged in
+        """
+        if self._credential_source is not None:
+            return self._credential_source()
+        with self._lock:
+            if not self._credentials:
+                return None
+            username = next(reversed(self._credentials))
+            return username, self._credentials[username]
+
+    @staticmethod
+    def poll_interval(server_id: str) -> float:
+        """
+        Get the refresh interval of a server
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            float: Interval in seconds from the "poll_interval" config key or the default
+        """
+        server_info = ServerConfig.get_instance().get_server_info(server_id) or {}
+        return float(server_info.get('poll_interval', DEFAULT_POLL_INTERVAL))
+
+    def current_interval(self, server_id: str) -> float:
+        """
+        Get the adaptive refresh interval a server is currently polled at
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            float: Interval in seconds, the configured poll interval until the first check
+        """
+        with self._lock:
+            interval = self._intervals.get(server_id)
+        return interval if interval is not None else self.poll_interval(server_id)
+
+    def _next_interval(self, server_id: str, previous: Optional[StatusSnapshot],
+                       snapshot: StatusSnapshot, changed: bool) -> float:
+        """
+        Adapt a server's poll interval: fast right after a state change, slower while stable
+
+        Args:
+            server_id (str): ID of the server
+            previous (Optional[StatusSnapshot]): Snapshot before this check
+            snapshot (StatusSnapshot): Snapshot of this check
+            changed (bool): True if a service or the JBoss status changed
+
+        Returns:
+            float: Seconds until the next check
+        """
+        base = self.poll_interval(server_id)
+        server_info = ServerConfig.get_instance().get_server_info(server_id) or {}
+        fastest = float(server_info.get('min_poll_interval', max(MIN_POLL_INTERVAL, base * FAST_POLL_FACTOR)))
+        slowest = float(server_info.get('max_poll_interval', base * MAX_STABLE_FACTOR))
+
+        if snapshot.error or previous is None or previous.error:
+            interval = base
+        elif changed:
+            interval = fastest
+        else:
+            interval = min(slowest, self.current_interval(server_id) * STABLE_GROWTH_FACTOR)
+        with self._lock:
+            self._intervals[server_id] = interval
+        return interval
+
+    def _timed_out_snapshot(self, server_id: str) -> StatusSnapshot:
+        """
+        Build the snapshot returned to a caller whose deadline passed while waiting on a shared check
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            StatusSnapshot: Timed-out services with the last successful snapshot attached
+        """
+        services = [{"name": service['name'], "running": None, "timed_out": True}
+                    for service in ServerConfig.get_instance().get_server_services(server_id)]
+        snapshot = StatusSnapshot(server_id, services, error="timed_out",
+                                  message="Status check did not finish before the deadline")
+        with self._lock:
+            snapshot.last_known = self._last_good.get(server_id)
+        return snapshot
+
+    def _circuit_open_snapshot(self, server_id: str, breaker: CircuitBreaker) -> StatusSnapshot:
+        """
+        Build the snapshot returned instead of a check while a server's breaker is open
+
+        Args:
+            server_id (str): ID of the server
+            breaker (CircuitBreaker): The server's open breaker
+
+        Returns:
+            StatusSnapshot: N/A services with the last successful snapshot and next probe time attached
+        """
+        services = [{"name": service['name'], "running": None}
+                    for service in ServerConfig.get_instance().get_server_services(server_id)]
+        retry_in = max(0, round(breaker.retry_at - time.time()))
+        snapshot = StatusSnapshot(server_id, services, error="circuit_open",
+                                  message=f"Server is unreachable; next connection attempt in {retry_in}s",
+                                  duration=0.0)
+        with self._lock:
+            snapshot.last_known = self._last_good.get(server_id)
+        snapshot.retry_at = breaker.retry_at
+        return snapshot
+
+    def _shed_snapshot(self, server_id: str, breaker: CircuitBreaker, snapshot: StatusSnapshot) -> StatusSnapshot:
+        """
+        Handle a check the admission controller shed: the cached snapshot, the breaker and
+        subscribers are left alone, and the server is tried again after the minimum interval
+
+        Args:
+            server_id (str): ID of the server
+            breaker (CircuitBreaker): The server's breaker
+            snapshot (StatusSnapshot): "overloaded" snapshot of the shed check
+
+        Returns:
+            StatusSnapshot: The snapshot with the last successful snapshot attached
+        """
+        snapshot.duration = 0.0
+        with self._lock:
+            self._next_due[server_id] = time.time() + MIN_POLL_INTERVAL
+        return self._unpublished_snapshot(server_id, breaker, snapshot)
+
+    def _unpublished_snapshot(self, server_id: str, breaker: CircuitBreaker,
+                              snapshot: StatusSnapshot) -> StatusSnapshot:
+        """
+        Return a check's snapshot to its callers only: it is not cached, published, written
+        to the history or counted by the breaker, whose probe (if this check was one) is released
+
+        Args:
+            server_id (str): ID of the server
+            breaker (CircuitBreaker): The server's breaker
+            snapshot (StatusSnapshot): Snapshot of the check
+
+        Returns:
+            StatusSnapshot: The snapshot with the last successful snapshot attached
+        """
+        breaker.release_probe()
+        with self._lock:
+            snapshot.last_known = self._last_good.get(server_id)
+        return snapshot
+
+    def _failed_check_snapshot(self, server_id: str) -> StatusSnapshot:
+        """
+        Build the snapshot returned to followers of a shared check that raised
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            StatusSnapshot: N/A services with the last successful snapshot attached
+        """
+        services = [{"name": service['name'], "running": None}
+                    for service in ServerConfig.get_instance().get_server_services(server_id)]
+        snapshot = StatusSnapshot(server_id, services, error="check_failed",
+                                  message="The shared status check failed")
+        with self._lock:
+            snapshot.last_known = self._last_good.get(server_id)
+        return snapshot
+
+    def get_cached(self, server_id: str) -> Optional[StatusSnapshot]:
+        """
+        Get the cached snapshot of a server without triggering a check
+
+        Args:
+            server_id (str): ID of the server
+
+        Returns:
+            Optional[StatusSnapshot]: Cached snapshot or None
+        """
+        with self._lock:
+            return self._snapshots.get(server_id)
+
+    def get_snapshot(self, server_id: str, username: str, password: str,
+                     max_age: Optional[float] = None) -> StatusSnapshot:
+        """
+        Get the snapshot of a server, checking it only on a cache miss
+
+        Args:
+            server_id (str): ID of the server
+            username (str): Username used if a check is needed
+            password (str): Password used if a check is needed
+            max_age (float, optional): Maximum acceptable snapshot age in seconds,
+                defaults to STALE_AFTER_INTERVALS current (adaptive) poll intervals
+
+        Returns:
+            StatusSnapshot: Cached or freshly checked snapshot
+        """
+        if max_age is None:
+            max_age = self.current_interval(server_id) * STALE_AFTER_INTERVALS
+        snapshot = self.get_cached(server_id)
+        if snapshot is not None and snapshot.age <= max_age:
+            annotate(cache='hit', snapshot_age=round(snapshot.age, 1))
+            return snapshot
+        annotate(cache='miss')
+        return self.refresh(server_id, username, password)
+
+    def refresh(self, server_id: str, username: str, password: str) -> StatusSnapshot:
+        """
+        Check a server now; concurrent callers for the same server share one check.
+        While the server's circuit breaker is open the check is skipped and a
+        "circuit_open" snapshot is returned right away.
+
+        Args:
+            server_id (str): ID of the server
+            username (str): Username for authentication
+            password (str): Password for authentication
+
+        Returns:
+            StatusSnapshot: Snapshot produced by the shared check
+        """
+        check, leader = self._join(server_id)
+        if not leader:
+            with span("wait for shared check", server=server_id):
+                return self._follow(server_id, check)
+
+        try:
+            with span("status check", server=server_id):
+                breaker = self.breakers.get(server_id)
+                if breaker.allow():
+                    started = time.monotonic()
+                    caller_bound = _caller_bound()
+                    if self.async_mode:
+                        # The calling thread only waits; the remote I/O runs on the event loop
+                        snapshot = get_runtime().run(self._async_check_func(server_id, username, password))
+                    else:
+                        snapshot = self._check_func(server_id, username, password)
+                    check.snapshot = self._finish_check(server_id, breaker, snapshot, started, caller_bound)
+                else:
+                    check.snapshot = self._publish(server_id, breaker, self._circuit_open_snapshot(server_id, breaker))
+                annotate(error=check.snapshot.error)
+                return check.snapshot
+        finally:
+            self._leave(server_id, check)
+
+    async def refresh_async(self, server_id: str, username: str, password: str) -> StatusSnapshot:
+        """
+        Same as refresh, run as a coroutine on the event loop with the poller's async check
+        function (see async_runtime.py)
+        """
+        check, leader = self._join(server_id)
+        if not leader:
+            with span("wait for shared check", server=server_id):
+                return await asyncio.to_thread(self._follow, server_id, check)
+
+        try:
+            with span("status check", server=server_id):
+                breaker = self.breakers.get(server_id)
+                if breaker.allow():
+                    started = time.monotonic()
+                    caller_bound = _caller_bound()
+                    snapshot = await self._async_check_func(server_id, username, password)
+                    check.snapshot = self._finish_check(server_id, breaker, snapshot, started, caller_bound)
+                else:
+                    check.snapshot = self._publish(server_id, breaker, self._circuit_open_snapshot(server_id, breaker))
+                annotate(error=check.snapshot.error)
+                return check.snapshot
+        finally:
+            self._leave(server_id, check)
+
+    async def get_snapshot_async(self, server_id: str, username: str, password: str,
+                                 max_age: Optional[float] = None) -> StatusSnapshot:
+        """
+        Same as get_snapshot, checking a cache miss with refresh_async
+        """
+        if max_age is None:
+            max_age = self.current_interval(server_id) * STALE_AFTER_INTERVALS
+        snapshot = self.get_cached(server_id)
+        if snapshot is not None and snapshot.age <= max_age:
+            annotate(cache='hit', snapshot_age=round(snapshot.age, 1))
+            return snapshot
+        annotate(cache='miss')
+        return await self.refresh_async(server_id, username, password)
+
+    def _join(self, server_id: str) -> Tuple[_SharedCheck, bool]:
+        """
+        Join the in-flight check of a server, or become its leader if there is none
+
+        Returns:
+            Tuple[_SharedCheck, bool]: The shared check, and True for the leader
+        """
+        with self._lock:
+            check = self._in_flight.get(server_id)
+            if check is not None:
+                return check, False
+            check = self._in_flight[server_id] = _SharedCheck()
+            return check, True
+
+    def _follow(self, server_id: str, check: _SharedCheck) -> StatusSnapshot:
+        """Wait for the shared check no longer than the caller's own deadline and return its snapshot"""
+        if not check.done.wait(remaining()):
+            return self._timed_out_snapshot(server_id)
+        if check.snapshot is None:
+            # The leader's check raised; its error was logged there
+            return self._failed_check_snapshot(server_id)
+        return check.snapshot
+
+    def _leave(self, server_id: str, check: _SharedCheck) -> None:
+        """Finish the leader's check and wake its followers"""
+        with self._lock:
+            self._in_flight.pop(server_id, None)
+        check.done.set()
+
+    def _finish_check(self, server_id: str, breaker: CircuitBreaker, snapshot: StatusSnapshot,
+                      started: float, caller_bound: bool) -> StatusSnapshot:
+        """
+        Publish a finished check, unless it says nothing about the server: a check shed under
+        load, or one cut off by a caller's deadline shorter than a check is normally given
+
+        Args:
+            server_id (str): ID of the server
+            breaker (CircuitBreaker): The server's breaker
+            snapshot (StatusSnapshot): Result of the check
+            started (float): time.monotonic() when the check started
+            caller_bound (bool): True if the caller's deadline was shorter than DEFAULT_STATUS_TIMEOUT
+
+        Returns:
+            StatusSnapshot: The snapshot for the callers
+        """
+        if snapshot.error == "overloaded":
+            return self._shed_snapshot(server_id, breaker, snapshot)
+        if snapshot.error == "timed_out" and caller_bound:
+            return self._unpublished_snapshot(server_id, breaker, snapshot)
+        self._record_check(server_id, breaker, snapshot, started)
+        return self._publish(server_id, breaker, snapshot)
+
+    def _record_check(self, server_id: str, breaker: CircuitBreaker, snapshot: StatusSnapshot,
+                      started: float) -> None:
+        """Set the check's duration and feed its outcome to the server's circuit breaker"""
+        if snapshot.duration is None:
+            snapshot.duration = time.monotonic() - started
+        if snapshot.error in BREAKER_FAILURES:
+            breaker.record_failure()
+            if breaker.state == OPEN:
+                logger.warning(f"Circuit opened for {server_id} after {breaker.failures} failed checks",
+                               extra={'server': server_id, 'retry_at': breaker.retry_at})
+        else:
+            breaker.record_success()
+
+    def _publish(self, server_id: str, breaker: CircuitBreaker, snapshot: StatusSnapshot) -> StatusSnapshot:
+        """
+        Cache a new snapshot, schedule the server's next check and notify listeners and subscribers
+
+        Returns:
+            StatusSnapshot: The snapshot
+        """
+        with self._lock:
+            previous = self._snapshots.get(server_id)
+        diff = diff_snapshots(previous, snapshot)
+        changed = diff is not None and bool(diff["changes"] or "jboss_status" in diff)
+        interval = self._next_interval(server_id, previous, snapshot, changed)
+        with self._lock:
+            self._snapshots[server_id] = snapshot
+            if not snapshot.error:
+                self._last_good[server_id] = snapshot
+            # An open breaker is probed again when its backoff ends, not on the poll interval
+            self._next_due[server_id] = (breaker.retry_at if breaker.state == OPEN
+                                         else snapshot.checked_at + interval)
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.warning(f"Status listener failed for {server_id}: {str(e)}", extra={'server': server_id})
+        if diff is not None:
+            for subscription in subscribers:
+                subscription.publish(diff)
+        return snapshot
+
+    def add_listener(self, listener: Callable[[StatusSnapshot], None]) -> None:
+        """
+        Call a function with every snapshot the poller produces, e.g. to record history
+
+        Args:
+            listener (Callable): Function taking the new StatusSnapshot; it runs on the
+                checking thread (the event loop thread in async mode) and should return quickly
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def subscribe(self, server_id: Optional[str] = None) -> StatusSubscription:
+        """
+        Subscribe to status transitions detected by the poller
+
+        Args:
+            server_id (str, optional): Only receive changes for this server; None for all servers
+
+        Returns:
+            StatusSubscription: Subscription whose queue receives diff events
+        """
+        subscription = StatusSubscription(server_id)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StatusSubscription) -> None:
+        """
+        Stop delivering events to a subscription
+
+        Args:
+            subscription (StatusSubscription): Subscription returned by subscribe()
+        """
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def start(self) -> None:
+        """Start the background polling thread if it is not running yet"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                thread_name_prefix='status-poller')
+            self._thread = threading.Thread(target=self._run, name='status-poller', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background polling thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _run(self) -> None:
+        """Polling loop: refresh every server whose interval has elapsed"""
+        while not self._stop_event.is_set():
+            credentials = self._current_credentials()
+            if credentials is not None:
+                now = time.time()
+                for server_id in ServerConfig.get_instance().server_ids():
+                    interval = self.current_interval(server_id)
+                    with self._lock:
+                        due = self._next_due.get(server_id, 0)
+                        busy = server_id in self._in_flight
+                        if now >= due and not busy:
+                            # Push the due time out so the loop doesn't resubmit while queued
+                            self._next_due[server_id] = now + interval
+                    if now >= due and not busy:
+                        if self.async_mode:
+                            get_runtime().submit(self.refresh_async(server_id, *credentials))
+                        else:
+                            self._executor.submit(self.refresh, server_id, *credentials)
+            self._stop_event.wait(1)
@@ -0,0 +1,125 @@
+"""
+Module for streaming status transitions and start/stop job output to browsers as Server-Sent Events
+"""
+import json
+import queue
+from typing import Dict, Iterator, List, Optional
+
+from jobs import Job
+from models.server_config import ServerConfig
+from status_poller import StatusPoller
+
+# Seconds between heartbeat comments when no status changes
+HEARTBEAT_INTERVAL = 15
+
+
+def format_event(event: str, data: Dict) -> str:
+    """
+    Format one Server-Sent Event frame
+
+    Args:
+        event (str): Event name
+        data (Dict): JSON-serializable payload
+
+    Returns:
+        str: SSE frame
+    """
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _snapshot_events(poller: StatusPoller, server_ids: List[str]) -> Iterator[str]:
+    """Yield one "snapshot" event per server that has a cached snapshot"""
+    for server_id in server_ids:
+        snapshot = poller.get_cached(server_id)
+        if snapshot is not None:
+            yield format_event("snapshot", snapshot.to_dict())
+
+
+def _heartbeat_event(poller: StatusPoller, server_ids: List[str]) -> str:
+    """Build a heartbeat event carrying the last check time of each server"""
+    checked_at = {}
+    for server_id in server_ids:
+        snapshot = poller.get_cached(server_id)
+        if snapshot is not None:
+            checked_at[server_id] = snapshot.checked_at
+    return format_event("heartbeat", {"checked_at": checked_at})
+
+
+def stream_status(poller: StatusPoller, server_id: Optional[str] = None,
+                  heartbeat_interval: float = HEARTBEAT_INTERVAL) -> Iterator[str]:
+    """
+    Stream status transitions of one server, or of the whole fleet
+
+    The stream starts with a "snapshot" event per server, then sends a "status" event
+    with a compact diff for every transition the poller detects, and a "heartbeat" event
+    with the last check time of each server when nothing changed for heartbeat_interval
+    seconds. A subscriber that falls behind
+    gets fresh snapshots instead of the events it missed.
+
+    Args:
+        poller (StatusPoller): Poller publishing status changes
+        server_id (str, optional): Server to follow; None for every configured server
+        heartbeat_interval (float): Seconds between heartbeats
+
+    Yields:
+        str: SSE frames
+    """
+    server_ids = [server_id] if server_id else ServerConfig.get_instance().server_ids()
+    subscription = poller.subscribe(server_id)
+    try:
+        yield "retry: 5000\n\n"
+        yield from _snapshot_events(poller, server_ids)
+        while True:
+            try:
+                diff = subscription.events.get(timeout=heartbeat_interval)
+            except queue.Empty:
+                yield _heartbeat_event(poller, server_ids)
+                continue
+            if subscription.overflowed:
+                # Events were dropped: drain and resend the current state
+                subscription.overflowed = False
+                while not subscription.events.empty():
+                    subscription.events.get_nowait()
+                yield from _snapshot_events(poller, server_ids)
+                continue
+            yield format_event("status", diff)
+    finally:
+        poller.unsubscribe(subscription)
+
+
+def stream_job(job: Job, after: int = 0, heartbeat_interval: float = HEARTBEAT_INTERVAL) -> Iterator[str]:
+    """
+    Stream the output of a start/stop job while it runs
+
+    The stream starts with a "job" event carrying the job state. It then sends a "line"
+    event {"seq", "ts", "text"} for every output line as it arrives. Each line event has
+    its seq as the SSE id, so a reconnecting browser resumes after the last line it got.
+    Lines that already left the job's bounded buffer are reported as one "gap" event with
+    the number of dropped lines. A final "done" event carries the finished job, after
+    which the stream ends.
+
+    Args:
+        job (Job): Job to follow
+        after (int): Sequence number of the last line the client already has
+        heartbeat_interval (float): Seconds between keep-alive comments while no output arrives
+
+    Yields:
+        str: SSE frames
+    """
+    yield "retry: 2000\n\n"
+    yield format_event("job", job.to_dict())
+    seq = after
+    while True:
+        finished = job.finished
+        lines, dropped = job.lines_after(seq, timeout=heartbeat_interval)
+        if dropped:
+            yield format_event("gap", {"dropped": dropped})
+        for line_seq, timestamp, text in lines:
+            yield f"id: {line_seq}\n" + format_event("line", {"seq": line_seq, "ts": timestamp, "text": text})
+            seq = line_seq
+        if finished:
+            # Every line was written before the job finished, so nothing can follow
+            yield format_event("done", job.to_dict())
+            return
+        if not lines and not dropped and not job.finished:
+            yield ": keep-alive\n\n"
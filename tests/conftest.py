@@ -0,0 +1,127 @@
+"""
+Shared fixtures: a fast simulated executor and a fresh admission controller per test,
+so no test reaches PowerShell or inherits slots and breakers from another test. Logs,
+status history and SQLite stores are written to temporary directories, never into the repo.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import app_logging  # noqa: E402
+
+# Loggers and the app's stores are created when the modules under test are imported,
+# before any fixture runs
+_LOG_DIR = app_logging.LOG_DIR = tempfile.mkdtemp(prefix='eap-test-logs-')
+os.environ.update({
+    'EAP_HISTORY_DIR': os.path.join(_LOG_DIR, 'history'),
+    'EAP_OPERATION_DB': os.path.join(_LOG_DIR, 'operations.db'),
+    'EAP_CREDENTIAL_DB': os.path.join(_LOG_DIR, 'credentials.db'),
+    'EAP_JOB_DB': os.path.join(_LOG_DIR, 'jobs.db'),
+    'EAP_EXECUTOR': 'simulated',
+    'EAP_PREFETCH': '0'
+})
+
+import admission  # noqa: E402
+import remote_executor  # noqa: E402
+from jboss_http_client import JBossManagementClient  # noqa: E402
+from jboss_stub_server import serve  # noqa: E402
+from remote_executor import SimulatedExecutor, SimulatedServerProfile  # noqa: E402
+
+
+def pytest_unconfigure(config):
+    # Records still queued at exit go to the already open (now unlinked) files
+    shutil.rmtree(_LOG_DIR, ignore_errors=True)
+
+
+def fast_profile(**overrides) -> SimulatedServerProfile:
+    """
+    Returns:
+        SimulatedServerProfile: Profile answering in about 10 ms, with the given settings changed
+    """
+    settings = dict(latency=0.01, jitter=0.0, session_latency=0.0, action_latency=0.01)
+    settings.update(overrides)
+    return SimulatedServerProfile(**settings)
+
+
+def walk_pages(fetch, key):
+    """
+    Follow next_cursor from the first page to the last
+
+    Args:
+        fetch (Callable): Function cursor -> page, called with None for the first page
+        key (str): Key of the page's item list
+
+    Returns:
+        List: Every item of every page, in page order
+    """
+    items, cursor = [], None
+    while True:
+        page = fetch(cursor)
+        items.extend(page[key])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items
+
+
+@pytest.fixture(autouse=True)
+def temporary_stores(tmp_path, monkeypatch):
+    """Point the status history and the SQLite stores at the test's temporary directory"""
+    monkeypatch.setenv('EAP_HISTORY_DIR', str(tmp_path / 'history'))
+    monkeypatch.setenv('EAP_OPERATION_DB', str(tmp_path / 'operations.db'))
+    monkeypatch.setenv('EAP_CREDENTIAL_DB', str(tmp_path / 'credentials.db'))
+    monkeypatch.setenv('EAP_JOB_DB', str(tmp_path / 'jobs.db'))
+
+
+@pytest.fixture(autouse=True)
+def fresh_admission(monkeypatch):
+    """Process-wide admission controller with default limits and no calls in flight"""
+    controller = admission.AdmissionController()
+    monkeypatch.setattr(admission, '_admission', controller)
+    return controller
+
+
+@pytest.fixture
+def simulated(monkeypatch):
+    """Install a fast SimulatedExecutor as the process-wide executor"""
+    executor = SimulatedExecutor(default_profile=fast_profile(), seed=1)
+    monkeypatch.setattr(remote_executor, '_executor', executor)
+    return executor
+
+
+@pytest.fixture
+def jboss_stub():
+    """Stub JBoss management endpoint with Digest user admin/secret and server-configs h1/A and h1/B"""
+    server, state = serve(port=0, username='admin', password='secret',
+                          server_configs=[('h1', 'A'), ('h1', 'B')])
+    yield server, state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def jboss_client(jboss_stub):
+    """Management client sending every request to the stub"""
+    server, _ = jboss_stub
+    client = JBossManagementClient(controller_override=f"127.0.0.1:{server.server_address[1]}")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def client(simulated):
+    """Flask test client logged in as "alice", with her credentials in the shared store"""
+    import app as app_module
+
+    app_module.credential_store.put('alice', 'secret')
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = 'alice'
+        session['_fresh'] = True
+    return client
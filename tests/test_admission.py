@@ -0,0 +1,128 @@
+"""
+Tests for AdmissionController: priority order, shedding, queue limit and the async slot
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import ACTION, BACKGROUND, INTERACTIVE, AdmissionController, Overloaded
+
+
+def _wait_for_queued(controller, count):
+    """Wait until `count` calls are queued"""
+    deadline = time.monotonic() + 5
+    while sum(controller.stats()['queued'].values()) < count:
+        assert time.monotonic() < deadline, "calls were not queued in time"
+        time.sleep(0.01)
+
+
+def _take_slot(controller, server, priority, order, timeout=5):
+    """Thread target: hold a slot briefly and record the priority once granted"""
+    with controller.slot(server, priority, timeout):
+        order.append(priority)
+
+
+def test_freed_slot_goes_to_the_most_urgent_waiter():
+    controller = AdmissionController(max_concurrent=1, max_per_server=1, reserved_for_actions=0)
+    order = []
+    held = controller.slot('a', ACTION)
+    held.__enter__()
+
+    interactive = threading.Thread(target=_take_slot, args=(controller, 'a', INTERACTIVE, order))
+    interactive.start()
+    _wait_for_queued(controller, 1)
+    action = threading.Thread(target=_take_slot, args=(controller, 'a', ACTION, order))
+    action.start()
+    _wait_for_queued(controller, 2)
+
+    held.__exit__(None, None, None)
+    interactive.join(5)
+    action.join(5)
+    assert order == [ACTION, INTERACTIVE]
+    assert controller.stats()['running'] == {'action': 0, 'interactive': 0, 'background': 0}
+
+
+def test_background_poll_is_shed_instead_of_queued():
+    controller = AdmissionController(max_concurrent=1, max_per_server=1, reserved_for_actions=0)
+    with controller.slot('a', INTERACTIVE):
+        with pytest.raises(Overloaded):
+            with controller.slot('b', BACKGROUND):
+                pass
+    assert controller.stats()['shed']['background'] == 1
+
+
+def test_reserved_slots_are_kept_for_actions():
+    controller = AdmissionController(max_concurrent=2, max_per_server=2, reserved_for_actions=1)
+    with controller.slot('a', INTERACTIVE):
+        with pytest.raises(Overloaded):
+            with controller.slot('b', BACKGROUND):
+                pass
+        with controller.slot('b', ACTION):
+            assert controller.stats()['running']['action'] == 1
+
+
+def test_interactive_poll_is_shed_at_a_full_queue():
+    controller = AdmissionController(max_concurrent=1, max_per_server=1, reserved_for_actions=0, queue_limit=1)
+    order = []
+    with controller.slot('a', ACTION):
+        waiting = threading.Thread(target=_take_slot, args=(controller, 'a', INTERACTIVE, order))
+        waiting.start()
+        _wait_for_queued(controller, 1)
+        with pytest.raises(Overloaded):
+            with controller.slot('a', INTERACTIVE, 5):
+                pass
+    waiting.join(5)
+    assert order == [INTERACTIVE]
+    assert controller.stats()['shed']['interactive'] == 1
+
+
+def test_queued_calls_give_up_at_their_deadline():
+    controller = AdmissionController(max_concurrent=1, max_per_server=1, reserved_for_actions=0)
+    with controller.slot('a', ACTION):
+        with pytest.raises(Overloaded):
+            with controller.slot('a', INTERACTIVE, 0.05):
+                pass
+        # Actions are never shed, they time out
+        with pytest.raises(TimeoutError):
+            with controller.slot('a', ACTION, 0.05):
+                pass
+    assert controller.stats()['queued'] == {'action': 0, 'interactive': 0, 'background': 0}
+
+
+def test_per_server_limit_does_not_block_other_servers():
+    controller = AdmissionController(max_concurrent=4, max_per_server=1, reserved_for_actions=0)
+    with controller.slot('a', INTERACTIVE):
+        with pytest.raises(Overloaded):
+            with controller.slot('a', BACKGROUND):
+                pass
+        with controller.slot('b', BACKGROUND):
+            assert controller.stats()['running']['background'] == 1
+
+
+def test_async_slot_waits_on_the_event_loop_and_releases_when_cancelled():
+    controller = AdmissionController(max_concurrent=1, max_per_server=1, reserved_for_actions=0)
+
+    async def scenario():
+        held = controller.slot_async('a', ACTION)
+        await held.__aenter__()
+
+        async def wait_for_slot():
+            async with controller.slot_async('a', INTERACTIVE, 5):
+                pass
+
+        cancelled = asyncio.ensure_future(wait_for_slot())
+        granted = asyncio.ensure_future(wait_for_slot())
+        await asyncio.sleep(0.05)
+        assert controller.stats()['queued']['interactive'] == 2
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+        assert controller.stats()['queued']['interactive'] == 1
+
+        await held.__aexit__(None, None, None)
+        await asyncio.wait_for(granted, 5)
+
+    asyncio.run(scenario())
+    assert controller.stats()['running'] == {'action': 0, 'interactive': 0, 'background': 0}
+    assert controller.stats()['queued'] == {'action': 0, 'interactive': 0, 'background': 0}
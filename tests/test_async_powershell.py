@@ -0,0 +1,116 @@
+"""
+Tests for AsyncPowerShellHost and the asyncio path of the session pool, against a small
+Python program that speaks the host's stdin/done-marker protocol instead of powershell.exe.
+Hosts run on the app's async runtime, whose loop outlives them as it does in the app.
+"""
+import asyncio
+import sys
+import time
+
+import pytest
+
+from async_runtime import get_runtime
+from ps_session_pool import AsyncPowerShellHost, RemoteTimeoutError, SessionPool
+from remote_executor import STATUS, PowerShellExecutor, RemoteCall
+
+SERVER = 'prod92'
+
+# Runs the "echo <text>" and "sleep <seconds>" lines of each script; any other statement,
+# e.g. creating $session, succeeds silently
+FAKE_POWERSHELL = r'''
+import base64, re, sys, time
+for line in sys.stdin:
+    if line.startswith('if ($session) { Remove-PSSession'):
+        break
+    encoded = re.search(r"FromBase64String\('([^']*)'\)", line)
+    marker = re.search(r'Write-Output "(__EAP_DONE_\w+__):', line)
+    ok = True
+    for statement in base64.b64decode(encoded.group(1)).decode().splitlines():
+        if statement.startswith('echo '):
+            print(statement[5:], flush=True)
+        elif statement.startswith('sleep '):
+            time.sleep(float(statement[6:]))
+        elif statement.startswith('fail'):
+            ok = False
+        elif "'healthy'" in statement:
+            print('healthy', flush=True)
+    print(f"{marker.group(1)}:{ok}", flush=True)
+'''
+
+
+@pytest.fixture
+def fake_powershell(tmp_path, monkeypatch):
+    """Make AsyncPowerShellHost start the fake program instead of powershell.exe"""
+    program = tmp_path / 'fake_powershell.py'
+    program.write_text(FAKE_POWERSHELL)
+    monkeypatch.setattr(AsyncPowerShellHost, 'command', (sys.executable, str(program)))
+
+
+def test_host_streams_lines_and_reports_the_done_marker(fake_powershell):
+    async def run():
+        host = AsyncPowerShellHost('user', 'secret', SERVER)
+        await host.open(timeout=10)
+        lines = []
+        result = await host.run('echo one\necho two', timeout=10, on_line=lines.append)
+        failed = await host.run('fail', timeout=10)
+        healthy = await host.is_healthy()
+        host.close()
+        return lines, result, failed, healthy
+
+    lines, result, failed, healthy = get_runtime().run(run())
+
+    assert lines == ['one', 'two'] and result.output == 'one\ntwo' and result.ok
+    assert not failed.ok
+    assert healthy
+
+
+def test_timed_out_script_kills_the_host_and_keeps_its_output(fake_powershell):
+    async def run():
+        host = AsyncPowerShellHost('user', 'secret', SERVER)
+        await host.open(timeout=10)
+        process = host._process
+        with pytest.raises(RemoteTimeoutError) as raised:
+            await host.run('echo before\nsleep 30', timeout=0.5)
+        await asyncio.wait_for(process.wait(), 5)
+        return raised.value, await host.is_healthy()
+
+    error, healthy = get_runtime().run(run())
+
+    assert error.output == 'before'
+    assert not healthy
+
+
+def test_pool_runs_concurrent_scripts_on_the_loop(fake_powershell):
+    pool = SessionPool(host_factory=AsyncPowerShellHost)
+
+    async def run():
+        servers = [f'server{i}' for i in range(4)]
+        # Open every host first, so the timing below only covers the scripts
+        await asyncio.gather(*(pool.run_async('user', 'secret', server, 'echo warm', timeout=10)
+                               for server in servers))
+        started = time.monotonic()
+        results = await asyncio.gather(*(pool.run_async('user', 'secret', server, 'sleep 0.5\necho done',
+                                                        timeout=10) for server in servers))
+        return results, time.monotonic() - started
+
+    results, elapsed = get_runtime().run(run())
+    pool.close_all()
+
+    assert [result.output for result in results] == ['done'] * 4
+    assert elapsed < 1.5
+    assert pool.stats()['spawned'] == 4
+
+
+def test_sync_calls_go_through_the_event_loop_in_async_mode(fake_powershell):
+    pool = SessionPool(host_factory=AsyncPowerShellHost)
+    executor = PowerShellExecutor(async_pool=pool, async_mode=True)
+
+    for _ in range(2):
+        result = executor.execute(RemoteCall('user', 'secret', SERVER, 'echo STARTED', STATUS,
+                                             deadline=time.monotonic() + 10))
+        assert result.ok and result.output == 'STARTED'
+
+    assert executor.warm('user', 'secret', SERVER, timeout=10)
+    assert executor.stats()['calls'] == 2
+    assert executor.stats()['spawned'] == 1
+    pool.close_all()
@@ -0,0 +1,53 @@
+"""
+Tests for batched per-controller status reads, against the stub in benchmarks/jboss_stub_server.py
+"""
+import json
+
+from jboss_http_client import JBossHttpExecutor, parse_cli_command
+from powershellStatusChecker import parse_status_payload
+from remote_executor import START, STATUS, RemoteCall, SimulatedExecutor
+
+from conftest import fast_profile
+
+CHECK = ("cd 'D:\\EAP\\bin'; .\\jboss-cli.ps1 --connect --controller=dc:9990 "
+         "/host=h1/server-config={}:read-attribute(name=status)")
+START_COMMAND = ("cd 'D:\\EAP\\bin'; .\\jboss-cli.ps1 --connect --controller=dc:9990 "
+                 "/host=h1/server-config={}:start")
+
+
+def test_executor_answers_status_checks_from_one_batch_per_controller(jboss_stub, jboss_client):
+    _, state = jboss_stub
+    executor = JBossHttpExecutor(jboss_client, fallback=SimulatedExecutor(fast_profile()))
+
+    payloads = [parse_status_payload(executor.execute(RemoteCall(
+        'admin', 'secret', server, '', STATUS,
+        arguments={"services": ["EAP Service"], "jboss_cli_command": CHECK.format(server)})).output)
+        for server in ('A', 'B')]
+
+    assert [payload['jboss']['status'] for payload in payloads] == ['STARTED', 'STARTED']
+    assert payloads[0]['services']['EAP Service']['running'] is True
+    # One wildcard read answered both servers
+    assert state.requests == 1
+    assert executor.stats()['server_configs_cached'] == 2
+
+
+def test_start_invalidates_the_batch_and_transitional_statuses_are_read_directly(jboss_stub, jboss_client):
+    _, state = jboss_stub
+    state.statuses[(('host', 'h1'), ('server-config', 'A'))] = 'STOPPED'
+    executor = JBossHttpExecutor(jboss_client, fallback=SimulatedExecutor(fast_profile()))
+    cache = executor.status_cache
+    operation = parse_cli_command(CHECK.format('A'))
+
+    assert cache.read_status(operation, 'admin', 'secret')['result'] == 'STOPPED'
+    result = executor.execute(RemoteCall('admin', 'secret', 'A', '', START,
+                                         arguments={"command": START_COMMAND.format('A')}))
+    assert result.ok and json.loads(result.output)['result'] == 'STARTED'
+    assert executor.stats()['controllers_cached'] == 0
+
+    # A freshly fetched batch answers even a transitional status; the cached copy is not reused
+    state.statuses[(('host', 'h1'), ('server-config', 'A'))] = 'STARTING'
+    assert cache.read_status(operation, 'admin', 'secret')['result'] == 'STARTING'
+    assert cache.read_status(operation, 'admin', 'secret') is None
+    requests = state.requests
+    assert jboss_client.execute(operation, 'admin', 'secret')['result'] == 'STARTING'
+    assert state.requests == requests + 1
@@ -0,0 +1,85 @@
+"""
+Tests for watching a server converge after a start/stop, and the job states it leads to
+"""
+import threading
+
+from convergence import CANCELLED, READY, TIMED_OUT, watch_convergence
+from jobs import SUCCEEDED, UNCONFIRMED, JobQueue
+from remote_executor import START, RemoteCall
+from status_poller import check_server_status
+
+from conftest import fast_profile
+
+SERVER = 'prod92'
+
+
+def _start(executor):
+    """Send a start the way manage_jboss does; returns once the start script returned"""
+    result = executor.execute(RemoteCall('user', 'secret', SERVER, '', START, arguments={'command': 'start'}))
+    assert result.ok
+
+
+def test_watch_follows_a_slow_start_until_ready(simulated):
+    simulated.profiles[SERVER] = fast_profile(jboss_status='STOPPED', settle_time=0.3)
+    _start(simulated)
+
+    convergence = watch_convergence(SERVER, 'start', 'user', 'secret', check_server_status, timeout=5)
+
+    assert convergence.status == READY
+    assert [transition['state'] for transition in convergence.transitions] == ['STARTING', 'STARTED']
+    assert convergence.time_to_ready >= 0.3
+    assert convergence.checks >= 2
+
+
+def test_watch_times_out_while_the_server_is_still_starting(simulated):
+    simulated.profiles[SERVER] = fast_profile(jboss_status='STOPPED', settle_time=30)
+    _start(simulated)
+
+    convergence = watch_convergence(SERVER, 'start', 'user', 'secret', check_server_status, timeout=0.3)
+
+    assert convergence.status == TIMED_OUT
+    assert convergence.time_to_ready is None
+    assert [transition['state'] for transition in convergence.transitions] == ['STARTING']
+
+
+def test_watch_stops_when_cancelled(simulated):
+    simulated.profiles[SERVER] = fast_profile(jboss_status='STOPPED', settle_time=30)
+    _start(simulated)
+    cancelled = threading.Event()
+    threading.Timer(0.2, cancelled.set).start()
+
+    convergence = watch_convergence(SERVER, 'start', 'user', 'secret', check_server_status, timeout=30,
+                                    cancelled=cancelled)
+
+    assert convergence.status == CANCELLED
+
+
+def test_job_ends_with_the_convergence_result():
+    queue = JobQueue(lambda job: 'output', converge=lambda job: UNCONFIRMED)
+    job, created = queue.submit(SERVER, 'start', 'user', 'secret')
+
+    assert created and job.wait(5)
+    assert job.status == UNCONFIRMED
+    assert job.finished and job.password is None
+
+
+def test_next_job_cancels_the_previous_watch_and_dedups_against_it():
+    watching = threading.Event()
+
+    def converge(job):
+        watching.set()
+        return SUCCEEDED if job.cancel_watch.wait(5) else UNCONFIRMED
+
+    queue = JobQueue(lambda job: 'output', converge=converge)
+    start, _ = queue.submit(SERVER, 'start', 'user', 'secret')
+    assert watching.wait(5)
+
+    # The same action as the converging job collapses into it
+    assert queue.submit(SERVER, 'start', 'user', 'secret') == (start, False)
+
+    stop, created = queue.submit(SERVER, 'stop', 'user', 'secret')
+    assert created
+    assert start.wait(5) and start.cancel_watch.is_set()
+    assert start.status == SUCCEEDED
+    stop.cancel_watch.set()
+    assert stop.wait(5)
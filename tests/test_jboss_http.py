@@ -0,0 +1,32 @@
+"""
+Tests for the JBoss HTTP management client against the stub in benchmarks/jboss_stub_server.py
+"""
+import pytest
+
+from jboss_http_client import parse_cli_command
+
+CHECK = ("cd 'D:\\EAP\\bin'; .\\jboss-cli.ps1 --connect --controller=dc:9990 "
+         "/host=h1/server-config={}:read-attribute(name=status)")
+
+
+def test_parse_cli_command_builds_the_dmr_operation():
+    operation = parse_cli_command(CHECK.format('A'))
+
+    assert (operation.host, operation.port) == ('dc', 9990)
+    assert operation.to_dmr() == {"operation": "read-attribute", "name": "status",
+                                  "address": [{"host": "h1"}, {"server-config": "A"}]}
+
+
+def test_client_authenticates_and_reuses_its_connection(jboss_stub, jboss_client):
+    _, state = jboss_stub
+    for _ in range(3):
+        response = jboss_client.execute(parse_cli_command(CHECK.format('A')), 'admin', 'secret')
+        assert response == {"outcome": "success", "result": "STARTED"}
+
+    assert state.requests == 3
+    assert jboss_client.stats()['connections_opened'] == 1
+
+
+def test_client_reports_rejected_credentials(jboss_client):
+    with pytest.raises(ConnectionError):
+        jboss_client.execute(parse_cli_command(CHECK.format('A')), 'admin', 'wrong')
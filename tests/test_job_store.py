@@ -0,0 +1,141 @@
+"""
+Tests for sharing jobs and rollouts between worker processes through the job store. Each
+worker is a JobQueue with its own JobStore (and so its own owner ID) on the same database.
+"""
+import threading
+import time
+
+import pytest
+
+from job_store import WORKER_EXITED, JobStore, StoredJob
+from jobs import FAILED, QUEUED, SUCCEEDED, Job, JobQueue
+from rolling_operations import RolloutManager
+from status_poller import StatusSnapshot
+from status_stream import stream_job
+
+SERVER = 'prod92'
+
+
+class BlockingRunner:
+    """Job runner that writes the given lines, then holds each job until released"""
+
+    def __init__(self, lines=()):
+        self.lines = lines
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, job):
+        for line in self.lines:
+            job.append_line(line)
+        self.started.set()
+        self.release.wait(5)
+        return 'output'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+def test_other_worker_finds_and_dedups_into_a_running_job(db_path):
+    runner = BlockingRunner()
+    worker_a = JobQueue(runner, store=JobStore(db_path))
+    worker_b = JobQueue(lambda job: 'output', store=JobStore(db_path))
+    job, _ = worker_a.submit(SERVER, 'start', 'user', 'secret')
+    assert runner.started.wait(5)
+
+    same, created = worker_b.submit(SERVER, 'start', 'user', 'secret')
+
+    assert not created and isinstance(same, StoredJob)
+    assert same.id == job.id and same.status == 'running'
+    runner.release.set()
+    assert same.wait(5) and same.status == SUCCEEDED
+    assert worker_b.get(job.id).to_dict()['output'] == 'output'
+
+
+def test_server_runs_one_job_at_a_time_across_workers(db_path):
+    runner_a, runner_b = BlockingRunner(), BlockingRunner()
+    worker_a = JobQueue(runner_a, store=JobStore(db_path))
+    worker_b = JobQueue(runner_b, store=JobStore(db_path))
+    stop, _ = worker_a.submit(SERVER, 'stop', 'user', 'secret')
+    assert runner_a.started.wait(5)
+
+    start, created = worker_b.submit(SERVER, 'start', 'user', 'secret')
+
+    assert created
+    assert not runner_b.started.wait(1)
+    assert worker_a.get(start.id).status == QUEUED
+    runner_a.release.set()
+    runner_b.release.set()
+    assert stop.wait(5) and start.wait(5)
+    assert start.started_at >= stop.finished_at
+
+
+def test_stream_follows_a_job_of_another_worker(db_path):
+    runner = BlockingRunner(lines=['one', 'two'])
+    worker_a = JobQueue(runner, store=JobStore(db_path))
+    worker_b = JobQueue(lambda job: 'output', store=JobStore(db_path))
+    job, _ = worker_a.submit(SERVER, 'start', 'user', 'secret')
+    assert runner.started.wait(5)
+    stored = worker_b.get(job.id)
+    frames = []
+    reader = threading.Thread(target=lambda: frames.extend(stream_job(stored, heartbeat_interval=0.2)))
+    reader.start()
+
+    time.sleep(1)
+    runner.release.set()
+    reader.join(5)
+
+    assert not reader.is_alive()
+    assert [frame.split('"text":"')[1][:3] for frame in frames if 'event: line' in frame] == ['one', 'two']
+    assert 'event: done' in frames[-1] and '"status":"succeeded"' in frames[-1]
+
+
+def test_job_of_another_worker_cancels_the_watch(db_path):
+    watching = threading.Event()
+
+    def converge(job):
+        watching.set()
+        return SUCCEEDED if job.cancel_watch.wait(5) else FAILED
+
+    worker_a = JobQueue(lambda job: 'output', converge=converge, store=JobStore(db_path))
+    worker_b = JobQueue(lambda job: 'output', store=JobStore(db_path))
+    start, _ = worker_a.submit(SERVER, 'start', 'user', 'secret')
+    assert watching.wait(5)
+
+    stop, created = worker_b.submit(SERVER, 'stop', 'user', 'secret')
+
+    assert created and stop.wait(5)
+    assert start.wait(5) and start.status == SUCCEEDED
+
+
+def test_jobs_of_an_exited_worker_fail_and_free_the_server(db_path):
+    exited = JobStore(db_path, lease_ttl=0.2)
+    job = Job(SERVER, 'start', 'user', 'secret')
+    assert exited.insert_job(job) is None and exited.acquire_server(SERVER, job.id)
+    time.sleep(0.3)
+    worker = JobQueue(lambda job: 'output', store=JobStore(db_path))
+
+    stored = worker.get(job.id)
+    start, created = worker.submit(SERVER, 'start', 'user', 'secret')
+
+    assert stored.status == FAILED and stored.error == WORKER_EXITED
+    assert created and start.wait(5) and start.status == SUCCEEDED
+
+
+def test_rollout_of_another_worker_is_found(db_path):
+    def status_check(server_id, username, password):
+        return StatusSnapshot(server_id, [], jboss_status='STARTED')
+
+    rollouts_a = RolloutManager(JobQueue(lambda job: 'output', store=JobStore(db_path)), status_check)
+    rollouts_b = RolloutManager(JobQueue(lambda job: 'output', store=JobStore(db_path)), status_check)
+    rollout = rollouts_a.start('start', ['a', 'b', 'c'], 'user', 'secret', wave_size=2)
+    assert rollouts_b.get(rollout.id).status == 'running'
+    deadline = time.monotonic() + 5
+    while rollouts_b.get(rollout.id).to_dict()['finished_at'] is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    found = rollouts_b.get(rollout.id)
+
+    assert found.to_dict() == rollout.to_dict()
+    assert found.status == 'succeeded'
@@ -0,0 +1,54 @@
+"""
+Tests for the operation history store, its cursor pagination and how start/stop records to it
+"""
+import pytest
+
+import manage_jboss
+from models.server_inventory import InvalidCursor
+from operation_history import OperationHistory
+
+from conftest import walk_pages
+
+
+def test_operation_history_pages_newest_first_across_equal_start_times(tmp_path):
+    history = OperationHistory(str(tmp_path / 'operations.db'))
+    # Four operations per start time, so page boundaries fall between rows with equal start times
+    keys = []
+    for i in range(23):
+        started_at = 1000.0 + i // 4
+        keys.append((started_at, history.record(f"srv{i % 3}", 'start', 'alice', 'succeeded',
+                                                started_at=started_at, duration=1.0)))
+
+    operations = walk_pages(lambda cursor: history.query(cursor=cursor, limit=5), 'operations')
+
+    assert [(operation['started_at'], operation['id']) for operation in operations] == sorted(keys, reverse=True)
+
+
+def test_operation_history_filters_and_time_range(tmp_path):
+    history = OperationHistory(str(tmp_path / 'operations.db'))
+    for i in range(20):
+        history.record('srv1' if i < 12 else 'srv2', 'start', 'alice', 'succeeded', started_at=1000.0 + i,
+                       duration=1.0)
+
+    on_srv1 = walk_pages(lambda cursor: history.query(filters={'server': 'srv1'}, cursor=cursor, limit=5), 'operations')
+    in_range = history.query(since=1005.0, until=1010.0)['operations']
+
+    assert len(on_srv1) == 12 and {operation['server'] for operation in on_srv1} == {'srv1'}
+    assert [operation['started_at'] for operation in in_range] == [1009.0, 1008.0, 1007.0, 1006.0, 1005.0]
+
+
+def test_operation_history_rejects_a_malformed_cursor(tmp_path):
+    with pytest.raises(InvalidCursor):
+        OperationHistory(str(tmp_path / 'operations.db')).query(cursor='bogus')
+
+
+def test_manage_jboss_succeeds_when_the_history_cannot_be_written(simulated, monkeypatch):
+    class BrokenHistory:
+        def record(self, *args):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(manage_jboss, 'get_operation_history', BrokenHistory)
+
+    output = manage_jboss.manage_jboss('prod92', 'start', 'alice', 'secret', 'config/server_config.json')
+
+    assert output.endswith('{"outcome" => "success"}')
@@ -0,0 +1,136 @@
+"""
+Tests for the PowerShell session pool, run against StandInHost instead of powershell.exe
+"""
+import json
+import threading
+
+import pytest
+
+import remote_executor
+from powershellStatusChecker import check_services_powershell
+from ps_session_pool import HostResult, SessionPool, StandInHost
+from remote_executor import STATUS_PAYLOAD_MARKER, PowerShellExecutor
+
+SERVER = 'prod92'
+
+
+class Hosts:
+    """Host factory that keeps every StandInHost it created"""
+
+    def __init__(self, responder=None):
+        self.created = []
+        self.responder = responder
+
+    def __call__(self, username, password, server):
+        host = StandInHost(username, password, server, responder=self.responder)
+        self.created.append(host)
+        return host
+
+
+def test_sequential_calls_reuse_one_host():
+    hosts = Hosts()
+    pool = SessionPool(host_factory=hosts)
+
+    for _ in range(3):
+        assert pool.run('user', 'secret', SERVER, 'Get-Date').ok
+
+    assert len(hosts.created) == 1
+    assert pool.stats() == {"size": 1, "idle": 1, "max_size": 8, "spawned": 1}
+
+
+def test_changed_password_replaces_the_host():
+    hosts = Hosts()
+    pool = SessionPool(host_factory=hosts)
+
+    pool.run('user', 'secret', SERVER, 'Get-Date')
+    pool.run('user', 'changed', SERVER, 'Get-Date')
+
+    assert [host.password for host in hosts.created] == ['secret', 'changed']
+    assert not hosts.created[0].is_healthy()
+    assert pool.stats()['size'] == 1
+
+
+def test_full_pool_recycles_the_least_recently_used_idle_host():
+    hosts = Hosts()
+    pool = SessionPool(host_factory=hosts, max_size=2)
+
+    pool.run('user', 'secret', 'a', 'Get-Date')
+    pool.run('user', 'secret', 'b', 'Get-Date')
+    pool.run('user', 'secret', 'c', 'Get-Date')
+
+    assert [host.server for host in hosts.created] == ['a', 'b', 'c']
+    assert not hosts.created[0].is_healthy() and hosts.created[1].is_healthy()
+    assert pool.stats()['size'] == 2
+
+
+def test_full_pool_of_busy_hosts_times_out():
+    pool = SessionPool(host_factory=Hosts(), max_size=1, acquire_timeout=0.1)
+
+    with pool.session('user', 'secret', 'a'):
+        with pytest.raises(TimeoutError):
+            pool.run('user', 'secret', 'b', 'Get-Date')
+
+
+def test_waiter_gets_the_host_when_it_is_released():
+    hosts = Hosts()
+    pool = SessionPool(host_factory=hosts, max_size=1)
+    results = []
+
+    with pool.session('user', 'secret', SERVER):
+        waiter = threading.Thread(target=lambda: results.append(pool.run('user', 'secret', SERVER, 'Get-Date')))
+        waiter.start()
+        waiter.join(0.1)
+        assert waiter.is_alive()
+    waiter.join(5)
+
+    assert results[0].ok
+    assert len(hosts.created) == 1
+
+
+def test_idle_hosts_are_evicted_after_the_idle_timeout():
+    hosts = Hosts()
+    pool = SessionPool(host_factory=hosts, idle_timeout=0)
+    pool.run('user', 'secret', SERVER, 'Get-Date')
+
+    assert pool.evict_idle() == 1
+    assert not hosts.created[0].is_healthy()
+    assert pool.stats()['size'] == 0
+
+
+def test_unhealthy_idle_host_is_replaced_before_reuse():
+    hosts = Hosts()
+    pool = SessionPool(host_factory=hosts, health_check_interval=0)
+    pool.run('user', 'secret', SERVER, 'Get-Date')
+    # The session dropped while the host sat idle
+    hosts.created[0].close()
+
+    assert pool.run('user', 'secret', SERVER, 'Get-Date').ok
+    assert len(hosts.created) == 2
+    assert pool.stats()['size'] == 1
+
+
+def test_close_user_closes_only_that_users_hosts():
+    hosts = Hosts()
+    pool = SessionPool(host_factory=hosts)
+    pool.run('alice', 'secret', 'a', 'Get-Date')
+    pool.run('alice', 'secret', 'b', 'Get-Date')
+    pool.run('bob', 'secret', 'a', 'Get-Date')
+
+    assert pool.close_user('alice') == 2
+    assert [host.is_healthy() for host in hosts.created] == [False, False, True]
+    assert pool.stats()['size'] == 1
+
+
+def test_status_check_runs_on_a_pooled_host(monkeypatch):
+    payload = {"jboss": None, "services": [{"name": "EAP Service", "running": True, "status": "Running",
+                                            "error": None}]}
+    hosts = Hosts(responder=lambda server, script: HostResult(STATUS_PAYLOAD_MARKER + json.dumps(payload), True))
+    executor = PowerShellExecutor(pool=SessionPool(host_factory=hosts))
+    monkeypatch.setattr(remote_executor, '_executor', executor)
+
+    for _ in range(2):
+        result = check_services_powershell('user', 'secret', SERVER, ['EAP Service'])
+        assert result['services']['EAP Service']['running'] is True
+
+    assert executor.stats()['calls'] == 2
+    assert executor.stats()['spawned'] == 1
@@ -0,0 +1,70 @@
+"""
+Tests for the simulated remote executor
+"""
+import pytest
+
+from deadline import deadline_scope
+from powershellStatusChecker import StatusCheckTimeout, check_services_powershell
+from remote_executor import START, STATUS, RemoteCall, RemoteExecutor
+
+from conftest import fast_profile
+
+SERVER = 'prod92'
+CHECK = "jboss-cli.ps1 --connect --controller=prod92:9990 /host=prod92/server-config=SVR:read-attribute(name=status)"
+
+
+def test_status_check_parses_the_simulated_payload(simulated):
+    payload = check_services_powershell('user', 'secret', SERVER, ['EAP Service'], CHECK)
+
+    assert payload['jboss']['status'] == 'STARTED'
+    assert payload['services']['EAP Service']['running'] is True
+    assert simulated.stats() == {"calls": 1, "spawned": 1, "in_flight": 0, "max_in_flight": 1}
+
+
+def test_first_call_per_user_pays_the_session_latency(simulated):
+    simulated.default_profile = fast_profile(session_latency=0.2)
+    simulated.warm('user', 'secret', SERVER)
+
+    assert simulated.warm('user', 'secret', SERVER)
+    with pytest.raises(TimeoutError):
+        simulated.warm('other', 'secret', SERVER, timeout=0.01)
+    assert simulated.stats()['spawned'] == 1
+
+
+def test_connection_failures_are_raised(simulated):
+    simulated.profiles[SERVER] = fast_profile(connection_failure_rate=1.0)
+
+    with pytest.raises(ConnectionError):
+        check_services_powershell('user', 'secret', SERVER, ['EAP Service'], CHECK)
+
+
+def test_status_check_past_its_deadline_keeps_the_finished_services(simulated):
+    simulated.profiles[SERVER] = fast_profile(latency=0.6)
+
+    with deadline_scope(0.4), pytest.raises(StatusCheckTimeout) as raised:
+        check_services_powershell('user', 'secret', SERVER, ['EAP Service'], CHECK)
+
+    # The JBoss check (first half of the latency) finished, the service check did not
+    assert raised.value.payload['jboss']['status'] == 'STARTED'
+    assert raised.value.payload['timed_out'] == ['EAP Service']
+
+
+def test_start_reports_starting_until_settled(simulated):
+    simulated.profiles[SERVER] = fast_profile(jboss_status='STOPPED', settle_time=0.2)
+    lines = []
+    result = simulated.execute(RemoteCall('user', 'secret', SERVER, '', START, on_output=lines.append))
+
+    status = simulated.execute(RemoteCall('user', 'secret', SERVER, '', STATUS,
+                                          arguments={"jboss_cli_command": CHECK}))
+
+    assert result.ok and lines[0] == f"Starting {SERVER}..." and lines[-1] == '{"outcome" => "success"}'
+    assert '"status":"STARTING"' in status.output
+
+
+def test_backend_missing_a_method_fails_when_created():
+    class Incomplete(RemoteExecutor):
+        def execute(self, call):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
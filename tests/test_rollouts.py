@@ -0,0 +1,27 @@
+"""
+Tests for rolling start/stop and the /rollouts API
+"""
+import pytest
+
+
+@pytest.mark.parametrize('servers', ['prod92', [1, 2], ['prod92', None], {'prod92': True}])
+def test_rollout_rejects_servers_that_are_not_a_list_of_ids(client, servers):
+    response = client.post('/rollouts', json={'action': 'start', 'servers': servers})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'invalid_parameter'
+
+
+def test_rollout_rejects_unknown_servers(client):
+    response = client.post('/rollouts', json={'action': 'start', 'servers': ['prod92', 'nope']})
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "unknown_servers",
+                                   "message": "Servers not found in configuration: nope"}
+
+
+def test_rollout_rejects_an_unknown_action(client):
+    response = client.post('/rollouts', json={'action': 'restart', 'servers': ['prod92']})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'invalid_rollout'
@@ -0,0 +1,39 @@
+"""
+Tests for searching and cursor pagination of the server inventory
+"""
+import pytest
+
+from models.server_config import ServerEntry
+from models.server_inventory import InvalidCursor, ServerInventory
+
+from conftest import walk_pages
+
+
+def _inventory(count):
+    return ServerInventory(ServerEntry(f"srv{i:02}", {
+        "name": f"Server {i:02}",
+        "environment": "prod" if i % 2 else "test",
+        "tags": ["eap-7.4"] + (["edge"] if i % 3 == 0 else [])
+    }) for i in range(count))
+
+
+def test_inventory_pages_cover_every_server_once_in_name_order():
+    inventory = _inventory(25)
+    servers = walk_pages(lambda cursor: inventory.search(cursor=cursor, limit=10), 'servers')
+
+    assert [server['server_id'] for server in servers] == [f"srv{i:02}" for i in range(25)]
+
+
+def test_inventory_filters_page_over_matches_only():
+    inventory = _inventory(25)
+    first = inventory.search(environment='prod', tags=['edge'], limit=2)
+    servers = walk_pages(lambda cursor: inventory.search(environment='prod', tags=['edge'], cursor=cursor, limit=2),
+                    'servers')
+
+    assert first['total'] == len(servers) == len([i for i in range(25) if i % 2 and i % 3 == 0])
+    assert inventory.search(query='server 07')['total'] == 1
+
+
+def test_inventory_rejects_a_malformed_cursor():
+    with pytest.raises(InvalidCursor):
+        _inventory(3).search(cursor='not-a-cursor')
@@ -0,0 +1,147 @@
+"""
+Tests for StatusPoller: shared checks, circuit breakers, caller deadlines and shed checks
+"""
+import threading
+import time
+
+from circuit_breaker import OPEN, CircuitBreakerRegistry
+from deadline import deadline_scope
+from status_poller import StatusPoller, StatusSnapshot
+
+from conftest import fast_profile
+
+SERVER = 'prod92'
+
+
+class BlockingCheck:
+    """Check function that counts its calls and holds each one until released"""
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, server_id, username, password):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return StatusSnapshot(server_id, [{"name": "EAP ServiceFILLER", "running": True}],
+                              error=self.error, jboss_status=None if self.error else 'STARTED')
+
+
+def _refresh_in_threads(poller, count):
+    """Start `count` concurrent refreshes; returns the threads and the list their snapshots go to"""
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(poller.refresh(SERVER, 'user', 'secret')))
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_refreshes_share_one_check():
+    check = BlockingCheck()
+    poller = StatusPoller(check_func=check)
+
+    threads, results = _refresh_in_threads(poller, 5)
+    assert check.started.wait(5)
+    time.sleep(0.1)
+    check.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert check.calls == 1
+    assert len(results) == 5
+    assert all(snapshot is results[0] for snapshot in results)
+    assert poller.get_cached(SERVER) is results[0]
+
+
+def test_followers_of_a_shed_check_get_the_shed_snapshot():
+    check = BlockingCheck(error='overloaded')
+    poller = StatusPoller(check_func=check)
+
+    threads, results = _refresh_in_threads(poller, 3)
+    assert check.started.wait(5)
+    time.sleep(0.1)
+    check.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert check.calls == 1
+    assert [snapshot.error for snapshot in results] == ['overloaded'] * 3
+    # A shed check says nothing about the server: nothing is cached or counted
+    assert poller.get_cached(SERVER) is None
+    assert poller.breakers.get(SERVER).failures == 0
+
+
+def test_follower_stops_waiting_at_its_own_deadline():
+    check = BlockingCheck()
+    poller = StatusPoller(check_func=check)
+    leader = threading.Thread(target=poller.refresh, args=(SERVER, 'user', 'secret'))
+    leader.start()
+    assert check.started.wait(5)
+
+    with deadline_scope(0.1):
+        snapshot = poller.refresh(SERVER, 'user', 'secret')
+
+    check.release.set()
+    leader.join(5)
+    assert snapshot.error == 'timed_out'
+    assert check.calls == 1
+
+
+def test_breaker_opens_after_consecutive_connection_failures():
+    calls = []
+
+    def failing_check(server_id, username, password):
+        calls.append(server_id)
+        return StatusSnapshot(server_id, [], error='connection_failed')
+
+    poller = StatusPoller(check_func=failing_check, breakers=CircuitBreakerRegistry(failure_threshold=3))
+    for _ in range(3):
+        poller.refresh(SERVER, 'user', 'secret')
+    snapshot = poller.refresh(SERVER, 'user', 'secret')
+
+    assert poller.breakers.get(SERVER).state == OPEN
+    assert len(calls) == 3
+    assert snapshot.error == 'circuit_open'
+    assert snapshot.retry_at is not None
+
+
+def test_caller_deadline_timeouts_are_not_cached_or_counted():
+    def timed_out_check(server_id, username, password):
+        return StatusSnapshot(server_id, [], error='timed_out')
+
+    poller = StatusPoller(check_func=timed_out_check, breakers=CircuitBreakerRegistry(failure_threshold=2))
+    for _ in range(3):
+        with deadline_scope(0.5):
+            assert poller.refresh(SERVER, 'user', 'secret').error == 'timed_out'
+
+    assert poller.get_cached(SERVER) is None
+    assert poller.breakers.get(SERVER).failures == 0
+
+    # A check that ran out of its own full timeout does count
+    poller.refresh(SERVER, 'user', 'secret')
+    assert poller.breakers.get(SERVER).failures == 1
+    assert poller.get_cached(SERVER).error == 'timed_out'
+
+
+def test_check_through_simulated_executor(simulated):
+    poller = StatusPoller()
+    snapshot = poller.refresh(SERVER, 'user', 'secret')
+
+    assert snapshot.error is None
+    assert snapshot.jboss_status == 'STARTED'
+    assert all(service['running'] for service in snapshot.services)
+    assert simulated.stats()['calls'] == 1
+
+
+def test_connection_failures_through_simulated_executor(simulated):
+    simulated.profiles[SERVER] = fast_profile(connection_failure_rate=1.0)
+    poller = StatusPoller()
+
+    snapshot = poller.refresh(SERVER, 'user', 'secret')
+
+    assert snapshot.error == 'connection_failed'
+    assert poller.breakers.get(SERVER).failures == 1
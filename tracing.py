@@ -0,0 +1,316 @@
+"""
+Module for lightweight in-process request tracing.
+
+A trace is opened by a traced route or background job; every `span()` entered while it
+is active, in the same thread or in anything the context is carried to (asyncio tasks,
+asyncio.to_thread, the shared event loop of async_runtime.py), becomes a child span.
+Remote call phases already measured for /metrics (acquire, spawn, session, exec, parse)
+are added to the active trace as spans as well, see metrics.observe_phase.
+
+Only a sampled share of requests is traced (EAP_TRACE_SAMPLE_RATE, default 0.1, adjustable
+at runtime); a request with `?trace=1` or an `X-Trace: 1` header is always traced. Outside
+a sampled trace, span() only reads one context variable. The last EAP_TRACE_CAPACITY
+finished traces (default 200) are kept for the /admin/traces waterfall page.
+"""
+import functools
+import itertools
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+# Finished traces kept in memory
+DEFAULT_CAPACITY = 200
+
+# Share of traced requests when EAP_TRACE_SAMPLE_RATE is not set
+DEFAULT_SAMPLE_RATE = 0.1
+
+# Spans kept per trace; later spans are counted but dropped
+MAX_SPANS_PER_TRACE = 500
+
+
+class Span:
+    """One timed step of a trace"""
+
+    __slots__ = ('span_id', 'parent_id', 'name', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, start: float,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+
+class Trace:
+    """Spans of one request or job, the root span first"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.root = Span(0, None, name, time.perf_counter(), attributes)
+        self.spans: List[Span] = [self.root]
+
+    def new_span(self, parent_id: Optional[int], name: str, start: float,
+                 attributes: Dict[str, Any]) -> Optional[Span]:
+        """
+        Add a span to the trace
+
+        Returns:
+            Optional[Span]: The span, None if the trace already holds MAX_SPANS_PER_TRACE
+        """
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS_PER_TRACE:
+                self.dropped += 1
+                return None
+            span = Span(next(self._ids), parent_id, name, start, attributes)
+            self.spans.append(span)
+            return span
+
+    @property
+    def duration(self) -> float:
+        """
+        Returns:
+            float: Seconds from the earliest span start to the root span end
+        """
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return end - min(span.start for span in self.spans)
+
+    def to_dict(self) -> Dict:
+        """
+        Convert the trace to a dictionary for the waterfall
+
+        Returns:
+            Dict: Trace fields and its spans in start order with depth, offset and duration in ms
+        """
+        with self._lock:
+            spans = list(self.spans)
+        origin = min(span.start for span in spans)
+        now = time.perf_counter()
+        depths = {None: -1}
+        rows = []
+        # Depth-first, children in start order, so the waterfall reads like a call tree
+        children: Dict[Optional[int], List[Span]] = {}
+        for span in sorted(spans, key=lambda s: s.start):
+            children.setdefault(span.parent_id, []).append(span)
+        stack = list(reversed(children.get(None, [])))
+        while stack:
+            span = stack.pop()
+            depths[span.span_id] = depths.get(span.parent_id, -1) + 1
+            end = span.end if span.end is not None else now
+            rows.append({
+                "name": span.name,
+                "depth": depths[span.span_id],
+                "offset_ms": round((span.start - origin) * 1000, 2),
+                "duration_ms": round((end - span.start) * 1000, 2),
+                "finished": span.end is not None,
+                "attributes": span.attributes,
+                "error": span.error
+            })
+            stack.extend(reversed(children.get(span.span_id, [])))
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2),
+            "error": self.root.error,
+            "dropped_spans": self.dropped,
+            "spans": rows
+        }
+
+
+# Trace and span the current code runs in, None outside a sampled trace
+_current: ContextVar[Optional[tuple]] = ContextVar('eap_trace', default=None)
+
+
+class Tracer:
+    """Sampling tracer keeping the most recent finished traces"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, sample_rate: float = DEFAULT_SAMPLE_RATE):
+        """
+        Initialize the tracer
+
+        Args:
+            capacity (int): Finished traces kept
+            sample_rate (float): Share of traces recorded, 0 to 1
+        """
+        self.sample_rate = sample_rate
+        self._traces: Deque[Trace] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    @property
+    def sample_rate(self) -> float:
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value: float) -> None:
+        self._sample_rate = min(1.0, max(0.0, float(value)))
+
+    @contextmanager
+    def trace(self, name: str, force: bool = False, **attributes) -> Iterator[Optional[Trace]]:
+        """
+        Trace the with block: a child span inside an active trace, otherwise a new sampled trace
+
+        Args:
+            name (str): Span or trace name
+            force (bool): Record a new trace regardless of the sample rate
+            **attributes: Attributes shown with the span
+
+        Yields:
+            Optional[Trace]: The active trace, None if this block is not traced
+        """
+        current = _current.get()
+        if current is not None:
+            with self.span(name, **attributes):
+                yield current[0]
+            return
+        if not force and (self._sample_rate <= 0 or random.random() >= self._sample_rate):
+            yield None
+            return
+
+        trace = Trace(name, attributes)
+        token = _current.set((trace, trace.root))
+        try:
+            yield trace
+        except BaseException as e:
+            trace.root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            trace.root.end = time.perf_counter()
+            with self._lock:
+                self._traces.append(trace)
+
+    @staticmethod
+    @contextmanager
+    def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+        """
+        Time the with block as a child of the current span; a no-op outside a sampled trace
+
+        Args:
+            name (str): Span name
+            **attributes: Attributes shown with the span
+
+        Yields:
+            Optional[Span]: The span, None if not traced
+        """
+        current = _current.get()
+        if current is None:
+            yield None
+            return
+        trace, parent = current
+        span = trace.new_span(parent.span_id, name, time.perf_counter(), attributes)
+        if span is None:
+            yield None
+            return
+        token = _current.set((trace, span))
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end = time.perf_counter()
+
+    @staticmethod
+    def record_span(name: str, seconds: float, **attributes) -> None:
+        """
+        Add a span that ended just now, e.g. a phase timed by the caller
+
+        Args:
+            name (str): Span name
+            seconds (float): Duration of the span
+            **attributes: Attributes shown with the span
+        """
+        current = _current.get()
+        if current is None:
+            return
+        trace, parent = current
+        end = time.perf_counter()
+        span = trace.new_span(parent.span_id, name, end - seconds, attributes)
+        if span is not None:
+            span.end = end
+
+    @staticmethod
+    def annotate(**attributes) -> None:
+        """
+        Add attributes to the current span; a no-op outside a sampled trace
+        """
+        current = _current.get()
+        if current is None:
+            return
+        current[1].attributes.update(attributes)
+
+    def recent(self, limit: Optional[int] = None) -> List[Trace]:
+        """
+        Get the most recent finished traces
+
+        Args:
+            limit (int, optional): Maximum number of traces
+
+        Returns:
+            List[Trace]: Newest first
+        """
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        return traces[:limit] if limit is not None else traces
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        """
+        Get a finished trace by ID
+
+        Args:
+            trace_id (str): ID of the trace
+
+        Returns:
+            Optional[Trace]: The trace, None if unknown or already dropped from the buffer
+        """
+        with self._lock:
+            return next((trace for trace in self._traces if trace.trace_id == trace_id), None)
+
+    def clear(self) -> None:
+        """Drop every finished trace"""
+        with self._lock:
+            self._traces.clear()
+
+
+TRACER = Tracer(int(os.environ.get('EAP_TRACE_CAPACITY', DEFAULT_CAPACITY)),
+                float(os.environ.get('EAP_TRACE_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)))
+
+span = TRACER.span
+record_span = TRACER.record_span
+annotate = TRACER.annotate
+
+
+def traced(name: Optional[str] = None, force: Callable[[], bool] = lambda: False) -> Callable:
+    """
+    Decorate a function so each call is traced, with its keyword arguments as attributes
+
+    Args:
+        name (str, optional): Trace name, defaults to the function name
+        force (Callable, optional): Returns True when the call must be traced regardless of
+            the sample rate, e.g. because the request asked for it
+
+    Returns:
+        Callable: Decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with TRACER.trace(name or func.__name__, force=force(), **kwargs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator